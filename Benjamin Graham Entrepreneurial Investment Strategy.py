@@ -38,15 +38,15 @@ def trade(context, bar_dict):
     if months in context.trade_date:
 
 
-        ##获得购买股票列表
-        PE_list = stocks_PE(context,bar_dict)
-        PB_list = stocks_PB(context,bar_dict)
-        current_ratio_list = stocks_current_ratio(context,bar_dict)
-        Debt_asset_list = stocks_Debt_asset(context,bar_dict)
-        netProfitGrowthrate_list = stocks_netProfitGrowthrate(context,bar_dict)
-        netprofit = stocks_netprofit(context,bar_dict)
-        ## 获得满足每种条件的股票池
-        stock_list = list(set(PE_list)&set(PB_list)&set(current_ratio_list)&set(Debt_asset_list)&set(netProfitGrowthrate_list)&set(netprofit))
+        current_date = get_last_datetime().strftime('%Y%m%d')
+        ## 获得满足每种条件的股票池：每个条件是同一股票轴上的掩码，一次取交集
+        stock_list = screen_stocks(stocks_PE(context,bar_dict),
+                                   stocks_PB(context,bar_dict),
+                                   stocks_current_ratio(context,bar_dict),
+                                   stocks_Debt_asset(context,bar_dict),
+                                   stocks_netProfitGrowthrate(context,bar_dict),
+                                   stocks_netprofit(context,bar_dict),
+                                   date = current_date)
         log.info(len(stock_list))
 
         ## 卖出
@@ -90,10 +90,9 @@ def handle_bar(context, bar_dict):
 
 ################## 以下为功能函数, 在主要函数中调用 ##########################
 
-# 1. 根据市盈率筛选股票列表
+# 1. 根据市盈率筛选股票
 def stocks_PE(context,bar_dict):
-    current_date = get_last_datetime().strftime('%Y%m%d')
-    PE = get_fundamentals(query(
+    return query(
             valuation.symbol,
             valuation.pe
         ).filter(
@@ -102,13 +101,10 @@ def stocks_PE(context,bar_dict):
             valuation.pe.asc()
         ).limit(
             context.selected
-        ),date = current_date)
-
-    return list(PE['valuation_symbol'])
-# 2. 根据市净率筛选股票列表
+        )
+# 2. 根据市净率筛选股票
 def stocks_PB(context,bar_dict):
-    current_date = get_last_datetime().strftime('%Y%m%d')
-    PB = get_fundamentals(query(
+    return query(
             valuation.symbol,
             valuation.pb
         ).filter(
@@ -118,39 +114,30 @@ def stocks_PB(context,bar_dict):
             valuation.pb.asc()
         ).limit(
             context.selected
-        ),date = current_date)
-
-
-    return list(PB['valuation_symbol'])
-# 3. 根据流动比率筛选股票列表
+        )
+# 3. 根据流动比率筛选股票
 def stocks_current_ratio(context,bar_dict):
-    current_date = get_last_datetime().strftime('%Y%m%d')
-    Current_ratio = get_fundamentals(query(
+    return query(
             debtrepay.symbol,
             debtrepay.current_ratio
         ).filter(
             debtrepay.current_ratio>1.2
         ).order_by(
             debtrepay.current_ratio.desc()
-        ),date = current_date)
+        )
 
-    return list(Current_ratio['debtrepay_symbol'])
-
-# 4. 根据长期与运营资金比率条件筛选股票列表
+# 4. 根据长期与运营资金比率条件筛选股票
 def stocks_Debt_asset(context,bar_dict):
-    current_date = get_last_datetime().strftime('%Y%m%d')
-    Debt_asset = get_fundamentals(query(
+    return query(
             debtrepay.symbol,
             debtrepay.long_term_debt_to_opt_capital_ratio
         ).filter(
             debtrepay.long_term_debt_to_opt_capital_ratio<1.5
-            ),date = current_date)
-    return list(Debt_asset['debtrepay_symbol'])
+            )
 
-# 5. 根据净利润增长率条件筛选股票列表
+# 5. 根据净利润增长率条件筛选股票
 def stocks_netProfitGrowthrate(context,bar_dict):
-    current_date = get_last_datetime().strftime('%Y%m%d')
-    net_profit_growth_ratio = get_fundamentals(query(
+    return query(
             growth.symbol,
             growth.net_profit_growth_ratio
         ).filter(
@@ -158,17 +145,13 @@ def stocks_netProfitGrowthrate(context,bar_dict):
         ).order_by(
             growth.net_profit_growth_ratio.desc()
 
-        ),date = current_date)
-    return list(net_profit_growth_ratio['growth_symbol'])
+        )
 
-# 6. 根据净利润条件筛选股票列表
+# 6. 根据净利润条件筛选股票
 def stocks_netprofit(context,bar_dict):
-    current_date = get_last_datetime().strftime('%Y%m%d')
-    netprofit = get_fundamentals(query(
+    return query(
             income.symbol,
             income.net_profit
         ).filter(
             income.net_profit > 0
-            ),date = current_date)
-
-    return list(netprofit['income_symbol'])
+            )
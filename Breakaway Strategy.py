@@ -7,8 +7,6 @@ Day 2: A gap down with a bearish candlestick, continuing the downtrend and begin
 Day 5: A long bullish candlestick (long white/green candlestick), with the closing price between the first day’s closing price and the second day’s opening price, indicating a potential price increase.
 
 '''
-import talib as tl
-import datetime
 
 
 # 初始化函数 ###################################################################
@@ -75,44 +73,17 @@ def stocks_to_buy(context, bar_dict, ):
 # 6.获取初始股票池
 def get_raw_stocks(bar_dict):
     tdate = get_datetime().strftime("%Y%m%d")  # 当天日期
-    today_datetime = datetime.datetime.strptime(tdate, "%Y%m%d")
-    yesterday_time = get_datetime() - datetime.timedelta(days=1)
-    yesterday_date = yesterday_time.strftime("%Y%m%d")  # 昨日日期
 
     # 获取所有股票
-    stocks = get_all_securities("stock", tdate)
-    # 排除新股
-    stocks = stocks[(today_datetime - stocks.start_date) > datetime.timedelta(60)].index.values
-    # 排除停牌股票
-    stocks = [stock for stock in stocks if bar_dict[stock].is_paused == 0]
-    # 排除开盘涨跌停
-    stocks = [stock for stock in stocks if bar_dict[stock].open != bar_dict[stock].high_limit
-              and bar_dict[stock].open != bar_dict[stock].low_limit]
-    # 排除st
-    stocks = [stock for stock in stocks if bar_dict[stock].is_st == 0]
-
-    return stocks
+    stocks = list(get_all_securities("stock", tdate).index)
+    # 按当日交易状态位一次排除：停牌、开盘涨跌停、st，以及上市不超过60天的新股
+    return filter_tradable(stocks, paused=True, st=True, high_limit=True, low_limit=True, new_days=61)
 
 
 # 7.挑选CDLBREAKAWAY形态股票
 def get_CDLBREAKAWAY_stocks(stocks, bar_dict):
-    CDLBREAKAWAY_stocks = []
-    for stock in stocks:
-        value = history(stock, ['open', 'high', 'low', 'close'], 20, '1d', True)
-        open_P = value.open.values
-        high = value.high.values
-        low = value.low.values
-        close = value.close.values
-        try:
-            integer = tl.CDLBREAKAWAY(open_P, high, low, close)
-            is_CDLBREAKAWAY = integer[-1]
-        # 跳过无数据的股票
-        except:
-            log.info(stock + "无数据")
-            continue
-        if is_CDLBREAKAWAY != 0:
-            CDLBREAKAWAY_stocks.append(stock)
-    return CDLBREAKAWAY_stocks
+    # 全部股票最近20根交易K线上的CDLBREAKAWAY一次查出（无数据的股票不计入）
+    return scan_patterns(stocks, 'CDLBREAKAWAY')['CDLBREAKAWAY']
 
 
 # 8.交易操作
@@ -1,5 +1,4 @@
 import pandas as pd
-import numpy as np
 import datetime
 
 #-------------------------------------Basic Parameter Settings-----------------------------------------------
@@ -35,18 +34,12 @@ def reallocation(account, data):
 
     #-----------------------------------------Data Processing--------------------------------------------
     # Outlier processing using median de-extremization method
-    # The factors are the last 3 columns
-    for i in list(df.columns)[-3:]:
-        m = np.mean(df[i])  # Calculate mean
-        s = np.std(df[i])  # Calculate standard deviation
-        df[i] = df[i].where(df[i] > m - 3 * s).fillna(m - 3 * s)  # Replace values less than m-3*s with m-3*s
-        df[i] = df[i].where(df[i] < m + 3 * s).fillna(m + 3 * s)  # Replace values greater than m+3*s with m+3*s
+    # The factors are the last 3 columns; values beyond mean +- 3 std are set to the bound
+    factors = list(df.columns)[-3:]
+    df[factors] = sigma_clip(df[factors], 3)
 
     # Dimensionless processing of factors
-    for j in list(df.columns)[-3:]:
-        m = np.mean(df[j])  # Calculate mean
-        s = np.std(df[j])  # Calculate standard deviation
-        df[j] = (df[j] - m) / s  # Standardization
+    df[factors] = zscore(df[factors])  # Standardization
 
     #--------------------------------------Factor Selection--------------------------------------------------------------------------------------------
     # Calculate composite factor (positive direction is +, negative direction is -)
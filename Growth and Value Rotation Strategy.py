@@ -16,10 +16,13 @@ def initialize(account):
 # Weekend Rebalancing Function ##################################################
 def trade(account, data):
     date = get_datetime()
-    C_list = stocks_C(account, data)
-    A_list = stocks_A(account, data)
-    S_list = stocks_S(account, data)
-    L_list = stocks_L(account, data)
+    # Query the stock universe once and share it across the four conditions
+    last_date = get_last_datetime().strftime('%Y%m%d')
+    securities = list(get_all_securities('stock', last_date).index)
+    C_list = stocks_C(account, data, securities)
+    A_list = stocks_A(account, data, securities)
+    S_list = stocks_S(account, data, securities)
+    L_list = stocks_L(account, data, securities)
     ## Get stock pool satisfying each condition
     stock_list = list(set(C_list) & set(A_list) & set(S_list) & set(L_list))
     log.info(len(stock_list))
@@ -65,9 +68,8 @@ def handle_data(account, data):
 
 ################## Below are the Helper Functions, Called in Main Functions ######################
 # 1. C - Recent profit growth rate
-def stocks_C(account, data):
+def stocks_C(account, data, securities):
     last_date = get_last_datetime().strftime('%Y%m%d')
-    securities = list(get_all_securities('stock', last_date).index)
     C = get_fundamentals(query(
         growth.symbol,
         growth.parent_company_profit_growth_ratio
@@ -81,9 +83,8 @@ def stocks_C(account, data):
 
 
 # 2. A - Compound growth rate over the past three years
-def stocks_A(account, data):
+def stocks_A(account, data, securities):
     last_date = get_last_datetime().strftime('%Y%m%d')
-    securities = list(get_all_securities('stock', last_date).index)
     A = get_fundamentals(query(
         growth.symbol,
         growth.parent_company_share_holders_net_profit_years_growth_ratio
@@ -97,9 +98,8 @@ def stocks_A(account, data):
 
 
 # 3. S - Market capitalization
-def stocks_S(account, data):
+def stocks_S(account, data, securities):
     last_date = get_last_datetime().strftime('%Y%m%d')
-    securities = list(get_all_securities('stock', last_date).index)
     S = get_factors(query(
         factor.symbol,
         factor.current_market_cap
@@ -113,9 +113,8 @@ def stocks_S(account, data):
 
 
 # 4. L - Overbought/oversold
-def stocks_L(account, data):
+def stocks_L(account, data, securities):
     last_date = get_last_datetime().strftime('%Y%m%d')
-    securities = list(get_all_securities('stock', last_date).index)
     L = get_factors(query(
         factor.symbol,
         factor.rsi
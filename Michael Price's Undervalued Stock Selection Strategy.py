@@ -33,11 +33,11 @@ def trade(context, bar_dict):
     if months in context.trade_date:
 
 
-        ##获得购买股票列表
-        PB_list = stocks_PB(context,bar_dict)
-        Equity_ratio_list = stocks_equity_ratio(context,bar_dict)
-        ## 获得满足每种条件的股票池
-        stock_list = list(set(PB_list)&set(Equity_ratio_list))
+        last_date = get_last_datetime().strftime('%Y%m%d')
+        ## 获得满足每种条件的股票池：每个条件是同一股票轴上的掩码，一次取交集
+        stock_list = screen_stocks(stocks_PB(context,bar_dict),
+                                   stocks_equity_ratio(context,bar_dict),
+                                   date = last_date)
         log.info(len(stock_list))
 
         ## 卖出
@@ -80,10 +80,9 @@ def handle_bar(context,bar_dict):
 ################## 以下为功能函数, 在主要函数中调用 ##########################
 
 
-# 1. 根据市净率筛选股票列表
+# 1. 根据市净率筛选股票
 def stocks_PB(context, bar_dict):
-    last_date = get_last_datetime().strftime('%Y%m%d')
-    PB = get_fundamentals(query(
+    return query(
             valuation.symbol,
             valuation.pb
         ).filter(
@@ -93,18 +92,14 @@ def stocks_PB(context, bar_dict):
             valuation.pb.asc()
         ).limit(
             context.selected
-        ),date = last_date)
-
-
-    return list(PB['valuation_symbol'])
+        )
 
-# 5. 根据负债比例条件来筛选股票列表
+# 5. 根据负债比例条件来筛选股票（低于市场均值为True）
 def stocks_equity_ratio(context, bar_dict):
     last_date = get_last_datetime().strftime('%Y%m%d')
     equity_ratio = get_fundamentals(query(
             debtrepay.symbol,
             debtrepay.equity_ratio
         ),date = last_date)
-    equity_ratio_mean = equity_ratio['debtrepay_equity_ratio'].mean()
-    equity_ratio = equity_ratio[equity_ratio['debtrepay_equity_ratio']<equity_ratio_mean]
-    return list(equity_ratio['debtrepay_symbol'])
\ No newline at end of file
+    equity_ratio = equity_ratio.set_index('debtrepay_symbol')['debtrepay_equity_ratio']
+    return equity_ratio < equity_ratio.mean()
\ No newline at end of file
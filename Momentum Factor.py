@@ -48,23 +48,16 @@ str_dates = [time.strftime('%Y-%m-%d') for time in dates]
 
 
 # 计算长端动量因子
-def momentum_factor(adj_date):
-    momentums = []
-    for df in dfs:
-        df['涨跌幅'] = df['收盘价'].pct_change()
-        df160 = df.loc[df.index <= adj_date].tail(160)
-
-        df160['每日振幅'] = (df160['最高价'] / df160['最低价']) - 1
-
-        df160 = df160.sort_values(by='每日振幅')
-        threshold = int(len(df) * 0.7)
-        df160_top70 = df160.head(threshold)
+# long_momentum 由回测引擎注入（python -m backtest run）
+# 全部调仓日、全部股票一次算出（调仓日 x 股票），每个调仓日取最近160个交易日中振幅最小的 int(len(df) * 0.7) 个
+close = pd.DataFrame({code: df['收盘价'] for code, df in zip(cons, dfs)})
+high = pd.DataFrame({code: df['最高价'] for code, df in zip(cons, dfs)})
+low = pd.DataFrame({code: df['最低价'] for code, df in zip(cons, dfs)})
+momentum_panel = long_momentum(close, high, low, dates, window=160, keep=0.7)
 
-        momentum = df160_top70['涨跌幅'].sum()
 
-        momentums.append(momentum)
-
-    return momentums
+def momentum_factor(adj_date):
+    return list(momentum_panel.loc[adj_date])
 
 
 # 投资组合构建
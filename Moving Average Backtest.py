@@ -44,42 +44,13 @@ gzmt = get_ma(gzmt, 10)
 # 策略回测（利用历史数据，基于交易逻辑测试收益表现）
 # 去除空值
 gzmt = gzmt.dropna()
-# 初始化
-gzmt['cash'] = gzmt['outstanding'] = gzmt['stocks'] = 0
 #%%
-# 初始化现金
-gzmt['cash'].iloc[0] = 1000000
-#%%
-for i in range(1, len(gzmt)):
-    '''
-    策略信号：
-    (1) cash[i-1] != 0, ma5>=ma10, buy;
-    (2) cash[i-1] == 0, ma5>=ma10, hold stock;
-    (3) cash[i-1] != 0, ma5<ma10, hold cash;
-    (4) cash[i-1] == 0, ma5<ma10, sell.
-    '''
-    if gzmt['cash'].iloc[i-1] != 0:
-        if gzmt['ma5'].iloc[i] >= gzmt['ma10'].iloc[i]:
-            # buy
-            gzmt['outstanding'].iloc[i] = gzmt['cash'].iloc[i-1]
-            gzmt['stocks'].iloc[i] = gzmt['outstanding'].iloc[i]/gzmt['close'].iloc[i]
-            gzmt['cash'].iloc[i] = 0
-        if gzmt['ma5'].iloc[i] < gzmt['ma10'].iloc[i]:
-            # hold cash
-            gzmt['cash'].iloc[i] = gzmt['cash'].iloc[i-1]
-            gzmt['outstanding'].iloc[i] = 0
-            gzmt['stocks'].iloc[i] = 0
-    if gzmt['cash'].iloc[i-1] == 0:
-        if gzmt['ma5'].iloc[i] >= gzmt['ma10'].iloc[i]:
-            # hold stocks
-            gzmt['stocks'].iloc[i] = gzmt['stocks'].iloc[i-1]
-            gzmt['outstanding'].iloc[i] = gzmt['stocks'].iloc[i] * gzmt['close'].iloc[i]
-            gzmt['cash'].iloc[i] = 0
-        if gzmt['ma5'].iloc[i] < gzmt['ma10'].iloc[i]:
-            # sell
-            gzmt['cash'].iloc[i] = gzmt['stocks'].iloc[i-1] * gzmt['close'].iloc[i]
-            gzmt['outstanding'].iloc[i] = 0
-            gzmt['stocks'].iloc[i] = 0
+# all_in_out 由回测引擎注入（python -m backtest run）
+# 现金/持股状态机（信号见上），一次推进全部交易日，也可传入多只股票的 (日期 x 股票) 数据
+account = all_in_out(gzmt['close'], gzmt['ma5'] >= gzmt['ma10'], capital=1000000)
+gzmt['cash'] = account['cash']
+gzmt['outstanding'] = account['outstanding']
+gzmt['stocks'] = account['stocks']
 #%%
 gzmt['total_capital'] = gzmt['cash']+gzmt['outstanding']
 # H1. 完善如下函数（思路见上）
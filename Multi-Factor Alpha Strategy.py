@@ -65,26 +65,12 @@ def func_run_monthly(context, bar_dict):
     df = df.dropna()
 
     # 去极值
-    df = winsorize(df, 'valuation_pb', 20).copy()
-    df = winsorize(df, 'valuation_ps_ttm', 20).copy()
-    df = winsorize(df, 'valuation_pe_ttm', 20).copy()
-    df = winsorize(df, 'momentum', 20).copy()
-    df = winsorize(df, 'turnover', 20).copy()
+    factors = ['valuation_pb', 'valuation_ps_ttm', 'valuation_pe_ttm', 'momentum', 'turnover']
+    df = winsorize(df, factors, 20)
     df = df.dropna()
 
     # 为全部A股打分，综合得分越小越好
-    df['scores'] = 0
-
-    list_pb = list(df.sort_values(['valuation_pb'], ascending=True)['valuation_symbol'].values)
-    func_scores(df, list_pb)
-    list_ps = list(df.sort_values(['valuation_ps_ttm'], ascending=True)['valuation_symbol'].values)
-    func_scores(df, list_ps)
-    list_pe = list(df.sort_values(['valuation_pe_ttm'], ascending=True)['valuation_symbol'].values)
-    func_scores(df, list_pe)
-    list_mo = list(df.sort_values(['momentum'], ascending=True)['valuation_symbol'].values)
-    func_scores(df, list_mo)
-    list_to = list(df.sort_values(['turnover'], ascending=True)['valuation_symbol'].values)
-    func_scores(df, list_to)
+    df['scores'] = func_scores(df, factors)
 
     # 根据股票综合得分为股票排序
     context.selected = list(df.sort_values(['scores'], ascending=True)['valuation_symbol'].values)
@@ -121,52 +107,27 @@ def func_get_end_date_of_last_month(current_date):
 
 
 #### 2. 中位数去极值函数 ####################################################
-def winsorize(df, factor, n=20):
+def winsorize(df, factors, n=20):
     '''
-    df为bar_dictFrame数据
-    factor为需要去极值的列名称
+    df为DataFrame数据
+    factors为需要去极值的列名称（可以是多列，各列分别处理）
     n 为判断极值上下边界的常数
+    将不小于中位数+n倍离差中位数、不大于中位数-n倍离差中位数的值赋为NaN
     '''
-    ls_raw = np.array(df[factor].values)
-    ls_raw.sort(axis=0)
-    # 获取中位数
-    D_M = np.median(ls_raw)
-
-    # 计算离差值
-    ls_deviation = abs(ls_raw - D_M)
-    ls_deviation.sort(axis=0)
-    # 获取离差中位数
-    D_MAD = np.median(ls_deviation)
-
-    # 将大于中位数n倍离差中位数的值赋为NaN
-    df.loc[df[factor] >= D_M + n * D_MAD, factor] = None
-    # 将小于中位数n倍离差中位数的值赋为NaN
-    df.loc[df[factor] <= D_M - n * D_MAD, factor] = None
-
+    df = df.copy()
+    df[factors] = mad_clip(df[factors], n, scale=1, drop=True)
     return df
 
 
 #### 3. 按因子排序打分函数 #############################################################
-def func_scores(df, ls):
+def func_scores(df, factors):
     '''
-    按照因子暴露值将股票分为20档
+    按照每个因子的暴露值将股票从小到大分为20档
     第一档股票综合得分+1分
     第二档股票综合得分+2分
-    以此类推
+    以此类推，返回各因子得分之和
     '''
-    quotient = len(ls) // 20
-    remainder = len(ls) % 20
-    layer = np.array([quotient] * 20)
-
-    for i in range(0, remainder):
-        layer[-(1 + i)] += 1
-
-    layer = np.insert(layer, 0, 0)
-    layer = layer.cumsum()
-
-    for i in range(0, 20):
-        for j in range(layer[i], layer[i + 1]):
-            df.loc[df['valuation_symbol'] == ls[j], 'scores'] += (i + 1)
+    return bucket_scores(df[factors], 20).sum(axis=1).astype(int)
 
 
 #### 4.下单函数 ###################################################################
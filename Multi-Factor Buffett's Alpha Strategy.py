@@ -12,8 +12,6 @@ For timing, we use the RSRS method to generate timing signals for the index.
 
 import pandas as pd
 import numpy as np
-import datetime as dt
-import talib as ta
 from datetime import date,timedelta 
 import statsmodels.api as sm
 
@@ -59,22 +57,13 @@ def before_trading(context):
     if context.flag:
         
         initlast_date=context.now-timedelta(days=1)
-        prices = get_price(g.stock, '2006-06-05', initlast_date, '1d', ['high', 'low'])
-        #获取最高价和最低价
-        highs = prices.high
-        lows = prices.low
+        # 整段历史的滚动beta与R方由本地引擎一次向量化算出，并按(指数, 窗口, 数据版本)缓存在行情库目录
+        rsrs = get_rolling_beta(g.stock, g.N, '2006-06-05', initlast_date)
         #建立一个初始的装有beta从过去到初始阶段的历史数据的列表g.ans
-        g.ans = []
-        for i in range(len(highs))[g.N:]:
-            data_high = highs.iloc[i-g.N+1:i+1]
-            data_low = lows.iloc[i-g.N+1:i+1]
-            X = sm.add_constant(data_low)
-            model = sm.OLS(data_high,X)
-            results = model.fit()
-            g.ans.append(results.params[1])
-        
-            # 装有rsquare从过去到初始阶段历史数据的列表    
-            g.ans_rightdev.append(results.rsquared)
+        #与逐日回归的写法一致：第一个窗口以第N+1根K线结束
+        g.ans = list(rsrs['beta'].iloc[1:])
+        # 装有rsquare从过去到初始阶段历史数据的列表
+        g.ans_rightdev = list(rsrs['rsquared'].iloc[1:])
         context.flag=False
 
 
@@ -139,10 +128,7 @@ def handle_bar(context,bar_dict):
         stock_list=list(get_all_securities('stock',date=last_date).index)
         
         #对stock_list进行去除st，停牌等处理
-        stock_list=fun_unpaused(bar_dict, stock_list)
-        stock_list=fun_st(bar_dict,stock_list)
-        stock_list=fun_highlimit(bar_dict,stock_list)
-        stock_list=fun_remove_new(stock_list, 60)
+        stock_list=fun_filter(stock_list, 60)
         
         #以下是各单因子
         #规模因子
@@ -244,19 +230,10 @@ def PB(stocklist, factor,last_date):
 
 
 def MTM20(stocklist, factor):
-    # 取数据
-    for stock in stocklist:
-        df1=history(stock,['close'],20,'1d') 
-    #    log.info(df1)
-        
-        s = pd.DataFrame([(df1['close'][-1]-df1['close'][0])/df1['close'][0]], index=[stock])
-    #    log.info(s)
-        if 'df' in locals():
-            df = df.append(s)
-        else:
-            df = s
-    #log.info(df)
-    df.columns = ['MTM20']
+    # 取数据：全部股票最近20日收盘价，(日期 x 股票)
+    close = history(stocklist,['close'],20,'1d',is_panel=1)['close']
+    # 20日涨幅
+    df = ((close.iloc[-1]-close.iloc[0])/close.iloc[0]).to_frame('MTM20')
     df.index.name = 'valuation_symbol'
     
     # 绝对中位数法取极值
@@ -294,28 +271,12 @@ def net_profit_growth_ratio(stocklist, factor,last_date):
     return after_zscore   
 
 def ATR20(stocklist, new_factor):
-    # 取数据
-    for stock in stocklist:
-        Data_ATR = history(stock,['close','high','low'],20,'1d')
-        close_ATR = np.array(Data_ATR['close'])
-        high_ATR = np.array(Data_ATR['high'])
-        low_ATR = np.array(Data_ATR['low'])
-        '''
-        if np.isnan(close_ATR).any():
-            continue
-        '''    
-        ATR = ta.ATR(high_ATR, low_ATR, close_ATR, timeperiod=1)
-     
-        indices = ~np.isnan(ATR)
-        result = np.average(ATR[indices])
-        s = pd.Series(result.astype(float), index=[stock])
-        if 'ATR_df' in locals():
-            ATR_df = ATR_df.append(s)
-        else:
-            ATR_df = s
-    df = ATR_df.to_frame()
+    # 取数据：全部股票最近20日的 (日期 x 股票) 行情
+    Data_ATR = history(stocklist,['close','high','low'],20,'1d',is_panel=1)
+    # 周期为1的ATR即真实波幅，取20日内有效值的均值
+    ATR = true_range(Data_ATR['high'], Data_ATR['low'], Data_ATR['close'])
+    df = ATR.mean().to_frame(new_factor)
     df.index.name = 'valuation_symbol'
-    df.columns = [new_factor]
     # 绝对中位数法取极值
     after_MAD = MAD(new_factor, df)
     # z-score法标准化
@@ -327,20 +288,8 @@ def ATR20(stocklist, new_factor):
 以下是进行因子数据处理，对因子进行MAD去极值，以及标准化处理
 """    
 def MAD(factor, df):
-    # 取得中位数
-    median = df[factor].median()
-    # 取得数据与中位数差值
-    df1 = df-median
-    # 取得差值绝对值
-    df1 = df1.abs()
-    # 取得绝对中位数
-    MAD = df1[factor].median()
-    # 得到数据上下边界
-    extreme_upper = median + 3 * 1.483 * MAD
-    extreme_lower = median - 3 * 1.483 * MAD
-    # 将数据上下边界外的数值归到边界上
-    df.ix[(df[factor]<extreme_lower), factor] = extreme_lower
-    df.ix[(df[factor]>extreme_upper), factor] = extreme_upper
+    # 数据上下边界为 中位数 +- 3 * 1.483 * 绝对中位数，将边界外的数值归到边界上
+    df[factor] = mad_clip(df[factor], 3, scale=1.483)
     
     return df
 
@@ -348,41 +297,13 @@ def MAD(factor, df):
 
 # z-score标准化
 def zscore(factor, df):
-    # 取得均值
-    mean = df[factor].mean()
-    # 取得标准差
-    std = df[factor].std()
-    # 取得标准化后数据
-    df = (df - mean) / std
-    
-    return df    
+    # 减均值、除以标准差（pandas的std()，ddof=1）
+    return (df[[factor]] - df[factor].mean()) / df[factor].std()
 
 """
 以下对股票列表进行去除ST，停牌，去新股，以及去除开盘涨停股
 """   
-#去除开盘涨停股票
-def fun_highlimit(bar_dict,stock_list):
-    return [stock for stock in stock_list if bar_dict[stock].open!=bar_dict[stock].high_limit]
-
-#去除st股票
-def fun_st(bar_dict,stock_list): 
-    return [stock for stock in stock_list if not bar_dict[stock].is_st]
-
-
- 
-def fun_unpaused(bar_dict, stock_list):
-
-    return [s for s in stock_list if not bar_dict[s].is_paused]     
-
-
-def fun_remove_new(_stock_list, days):
-    
-    deltaDate = get_datetime() - dt.timedelta(days)
-        
-    stock_list = []
-    for stock in _stock_list:
-        if get_security_info(stock).listed_date < deltaDate:
-            stock_list.append(stock)
-        
-    return stock_list        
+#按当日交易状态位一次过滤：停牌、st、开盘涨停，以及上市不满days天的新股
+def fun_filter(stock_list, days):
+    return filter_tradable(stock_list, paused=True, st=True, high_limit=True, new_days=days)
 
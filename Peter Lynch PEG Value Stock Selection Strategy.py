@@ -9,8 +9,6 @@ Strategy:
 '''
 
 import pandas as pd
-import numpy as np
-import datetime as dt
 
 
 def init(context):
@@ -101,19 +99,12 @@ def fun_needRebalance(context):
 
 #### 2.剔除停牌股票函数 #########################################
 def fun_unpaused(_stock_list, bar_dict):
-    return [stock for stock in _stock_list if not bar_dict[stock].is_paused]
+    return filter_tradable(_stock_list, paused=True, st=False)
 
 
 #### 3.剔除上市不到60天的新股 ###################################
 def fun_remove_new(_stock_list, days):
-    deltaDate = get_datetime() - dt.timedelta(days)
-
-    stock_list = []
-    for stock in _stock_list:
-        if get_security_info(stock).start_date < deltaDate:
-            stock_list.append(stock)
-
-    return stock_list
+    return filter_tradable(_stock_list, paused=False, st=False, new_days=days)
 
 
 #### 4.剔除周期性行业 ###########################################
@@ -600,27 +591,10 @@ def fun_do_trade(context, bar_dict, stock_position):
 #### 11.中位数去极值函数 ################################################################
 def winsorize(df, factor, n=20):
     '''
-    df为bar_dictFrame数据
+    df为DataFrame数据
     factor为需要去极值的列名称
     n 为判断极值上下边界的常数
+    将不小于中位数+n倍离差中位数、不大于中位数-n倍离差中位数的值赋为NaN
     '''
-    # 提取该列的数据
-    ls_raw = np.array(df[factor].values)
-    # 排序
-    ls_raw.sort(axis=0)
-    # 获取中位数
-    D_M = np.median(ls_raw)
-
-    # 计算离差值
-    ls_deviation = abs(ls_raw - D_M)
-    # 排序
-    ls_deviation.sort(axis=0)
-    # 获取离差中位数
-    D_MAD = np.median(ls_deviation)
-
-    # 将大于中位数n倍离差中位数的值赋为NaN
-    df.loc[df[factor] >= D_M + n * D_MAD, factor] = None
-    # 将小于中位数n倍离差中位数的值赋为NaN
-    df.loc[df[factor] <= D_M - n * D_MAD, factor] = None
-
+    df[factor] = mad_clip(df[factor], n, scale=1, drop=True)
     return df
\ No newline at end of file
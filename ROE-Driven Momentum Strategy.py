@@ -183,25 +183,14 @@ def check_sell_point(context, stock):
 
 
 def filter_stock_by_days(context, stock_list, days):
-    import datetime
-    tmpList = []
-    for stock in stock_list:
-        days_public = (get_datetime() - get_security_info(stock).start_date).days
-        if days_public > days:
-            tmpList.append(stock)
-    return tmpList
+    # Keep stocks listed for more than `days` days, checked for the whole list at once
+    return filter_listed(stock_list, days)
 
 
 def stock_filter(context, stock_list):
-    date = get_datetime().strftime("%Y%m%d")
-    curr_data = get_price(stock_list, end_date=date, fre_step='1d',
-                          fields=['open', 'high_limit', 'low_limit', 'is_paused', 'is_st'], skip_paused=False, fq='pre',
-                          bar_count=1, is_panel=1)
+    # Suspended and ST stocks are dropped by the day's status flags
+    stock_list = filter_tradable(stock_list, paused=True, st=True)
     return [stock for stock in stock_list if not (
-        # (curr_data.open[stock].item() == curr_data.high_limit[stock].item()) or   # Limit up
-        # (curr_data.open[stock].item() == curr_data.low_limit[stock].item()) or    # Limit down
-            curr_data.is_paused[stock].item() or  # Suspended
-            curr_data.is_st[stock].item() or  # ST
             # (stock.startswith('300')) or    # Startup
             (stock.startswith('688'))  # Tech innovation
     )]
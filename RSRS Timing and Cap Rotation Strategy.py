@@ -16,8 +16,7 @@ If the RSRS indicator value crosses below the threshold -S, close the position.
 If the RSRS indicator value is between -S and S, and the relative sizes of the RSRS values of the two targets change, it indicates a style rotation, and a switch in positions is made. Otherwise, no trade is made.
 '''
 
-import numpy as np
-import statsmodels.api as sm
+import pandas as pd
 
 
 # 初始化函数 ##################################################################
@@ -31,14 +30,17 @@ def init(context):
 def set_params(context):
     context.N = 20  # 取前N日的数据
     context.M = 400  # RSRS指标M变量
-    context.stk1 = '510300.OF'  # 沪深300(大盘)
-    context.stk2 = '510500.OF'  # 中证500(小盘)
+    # 择时指数 -> 交易的ETF，可以扩展到整个ETF池
+    context.targets = {
+        '000300.SH': '510300.OF',  # 沪深300(大盘)
+        '000905.SH': '510500.OF',  # 中证500(小盘)
+    }
     context.S = 0.8
 
 
 # 2.设置中间变量
 def set_variables():
-    pass
+    g.rsrs = {}  # 各指数的滚动RSRS
 
 
 # 3.设置回测条件
@@ -51,7 +53,7 @@ def set_backtest():
 def handle_bar(context, bar_dict):
     # 计算交易信号
     signals = trade_signal(context, bar_dict)
-    log.info(signals)
+    log.info(signals['score'].to_dict())
     # 交易操作
     trade_operation(context, signals)
 
@@ -60,53 +62,27 @@ def handle_bar(context, bar_dict):
 def trade_signal(context, bar_dict):
     N = context.N
     M = context.M
-    # 计算单个标的昨日的RSRS
-    hz300_RSRS = get_RSRS(bar_dict, '000300.SH', N, M)
-    zz500_RSRS = get_RSRS(bar_dict, '000905.SH', N, M)
-    return [hz300_RSRS, zz500_RSRS]
-
-
-# 5.计算RSRS
-def get_RSRS(bar_dict, stock, n, m):
-    values = history(stock, ['high', 'low'], n + m - 1, '1d', skip_paused=True)
-
-    high_array = values.high.values[-(n + m - 1):]
-    low_array = values.low.values[-(n + m - 1):]
-    scores = np.zeros(m)  # 各期斜率
-    for i in range(m):
-        high = high_array[i:i + 30]
-        low = low_array[i:i + 30]
-
-        # 计算单期斜率
-        x = low  # low作为自变量
-        X = sm.add_constant(x)  # 添加常数变量
-        y = high  # high作为因变量
-        model = sm.OLS(y, X)  # 最小二乘法
-        results = model.fit()
-        score = results.params[1]
-        scores[i] = score
-
-        # 记录最后一期的Rsquared(可决系数)
-        if i == m - 1:
-            R_squared = results.rsquared
-
-    # 最近期的标准分
-    z_score = (scores[-1] - scores.mean()) / scores.std()
-
-    # RSRS得分
-    RSRS_socre = z_score * R_squared
-
-    return RSRS_socre
-
-
-# 6.交易操作
+    # 各指数昨日的RSRS：首次取 N+M-1 根K线预热，之后每个交易日只加入最新一根，斜率与R方按累计和增量更新
+    scores = {}
+    for index in context.targets:
+        rsrs = g.rsrs.get(index)
+        if rsrs is None:
+            # 回归窗口沿用原策略的30个点，最近 N+M-1 根K线末尾的窗口截断
+            rsrs = g.rsrs[index] = RollingRSRS(N, M, span=30)
+            count = N + M - 1
+        else:
+            count = 1
+        rsrs.feed(history(index, ['high', 'low'], count, '1d', skip_paused=True))
+        scores[index] = rsrs.score
+    # 按RSRS从大到小排序
+    return pd.DataFrame({'score': scores}).sort_values('score', ascending=False)
+
+
+# 5.交易操作
 def trade_operation(context, signals):
-    # RSRS大的标的 和值
-    signal = max(signals)
-    if signals[0] > signals[1]:
-        stock = context.stk1
-    else:
-        stock = context.stk2
+    # RSRS最大的标的 和值
+    signal = signals['score'].iloc[0]
+    stock = context.targets[signals.index[0]]
 
     if signal > context.S:
         order_value(stock, context.portfolio.stock_account.available_cash * 0.9)
@@ -116,4 +92,3 @@ def trade_operation(context, signals):
     else:
         if len(list(context.portfolio.stock_account.positions.keys())) != 0:
             order_value(stock, context.portfolio.stock_account.available_cash * 0.9)
-
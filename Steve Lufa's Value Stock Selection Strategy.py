@@ -36,21 +36,18 @@ def trade(context, bar_dict):
     if months in context.trade_date:
 
 
-        ##获得购买股票列表
-        PB_list = stocks_PB(context,bar_dict)
-        log.info(len(PB_list))
-        PE_list = stocks_PE(context,bar_dict)
-        log.info(len(PE_list))
-        curAst_to_cap_list = stocks_curAst_to_cap(context,bar_dict)
-        log.info(len(curAst_to_cap_list))
-        PCF_list = stocks_PCF(context,bar_dict)
-        log.info(len(PCF_list))
-        equity_ratio_list = stocks_equity_ratio(context,bar_dict)
-        log.info(len(equity_ratio_list))
-        current_ratio_list = stocks_current_ratio(context,bar_dict)
-        log.info(len(current_ratio_list))
-        ## 获得满足每种条件的股票池
-        stock_list = list(set(PB_list)&set(PE_list)&set(PCF_list)&set(equity_ratio_list)&set(curAst_to_cap_list)&set(current_ratio_list))
+        last_date = get_last_datetime().strftime('%Y%m%d')
+        ##获得各条件的掩码（以股票代码为索引的布尔Series）
+        criteria = [stocks_PB(context,bar_dict),
+                    stocks_PE(context,bar_dict),
+                    stocks_curAst_to_cap(context,bar_dict),
+                    stocks_PCF(context,bar_dict),
+                    stocks_equity_ratio(context,bar_dict),
+                    stocks_current_ratio(context,bar_dict)]
+        for mask in criteria:
+            log.info(int(mask.sum()))
+        ## 获得满足每种条件的股票池：每个条件是同一股票轴上的掩码，一次取交集
+        stock_list = screen_stocks(*criteria, date = last_date)
         log.info(len(stock_list))
 
         ## 卖出
@@ -97,7 +94,7 @@ def handle_bar(context,bar_dict):
 ################## 以下为功能函数, 在主要函数中调用 ##########################
 
 
-# 1. 根据市净率筛选股票列表
+# 1. 根据市净率筛选股票
 def stocks_PB(context,bar_dict):
     last_date = get_last_datetime().strftime('%Y%m%d')
     PB = get_fundamentals(query(
@@ -108,11 +105,10 @@ def stocks_PB(context,bar_dict):
         ).order_by(
             valuation.pb.asc()
         ),date = last_date)
-    PB_mean = PB['valuation_pb'].mean()
-    PB = PB[PB['valuation_pb']<PB_mean]
-    return list(PB['valuation_symbol'])
+    PB = PB.set_index('valuation_symbol')['valuation_pb']
+    return PB < PB.mean()
 
-# 2. 根据市盈率筛选股票列表
+# 2. 根据市盈率筛选股票
 def stocks_PE(context,bar_dict):
     last_date = get_last_datetime().strftime('%Y%m%d')
     PE = get_fundamentals(query(
@@ -123,10 +119,9 @@ def stocks_PE(context,bar_dict):
         ).order_by(
             valuation.pe.asc()
         ),date = last_date)
-    PE_mean = PE['valuation_pe'].mean()
-    PE = PE[PE['valuation_pe']<PE_mean]
-    return list(PE['valuation_symbol'])
-# 3. 根据流动资产和市值条件来筛选股票列表
+    PE = PE.set_index('valuation_symbol')['valuation_pe']
+    return PE < PE.mean()
+# 3. 根据流动资产和市值条件来筛选股票
 def stocks_curAst_to_cap(context,bar_dict):
     last_date = get_last_datetime().strftime('%Y%m%d')
     curAst_to_cap_list = get_fundamentals(query(
@@ -134,10 +129,10 @@ def stocks_curAst_to_cap(context,bar_dict):
             balance.total_current_assets,
             valuation.market_cap
         ),date = last_date)
-    curAst_to_cap_list['curAst_to_cap'] = curAst_to_cap_list['balance_total_current_assets']/curAst_to_cap_list['valuation_market_cap']
-    curAst_to_cap_list = curAst_to_cap_list[curAst_to_cap_list['curAst_to_cap']>=0.3]
-    return list(curAst_to_cap_list['balance_symbol'])
-# 4. 根据市现率筛选股票列表
+    curAst_to_cap_list = curAst_to_cap_list.set_index('balance_symbol')
+    curAst_to_cap = curAst_to_cap_list['balance_total_current_assets']/curAst_to_cap_list['valuation_market_cap']
+    return curAst_to_cap >= 0.3
+# 4. 根据市现率筛选股票
 def stocks_PCF(context,bar_dict):
     last_date = get_last_datetime().strftime('%Y%m%d')
     PCF = get_fundamentals(query(
@@ -149,10 +144,9 @@ def stocks_PCF(context,bar_dict):
             valuation.pcf.asc()
         ),date = last_date)
 
-    PCF_mean = PCF['valuation_pcf'].mean()
-    PCF = PCF[PCF['valuation_pcf']<PCF_mean]
-    return list(PCF['valuation_symbol'])
-# 5. 根据产权比率条件来筛选股票列表
+    PCF = PCF.set_index('valuation_symbol')['valuation_pcf']
+    return PCF < PCF.mean()
+# 5. 根据产权比率条件来筛选股票
 def stocks_equity_ratio(context,bar_dict):
     last_date = get_last_datetime().strftime('%Y%m%d')
     equity_ratio = get_fundamentals(query(
@@ -161,8 +155,8 @@ def stocks_equity_ratio(context,bar_dict):
         ).filter(
             debtrepay.equity_ratio<0.5
             ),date = last_date)
-    return list(equity_ratio['debtrepay_symbol'])
-# 6. 根据流动比率筛选股票列表
+    return pd.Series(True, index=equity_ratio['debtrepay_symbol'])
+# 6. 根据流动比率筛选股票
 def stocks_current_ratio(context,bar_dict):
     last_date = get_last_datetime().strftime('%Y%m%d')
     Current_ratio = get_fundamentals(query(
@@ -171,6 +165,5 @@ def stocks_current_ratio(context,bar_dict):
         ).order_by(
             debtrepay.current_ratio.desc()
         ),date = last_date)
-    Current_ratio_mean = Current_ratio['debtrepay_current_ratio'].mean()
-    Current_ratio = Current_ratio[Current_ratio['debtrepay_current_ratio']>Current_ratio_mean]
-    return list(Current_ratio['debtrepay_symbol'])
+    Current_ratio = Current_ratio.set_index('debtrepay_symbol')['debtrepay_current_ratio']
+    return Current_ratio > Current_ratio.mean()
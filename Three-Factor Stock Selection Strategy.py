@@ -1,7 +1,6 @@
 
 
 import pandas as pd
-import numpy as np
 import datetime
 
 
@@ -24,53 +23,32 @@ def reallocation(context, bar_dict):
     date = time.strftime('%Y%m%d')
     # 获得股票池列表
     sample = context.iwencai_securities
-    # 创建字典用于存储因子值
-    df = {'security': [], 1: [], 2: [], 3: [], 'score': []}
 
-    # 因子选择
-    for security in sample:
-        q = query(
-            profit.roic,  # 投资回报率
-            valuation.pb,  # 市净率
-            valuation.ps_ttm,  # 市销率
-        ).filter(
-            profit.symbol == security
-        )
-
-        # 缺失值填充为0
-        fdmt = get_fundamentals(q, date=date).fillna(0)
-
-        # 判断是否有数据
-        if (not (fdmt['profit_roic'].empty or
-                 fdmt['valuation_pb'].empty or
-                 fdmt['valuation_ps_ttm'].empty)):
-            # 计算并填充因子值
-            df['security'].append(security)
-            df[1].append(fdmt['profit_roic'][0])  # 因子1：投资回报率
-            df[2].append(fdmt['valuation_pb'][0])  # 因子2：市净率
-            df[3].append(fdmt['valuation_ps_ttm'][0])  # 因子3：市销率
-
-    for i in range(1, 4):
-        # 因子极值处理，中位数去极值法
-        m = np.mean(df[i])
-        s = np.std(df[i])
-        for j in range(len(df[i])):
-            if df[i][j] <= m - 3 * s:
-                df[i][j] = m - 3 * s
-            if df[i][j] >= m + 3 * s:
-                df[i][j] = m + 3 * s
-        m = np.mean(df[i])
-        s = np.std(df[i])
-
-        # 因子无量纲处理，标准化法
-        for j in range(len(df[i])):
-            df[i][j] = (df[i][j] - m) / s
-
-    # 计算综合因子得分
-    for i in range(len(df['security'])):
-        # 等权重计算(注意因子方向)
-        s = (df[1][i] - df[2][i] - df[3][i])
-        df['score'].append(s)
+    # 因子选择：股票池的三个因子一次查询取出
+    q = query(
+        profit.symbol,
+        profit.roic,  # 投资回报率
+        valuation.pb,  # 市净率
+        valuation.ps_ttm,  # 市销率
+    ).filter(
+        profit.symbol.in_(sample)
+    )
+
+    # 缺失值填充为0，按股票池顺序排列，没有数据的股票不参与打分
+    fdmt = get_fundamentals(q, date=date).fillna(0).set_index('profit_symbol')
+    fdmt = fdmt.reindex([security for security in sample if security in fdmt.index])
+    df = pd.DataFrame({
+        'security': list(fdmt.index),
+        1: fdmt['profit_roic'].values,  # 因子1：投资回报率
+        2: fdmt['valuation_pb'].values,  # 因子2：市净率
+        3: fdmt['valuation_ps_ttm'].values,  # 因子3：市销率
+    })
+
+    # 因子极值处理，3倍标准差截断；再做无量纲处理，标准化法
+    df[[1, 2, 3]] = zscore(sigma_clip(df[[1, 2, 3]], 3))
+
+    # 计算综合因子得分，等权重计算(注意因子方向)
+    df['score'] = df[1] - df[2] - df[3]
 
     # 按综合因子得分由大到小排序
     df = pd.DataFrame(df).sort_values(by='score', ascending=False)
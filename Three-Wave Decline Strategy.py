@@ -13,8 +13,6 @@ The earnings per share are greater than 0, preventing the decline from being due
 Five-Day Holding Period
 
 '''
-import talib as tl
-import datetime
 
 
 ############################## 以下为主要函数  ################################
@@ -89,40 +87,17 @@ def stocks_to_buy(context, bar_dict):
 # 6.获取初始股票池
 def get_raw_stocks(bar_dict):
     tdate = get_datetime().strftime("%Y%m%d")  # 当天日期
-    today_datetime = datetime.datetime.strptime(tdate, "%Y%m%d")
-    yesterday_time = get_datetime() - datetime.timedelta(days=1)
-    yesterday_date = yesterday_time.strftime("%Y%m%d")  # 昨日日期
 
     # 获取所有股票
-    stocks = get_all_securities("stock", tdate)
-    # 排除新股
-    stocks = stocks[(today_datetime - stocks.start_date) > datetime.timedelta(60)].index.values
-    # 排除停牌股票
-    stocks = [stock for stock in stocks if bar_dict[stock].is_paused == 0]
-    # 排除开盘涨跌停
-    stocks = [stock for stock in stocks if bar_dict[stock].open != bar_dict[stock].high_limit
-              and bar_dict[stock].open != bar_dict[stock].low_limit]
-    # 排除st
-    stocks = [stock for stock in stocks if bar_dict[stock].is_st == 0]
-
-    return stocks
+    stocks = list(get_all_securities("stock", tdate).index)
+    # 按当日交易状态位一次排除：停牌、开盘涨跌停、st，以及上市不超过60天的新股
+    return filter_tradable(stocks, paused=True, st=True, high_limit=True, low_limit=True, new_days=61)
 
 
 # 7.挑选三浪下跌形态股票
 def get_CDLBREAKAWAY_stocks(stocks, bar_dict):
-    Waves_fall_stocks = []
-    for stock in stocks:
-        value = history(stock, ['close'], 6, '1d', True)
-        roc_array = value['close'].pct_change().dropna().values
-        try:
-            if roc_array[0] < -0.05 and roc_array[1] > 0 and roc_array[1] < 0.04 and \
-                    roc_array[2] < 0.01 and roc_array[3] < -0.02 and roc_array[4] < -0.01:
-                Waves_fall_stocks.append(stock)
-        # 跳过无数据的股票
-        except:
-            log.info(stock + "无数据")
-            continue
-    return Waves_fall_stocks
+    # 最近6根交易K线的5个涨跌幅依次满足三浪下跌条件，从全历史事件表中一次查出（无数据的股票不计入）
+    return scan_patterns(stocks, 'THREE_WAVE_DECLINE')['THREE_WAVE_DECLINE']
 
 
 # 8.交易操作
@@ -0,0 +1,12 @@
+"""
+Local backtest engine for the strategy scripts in this repository.
+
+    python -m backtest run "SAR Trading Strategy.py" --store data/bars --start 2010-01-01
+"""
+from .account import Portfolio, Position, PerShare, PriceSlippage
+from .engine import Engine, Session
+from .fundamentals import Fundamentals, query
+from .jqapi import JoinQuantSession
+from .minute import MinuteStore
+from .portal import DataPortal
+from .store import BarStore
@@ -0,0 +1,146 @@
+"""
+Command line entry point.
+
+    python -m backtest run STRATEGY.py --store DIR [--fundamentals DIR] [--minutes DIR] [--bar-time HH:MM]
+                                 [--start D] [--end D]
+    python -m backtest convert ARCHIVE.zip DIR
+    python -m backtest ingest ARCHIVE.zip DIR [--workers N]
+    python -m backtest append ARCHIVE.zip DIR [--workers N]
+    python -m backtest sweep --store DIR --fast 3 5 10 --slow 20 30 60 [--symbols S...] [--out FILE]
+"""
+import argparse
+import datetime
+import logging
+import os
+import time
+
+from .archive import convert
+from .engine import Engine
+from .fundamentals import Fundamentals
+from .ingest import append, ingest
+from .minute import MinuteStore
+from .portal import OPEN_TIME
+from .store import BarStore
+from .sweep import summary, sweep
+
+
+def bar_time(text):
+    # 'HH:MM' -> datetime.time
+    try:
+        return datetime.datetime.strptime(text, '%H:%M').time()
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected HH:MM, got %r' % text)
+
+
+def cmd_run(args):
+    store = BarStore.load(args.store)
+    fundamentals = Fundamentals.load(args.fundamentals) if args.fundamentals else None
+    minutes = MinuteStore(args.minutes) if args.minutes else None
+    engine = Engine(store, start=args.start, end=args.end, capital=args.capital, fundamentals=fundamentals,
+                    benchmark=args.benchmark, minutes=minutes, bar_time=args.bar_time)
+    for path in args.strategy:
+        t0 = time.time()
+        result = engine.run(path)
+        print('%s: %d bars in %.1fs, final value %.2f' % (path, len(result), time.time() - t0,
+                                                          result['portfolio_value'].iloc[-1]))
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            result.to_csv(os.path.join(args.out, os.path.splitext(os.path.basename(path))[0] + '.csv'))
+
+
+def cmd_convert(args):
+    t0 = time.time()
+    store = convert(args.source, args.store)
+    print('%d symbols x %d days written to %s in %.1fs' % (len(store.symbols), len(store.dates), args.store,
+                                                          time.time() - t0))
+
+
+def cmd_ingest(args):
+    store, stats = ingest(args.source, args.store, workers=args.workers, batch_size=args.batch_size,
+                          merge=not args.rebuild)
+    print('%d members, %d rows parsed in %.1fs (%.0f rows/sec), store written in %.1fs total' % (
+        stats['members'], stats['rows'], stats['parse_seconds'], stats['rows_per_sec'], stats['seconds']))
+    if stats['dropped_fields']:
+        print('rebuild dropped fields not in the archive: %s' % ', '.join(stats['dropped_fields']))
+
+
+def cmd_append(args):
+    store, stats = append(args.source, args.store, workers=args.workers, batch_size=args.batch_size)
+    print('%d members parsed in %.1fs, %d new days appended (store now ends %s) in %.1fs total' % (
+        stats['members'], stats['parse_seconds'], stats['days'], store.dates[-1], stats['seconds']))
+
+
+def cmd_sweep(args):
+    store = BarStore.load(args.store)
+    close = store.frame('close', args.symbols, args.start, args.end)
+    t0 = time.time()
+    table = sweep(close, args.fast, args.slow, cost=args.cost, workers=args.workers)
+    print('%d cells x %d symbols in %.1fs' % (len(table) // max(close.shape[1], 1), close.shape[1], time.time() - t0))
+    print(summary(table).sort_values('sharpe', ascending=False).to_string())
+    if args.out:
+        table.to_csv(args.out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m backtest')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('run', help='run strategy scripts over a local bar store')
+    p.add_argument('strategy', nargs='+')
+    p.add_argument('--store', required=True)
+    p.add_argument('--fundamentals')
+    p.add_argument('--minutes', help='minute bar store for fre_step=\'1m\' requests')
+    p.add_argument('--bar-time', type=bar_time, default=OPEN_TIME,
+                   help='time of day the scripts run at (HH:MM); 1m bars up to this minute are visible and '
+                        'orders fill at its close, e.g. 14:55 for scripts that read same-day minute bars; '
+                        'needs --minutes when after 09:30')
+    p.add_argument('--start')
+    p.add_argument('--end')
+    p.add_argument('--capital', type=float, default=1000000)
+    p.add_argument('--benchmark', default='000300.SH')
+    p.add_argument('--out', help='directory for one result csv per strategy')
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser('convert', help='convert a CSV archive (zip or directory) into a bar store')
+    p.add_argument('source')
+    p.add_argument('store')
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser('ingest', help='parse a CSV archive in a process pool and merge it into a bar store')
+    p.add_argument('source')
+    p.add_argument('store')
+    p.add_argument('--workers', type=int)
+    p.add_argument('--batch-size', type=int, default=32)
+    p.add_argument('--rebuild', action='store_true', help='drop symbols and fields of an existing store not in the archive')
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser('append', help='append the trading days after the end of an existing bar store')
+    p.add_argument('source')
+    p.add_argument('store')
+    p.add_argument('--workers', type=int)
+    p.add_argument('--batch-size', type=int, default=32)
+    p.set_defaults(func=cmd_append)
+
+    p = sub.add_parser('sweep', help='dual moving-average crossover over a grid of (fast, slow) windows')
+    p.add_argument('--store', required=True)
+    p.add_argument('--symbols', nargs='+', help='default: every symbol in the store')
+    p.add_argument('--fast', type=int, nargs='+', required=True)
+    p.add_argument('--slow', type=int, nargs='+', required=True)
+    p.add_argument('--start')
+    p.add_argument('--end')
+    p.add_argument('--cost', type=float, default=0.0)
+    p.add_argument('--workers', type=int)
+    p.add_argument('--out', help='csv file for the per-symbol table')
+    p.set_defaults(func=cmd_sweep)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run' and args.bar_time > OPEN_TIME and not args.minutes:
+        parser.error('--bar-time after 09:30 fills orders at that minute and needs --minutes')
+    if args.command == 'sweep' and min(args.fast) >= max(args.slow):
+        parser.error('no --fast window is shorter than a --slow window')
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
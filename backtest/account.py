@@ -0,0 +1,279 @@
+"""
+Portfolio bookkeeping and order matching for the local engine.
+
+Orders are matched immediately against the current bar's opening price,
+adjusted by slippage, in whole lots of 100 shares for buys.  Shares bought
+today only become sellable on the next trading day (T+1).
+"""
+import itertools
+import math
+
+import numpy as np
+
+LOT = 100
+
+
+# 交易成本 ###################################################################
+class PriceSlippage(object):
+    '''可变滑点：买入价 = 委托价 * (1 + value/2)，卖出价 = 委托价 * (1 - value/2)'''
+
+    def __init__(self, value=0.0):
+        self.value = value
+
+    def apply(self, price, side):
+        return price * (1 + side * self.value / 2)
+
+
+class PerShare(object):
+    '''按成交额比例收取佣金，卖出另收印花税'''
+
+    def __init__(self, type='stock', cost=0.0003, min_trade_cost=5.0, tax=0.001):
+        self.type = type
+        self.cost = cost
+        self.min_trade_cost = min_trade_cost
+        self.tax = tax
+
+    def commission(self, value, side):
+        fee = max(value * self.cost, self.min_trade_cost) if value > 0 else 0.0
+        if side < 0:
+            fee += value * self.tax
+        return fee
+
+
+PerTrade = PerShare
+
+
+class OrderCost(object):
+    '''聚宽交易成本：开平仓佣金分别设置，卖出收印花税close_tax'''
+
+    def __init__(self, open_tax=0, close_tax=0.001, open_commission=0.0003, close_commission=0.0003,
+                 close_today_commission=0, min_commission=5):
+        self.open_tax = open_tax
+        self.close_tax = close_tax
+        self.open_commission = open_commission
+        self.close_commission = close_commission
+        self.min_commission = min_commission
+
+    def commission(self, value, side):
+        if value <= 0:
+            return 0.0
+        if side > 0:
+            return max(value * self.open_commission, self.min_commission) + value * self.open_tax
+        return max(value * self.close_commission, self.min_commission) + value * self.close_tax
+
+
+class SIDE(object):
+    BUY = 'buy'
+    SELL = 'sell'
+
+
+class ORDER_STATUS(object):
+    FILLED = 'filled'
+    REJECTED = 'rejected'
+    CANCELLED = 'cancelled'
+
+
+class Order(object):
+
+    def __init__(self, order_id, symbol, volume, price, status):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.order_type = SIDE.BUY if volume > 0 else SIDE.SELL
+        self.volume = abs(volume)
+        self.price = price
+        self.status = status
+
+
+# 持仓与账户 #################################################################
+class Position(object):
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.amount = 0
+        self.available_amount = 0
+        self.cost_basis = 0.0
+        self.last_price = np.nan
+
+    @property
+    def market_value(self):
+        return self.amount * self.last_price if self.amount else 0.0
+
+    value = market_value
+
+    # 聚宽字段名
+    @property
+    def total_amount(self):
+        return self.amount
+
+    @property
+    def closeable_amount(self):
+        return self.available_amount
+
+    @property
+    def avg_cost(self):
+        return self.cost_basis
+
+    @property
+    def price(self):
+        return self.last_price
+
+    @property
+    def profit_rate(self):
+        if not self.amount or not self.cost_basis:
+            return 0.0
+        return self.last_price / self.cost_basis - 1
+
+
+class Positions(dict):
+    '''只保存非零持仓；查询未持有的股票返回空仓位而不写入'''
+
+    def __missing__(self, symbol):
+        return Position(symbol)
+
+
+class StockAccount(object):
+
+    def __init__(self, cash):
+        self.cash = float(cash)
+        self.positions = Positions()
+
+    @property
+    def available_cash(self):
+        return self.cash
+
+    @property
+    def market_value(self):
+        return sum(p.market_value for p in self.positions.values())
+
+    @property
+    def total_value(self):
+        return self.cash + self.market_value
+
+
+class Portfolio(object):
+
+    def __init__(self, cash):
+        self.stock_account = StockAccount(cash)
+
+    @property
+    def positions(self):
+        return self.stock_account.positions
+
+    @property
+    def available_cash(self):
+        return self.stock_account.cash
+
+    cash = available_cash
+
+    @property
+    def positions_value(self):
+        return self.stock_account.market_value
+
+    market_value = positions_value
+
+    @property
+    def portfolio_value(self):
+        return self.stock_account.total_value
+
+    total_value = portfolio_value
+
+
+# 撮合 #######################################################################
+class Broker(object):
+
+    def __init__(self, portal, portfolio, log):
+        self.portal = portal
+        self.portfolio = portfolio
+        self.log = log
+        self.slippage = PriceSlippage(0.0)
+        self.cost = PerShare()
+        self.on_order = None
+        self._ids = itertools.count(1)
+
+    def new_day(self):
+        # T+1：昨日买入的股票今日可卖
+        for p in self.portfolio.positions.values():
+            p.available_amount = p.amount
+
+    def mark(self, i, field='close'):
+        # 以收盘价更新持仓最新价（停牌沿用上一价格）
+        arr = self.portal.store.fields[field]
+        for symbol, p in self.portfolio.positions.items():
+            price = arr[i, self.portal.column(symbol)]
+            if not np.isnan(price):
+                p.last_price = float(price)
+
+    def price(self, symbol):
+        if not self.portal.has(symbol):
+            return np.nan
+        if self.portal.intraday:
+            # 盘中决策按当时的分钟K线成交，不能用当日开盘价
+            return self.portal.minute_close(symbol)
+        bar = self.portal.store.fields['open'][self.portal.i, self.portal.column(symbol)]
+        return float(bar)
+
+    def order(self, symbol, amount):
+        price = self.price(symbol)
+        if np.isnan(price) or price <= 0:
+            self.log.warn('%s 停牌或无行情，委托被拒绝' % symbol)
+            return None
+        account = self.portfolio.stock_account
+        position = account.positions[symbol]
+        if amount > 0:
+            fill = self.fill_price(price, 1)
+            amount = int(amount // LOT) * LOT
+            while amount > 0 and amount * fill + self.cost.commission(amount * fill, 1) > account.cash:
+                amount -= LOT
+            if amount <= 0:
+                return None
+            value = amount * fill
+            fee = self.cost.commission(value, 1)
+            position.cost_basis = (position.cost_basis * position.amount + value + fee) / (position.amount + amount)
+            position.amount += amount
+            account.cash -= value + fee
+        else:
+            amount = -min(-amount, position.available_amount)
+            if amount >= 0:
+                return None
+            fill = self.fill_price(price, -1)
+            value = -amount * fill
+            account.cash += value - self.cost.commission(value, -1)
+            position.amount += amount
+            position.available_amount += amount
+        position.last_price = price
+        if position.amount:
+            account.positions[symbol] = position
+        else:
+            account.positions.pop(symbol, None)
+        odr = Order(next(self._ids), symbol, amount, fill, ORDER_STATUS.FILLED)
+        if self.on_order is not None:
+            self.on_order(odr)
+        return odr.order_id
+
+    def fill_price(self, price, side):
+        return self.slippage.apply(price, side)
+
+    # 下单接口 ###############################################################
+    def order_value(self, symbol, value):
+        price = self.price(symbol)
+        if np.isnan(price) or price <= 0:
+            return self.order(symbol, 0)
+        return self.order(symbol, math.floor(value / price) if value > 0 else -math.floor(-value / price))
+
+    def order_percent(self, symbol, percent):
+        return self.order_value(symbol, self.portfolio.portfolio_value * percent)
+
+    def order_target(self, symbol, amount):
+        return self.order(symbol, amount - self.portfolio.positions[symbol].amount)
+
+    def order_target_value(self, symbol, value):
+        price = self.price(symbol)
+        if np.isnan(price) or price <= 0:
+            return self.order(symbol, 0)
+        held = self.portfolio.positions[symbol].amount
+        if value <= 0:
+            return self.order(symbol, -held)
+        return self.order(symbol, math.floor(value / price) - held)
+
+    def order_target_percent(self, symbol, percent):
+        return self.order_target_value(symbol, self.portfolio.portfolio_value * percent)
@@ -0,0 +1,185 @@
+"""
+Readers for the stock-trading-data-pro CSV archive.
+
+The archive (e.g. stock-trading-data-pro-2024-04-17N.zip) holds one GBK CSV
+per stock named like sh600000.csv / sz000001.csv, with a disclaimer line
+above the header (hence header=1), as read by "Momentum Factor.py" and
+"Max_Vol.py".  A plain directory of the same CSV files is accepted as well.
+
+    python -m backtest convert stock-trading-data-pro-2024-04-17N.zip data/bars
+
+For exploration without a full ingest, ArchiveReader decodes members on
+demand and keeps the decoded frames in a byte-bounded LRU cache:
+
+    reader = ArchiveReader('stock-trading-data-pro-2024-04-17N.zip')
+    dfs = reader.get_many(files)     # 'sz000001.csv' / 'sz000001' / '000001.SZ'
+"""
+import glob
+import io
+import os
+import zipfile
+from collections import OrderedDict
+
+import pandas as pd
+
+from .store import FIELDS, BarStore
+
+# CSV列名 -> 行情库字段名
+COLUMNS = {
+    '开盘价': 'open',
+    '最高价': 'high',
+    '最低价': 'low',
+    '收盘价': 'close',
+    '成交量': 'volume',
+    '成交额': 'turnover',
+}
+DATE_COLUMN = '交易日期'
+
+
+def normalize_member(name):
+    # 'sz000001.csv' / 'sz000001' / '000001.SZ' -> '000001.SZ'
+    base = os.path.splitext(os.path.basename(name))[0] if name.lower().endswith('.csv') else name
+    if '.' in base:
+        return base.upper()
+    return '%s.%s' % (base[2:], base[:2].upper())
+
+
+def member_symbol(name):
+    # 'sz000001.csv' -> '000001.SZ'
+    base = os.path.splitext(os.path.basename(name))[0]
+    return '%s.%s' % (base[2:], base[:2].upper())
+
+
+def list_members(source):
+    # zip内或目录下的全部股票CSV
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as z:
+            return [n for n in z.namelist() if n.lower().endswith('.csv')]
+    return sorted(f for f in glob.glob(os.path.join(source, '*.csv')) if not f.endswith('result.csv'))
+
+
+# 固定列类型，避免pandas逐列推断
+DTYPES = dict({c: 'float64' for c in COLUMNS}, **{DATE_COLUMN: str})
+
+
+def rows_after(f, since):
+    '''
+    只保留交易日期晚于 since（'YYYY-MM-DD'）的数据行，免责声明和表头照旧，旧数据不交给pandas解析
+    日期是定长文本，可以直接按字节比较；GBK的多字节字符不含逗号和换行
+    '''
+    if isinstance(f, str):
+        with open(f, 'rb') as fh:
+            data = fh.read()
+    else:
+        data = f.read()
+    lines = data.splitlines(keepends=True)
+    k = lines[1].decode('gbk').strip().split(',').index(DATE_COLUMN)
+    since = since.encode('ascii')
+    keep = lines[:2]
+    for line in lines[2:]:
+        parts = line.split(b',', k + 1)
+        if len(parts) > k and parts[k] > since:
+            keep.append(line)
+    return io.BytesIO(b''.join(keep))
+
+
+def parse_csv(f, since=None):
+    # since: 只解析交易日期晚于该日的行
+    if since is not None:
+        f = rows_after(f, since)
+    df = pd.read_csv(f, encoding='gbk', header=1, usecols=[DATE_COLUMN] + list(COLUMNS), dtype=DTYPES)
+    df.index = pd.to_datetime(df.pop(DATE_COLUMN), format='%Y-%m-%d')
+    df = df.rename(columns=COLUMNS)
+    return df[~df.index.duplicated(keep='last')].sort_index()
+
+
+def read_member(source, name):
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as z, z.open(name) as f:
+            return parse_csv(f)
+    return parse_csv(name)
+
+
+def convert(source, path, members=None):
+    '''
+    一次性把CSV归档转换成内存映射行情库
+    members: 只转换指定的文件名，默认全部
+    '''
+    members = list(members or list_members(source))
+    frames = {}
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as z:
+            for name in members:
+                with z.open(name) as f:
+                    frames[member_symbol(name)] = parse_csv(f)
+    else:
+        for name in members:
+            frames[member_symbol(name)] = parse_csv(name)
+    return BarStore.write(path, frames, FIELDS)
+
+
+class ArchiveReader(object):
+    '''
+    按需读取zip归档中的单只股票
+    打开时只读取一次zip中央目录，成员在首次请求时才解压解析
+    返回的DataFrame与缓存共用，需要原地修改时请先copy()
+    '''
+
+    def __init__(self, source, max_bytes=512 * 2 ** 20):
+        self.source = source
+        self.max_bytes = max_bytes
+        self._zip = zipfile.ZipFile(source)
+        self._members = {member_symbol(info.filename): info for info in self._zip.infolist()
+                         if info.filename.lower().endswith('.csv')}
+        self._cache = OrderedDict()
+        self._bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+        self._cache.clear()
+        self._bytes = 0
+
+    @property
+    def symbols(self):
+        return sorted(self._members)
+
+    def __contains__(self, name):
+        return normalize_member(name) in self._members
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def get(self, name):
+        symbol = normalize_member(name)
+        df = self._cache.get(symbol)
+        if df is not None:
+            self._cache.move_to_end(symbol)
+            return df
+        with self._zip.open(self._members[symbol]) as f:
+            df = parse_csv(f)
+        self._put(symbol, df)
+        return df
+
+    def get_many(self, names):
+        return {name: self.get(name) for name in names}
+
+    def _put(self, symbol, df):
+        # 超出字节上限时淘汰最久未使用的成员
+        size = int(df.memory_usage(index=True).sum())
+        if size > self.max_bytes:
+            return
+        self._cache[symbol] = df
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, old = self._cache.popitem(last=False)
+            self._bytes -= int(old.memory_usage(index=True).sum())
+
+    @property
+    def cached_bytes(self):
+        return self._bytes
@@ -0,0 +1,364 @@
+"""
+Local runner for the SuperMind-style strategy scripts in this repository.
+
+A strategy file is executed unchanged inside a namespace that provides the
+platform API (init/before_trading/handle_bar/after_trading_end callbacks,
+history, get_price, bar_dict, order_*, context.portfolio, run_monthly, ...).
+All market data comes from one BarStore, so a daily full-market backtest is a
+loop over row indexes of in-memory arrays.  Scripts written for JoinQuant or
+the account/data style are picked up by jqapi.JoinQuantSession and share the
+same store, so any mix of dialects can run in one process.
+
+The namespace also provides the package's panel helpers (psy, zscore,
+mad_clip, long_momentum, ...).  They are plain globals: a function or
+variable of the same name defined in the script replaces the injected one
+for the whole script, as with any module global.
+
+    store = BarStore.load('data/bars')
+    engine = Engine(store, start='2010-01-01', end='2024-12-31')
+    result = engine.run('SAR Trading Strategy.py')
+"""
+import inspect
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .account import (ORDER_STATUS, SIDE, Broker, PerShare, PerTrade, Portfolio, PriceSlippage)
+from .factors import bucket_scores, long_momentum, psy, true_range
+from .fundamentals import TABLES, Fundamentals, Table, query
+from .patterns import PatternScanner
+from .portal import OPEN_TIME, BarDict, DataPortal, as_list
+from .preprocess import mad_clip, sigma_clip, zscore
+from .rolling import RollingRSRS
+from .rules import all_in_out
+
+
+class Log(object):
+    '''策略内的log对象，日志前缀为当前回测日期'''
+
+    def __init__(self, portal, name='backtest.strategy'):
+        self._portal = portal
+        self._logger = logging.getLogger(name)
+
+    def _emit(self, level, msg, *args):
+        self._logger.log(level, '%s %s', self._portal.now.strftime('%Y-%m-%d'), msg % args if args else msg)
+
+    def debug(self, msg, *args):
+        self._emit(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self._emit(logging.INFO, msg, *args)
+
+    def warn(self, msg, *args):
+        self._emit(logging.WARNING, msg, *args)
+
+    warning = warn
+
+    def error(self, msg, *args):
+        self._emit(logging.ERROR, msg, *args)
+
+
+class G(object):
+    '''全局变量对象g'''
+
+
+class Context(object):
+
+    def __init__(self, portal, portfolio):
+        self._portal = portal
+        self.portfolio = portfolio
+
+    @property
+    def now(self):
+        return self._portal.now
+
+
+def calendar_positions(dates, unit):
+    '''
+    每个交易日在所属月('M')或周('W')内的序号
+    返回 (pos, rev)：pos 从1开始计数，rev 从-1开始倒数
+    '''
+    days = dates.astype('datetime64[D]')
+    if unit == 'M':
+        key = days.astype('datetime64[M]').astype(np.int64)
+    else:
+        # 1970-01-01为周四，+3后以周一为一周的起点
+        key = (days.astype(np.int64) + 3) // 7
+    start = np.r_[True, key[1:] != key[:-1]]
+    group = np.cumsum(start) - 1
+    first = np.flatnonzero(start)
+    last = np.r_[first[1:] - 1, len(days) - 1]
+    idx = np.arange(len(days))
+    return idx - first[group] + 1, idx - last[group] - 1
+
+
+def arity(func):
+    # 回调函数的位置参数个数，用于兼容 handle_bar(context) 与 handle_bar(context, bar_dict)
+    params = inspect.signature(func).parameters.values()
+    if any(p.kind == p.VAR_POSITIONAL for p in params):
+        return None
+    return len([p for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)])
+
+
+def call(func, *args):
+    n = arity(func)
+    return func(*(args if n is None else args[:n]))
+
+
+class Session(object):
+    '''一次策略回测：独立的命名空间、账户与调度，行情数据与引擎共享'''
+
+    init_name = 'init'
+    before_names = ('before_trading', 'open_auction')
+    bar_name = 'handle_bar'
+    after_names = ('after_trading_end', 'after_trading')
+
+    def __init__(self, engine, path):
+        self.engine = engine
+        self.path = path
+        self.portal = DataPortal(engine.store, engine.securities, engine.bar_time, engine.minutes)
+        self.portal.set_index(engine.i_start)
+        self.patterns = PatternScanner(self.portal)
+        self.log = Log(self.portal)
+        self.portfolio = Portfolio(engine.capital)
+        self.broker = Broker(self.portal, self.portfolio, self.log)
+        self.context = self.make_context()
+        self.bar_dict = BarDict(self.portal)
+        self.bar_arg = self.bar_dict
+        self.g = G()
+        self.schedule = []
+        self.iwencai = []
+        self.records = {}
+        self.benchmark = engine.benchmark
+        self.ns = self.namespace()
+
+    def make_context(self):
+        return Context(self.portal, self.portfolio)
+
+    # 1. 平台API ############################################################
+    def namespace(self):
+        ns = {
+            '__name__': '__strategy__',
+            '__file__': self.path,
+            'g': self.g,
+            'log': self.log,
+            'history': self.portal.history,
+            'get_price': self.portal.get_price,
+            'get_datetime': lambda: self.portal.now,
+            'get_last_datetime': lambda: self.portal.last_datetime,
+            'get_trade_days': self.portal.trade_days,
+            'get_all_securities': self.portal.all_securities,
+            'get_security_info': self.portal.security_info,
+            'get_st_stocks': self.portal.st_stocks,
+            'get_industry_stocks': self.portal.industry_stocks,
+            'get_rolling_beta': self.portal.rolling_beta,
+            'filter_tradable': self.portal.filter_tradable,
+            'filter_listed': self.portal.filter_listed,
+            'scan_patterns': self.patterns.scan,
+            'get_fundamentals': self.get_fundamentals,
+            'get_factors': self.engine.fundamentals.get_factors,
+            'screen_stocks': self.screen_stocks,
+            'query': query,
+            'order': self.broker.order,
+            'order_value': self.broker.order_value,
+            'order_percent': self.broker.order_percent,
+            'order_target': self.broker.order_target,
+            'order_target_value': self.broker.order_target_value,
+            'order_target_percent': self.broker.order_target_percent,
+            'cancel_order_all': lambda *args, **kwargs: None,
+            'set_benchmark': self.set_benchmark,
+            'set_slippage': self.set_slippage,
+            'set_commission': self.set_commission,
+            'set_volume_limit': lambda *args, **kwargs: None,
+            'run_daily': self.run_daily,
+            'run_weekly': self.run_weekly,
+            'run_monthly': self.run_monthly,
+            'get_iwencai': self.get_iwencai,
+            'record': self.record,
+            # 本地扩展：整个截面/面板一次计算的因子、预处理与规则函数；脚本中的同名定义优先
+            'psy': psy,
+            'true_range': true_range,
+            'long_momentum': long_momentum,
+            'bucket_scores': bucket_scores,
+            'mad_clip': mad_clip,
+            'sigma_clip': sigma_clip,
+            'zscore': zscore,
+            'RollingRSRS': RollingRSRS,
+            'all_in_out': all_in_out,
+            'PriceSlippage': PriceSlippage,
+            'PerShare': PerShare,
+            'PerTrade': PerTrade,
+            'SIDE': SIDE,
+            'ORDER_STATUS': ORDER_STATUS,
+        }
+        for name in TABLES:
+            ns[name] = Table(name)
+        return ns
+
+    def _fundamentals_date(self, date):
+        # 默认取上一交易日，按报告期查询也只用截至上一交易日已公布的数据；不允许查询未来日期
+        if date is None:
+            date = self.portal.last_datetime
+        return min(pd.Timestamp(date), pd.Timestamp(self.portal.now.date()))
+
+    def get_fundamentals(self, q, date=None, statDate=None):
+        return self.engine.fundamentals.get_fundamentals(q, date=self._fundamentals_date(date), statDate=statDate)
+
+    def screen_stocks(self, *criteria, date=None, statDate=None):
+        # 满足全部条件（查询或以代码为索引的布尔Series）的股票，按代码排序
+        return self.engine.fundamentals.screen(criteria, date=self._fundamentals_date(date), statDate=statDate)
+
+    def set_benchmark(self, security):
+        self.benchmark = security
+
+    def set_slippage(self, slippage, *args, **kwargs):
+        self.broker.slippage = slippage
+
+    def set_commission(self, cost, *args, **kwargs):
+        self.broker.cost = cost
+
+    def _schedule(self, func, rule):
+        self.schedule.append((func, rule))
+
+    def run_daily(self, func, *args, **kwargs):
+        self._schedule(func, lambda i: True)
+
+    def run_weekly(self, func, date_rule=1, *args, **kwargs):
+        self._schedule(func, self._date_rule(self.engine.week_pos, date_rule))
+
+    def run_monthly(self, func, date_rule=1, *args, **kwargs):
+        self._schedule(func, self._date_rule(self.engine.month_pos, date_rule))
+
+    @staticmethod
+    def _date_rule(positions, date_rule):
+        pos, rev = positions
+        if date_rule > 0:
+            return lambda i: pos[i] == date_rule
+        return lambda i: rev[i] == date_rule
+
+    def get_iwencai(self, text, name='iwencai_securities'):
+        self.iwencai.append((text, name))
+        self._refresh_iwencai()
+
+    def _refresh_iwencai(self):
+        # 本地没有问财，按引擎配置的{语句: 股票列表或函数(date)}返回，默认全部上市股票
+        for text, name in self.iwencai:
+            source = self.engine.iwencai.get(text)
+            if source is None:
+                stocks = list(self.portal.all_securities('stock', self.portal.now).index)
+            elif callable(source):
+                stocks = list(source(self.portal.now))
+            else:
+                stocks = list(source)
+            setattr(self.context, name, stocks)
+
+    def record(self, **kwargs):
+        self.records.setdefault(self.portal.now.date(), {}).update(kwargs)
+
+    # 2. 回测主循环 #########################################################
+    def load(self):
+        with open(self.path, encoding='utf-8') as f:
+            source = f.read()
+        exec(compile(source, self.path, 'exec'), self.ns)
+
+    def callback(self, name):
+        func = self.ns.get(name)
+        return func if callable(func) else None
+
+    def initialize(self):
+        func = self.callback(self.init_name)
+        if func is not None:
+            call(func, self.context)
+
+    def on_order(self, odr):
+        func = self.callback('on_order')
+        if func is not None:
+            func(self.context, odr)
+
+    def step(self, i):
+        self.portal.set_index(i)
+        self.broker.new_day()
+        if self.iwencai:
+            self._refresh_iwencai()
+        for name in self.before_names:
+            func = self.callback(name)
+            if func is not None:
+                call(func, self.context, self.bar_arg)
+        for func, rule in self.schedule:
+            if rule(i):
+                call(func, self.context, self.bar_arg)
+        func = self.callback(self.bar_name)
+        if func is not None:
+            call(func, self.context, self.bar_arg)
+        self.broker.mark(i)
+        for name in self.after_names:
+            func = self.callback(name)
+            if func is not None:
+                call(func, self.context, self.bar_arg)
+
+    def run(self):
+        self.load()
+        self.broker.on_order = self.on_order
+        self.initialize()
+        rows = []
+        for i in range(self.engine.i_start, self.engine.i_end + 1):
+            self.step(i)
+            rows.append((self.portfolio.portfolio_value, self.portfolio.available_cash,
+                         self.portfolio.positions_value, len(self.portfolio.positions)))
+        return self.result(rows)
+
+    def result(self, rows):
+        engine = self.engine
+        index = pd.DatetimeIndex(engine.store.dates[engine.i_start:engine.i_end + 1], name='date')
+        df = pd.DataFrame(rows, index=index, columns=['portfolio_value', 'cash', 'positions_value', 'positions'])
+        df['returns'] = df['portfolio_value'].pct_change().fillna(df['portfolio_value'].iloc[0] / engine.capital - 1)
+        if self.portal.has(self.benchmark):
+            bench = engine.store.fields['close'][engine.i_start:engine.i_end + 1, self.portal.column(self.benchmark)]
+            df['benchmark'] = bench / bench[~np.isnan(bench)][0] if (~np.isnan(bench)).any() else np.nan
+        if self.records:
+            records = pd.DataFrame.from_dict(self.records, orient='index')
+            records.index = pd.DatetimeIndex(records.index)
+            df = df.join(records)
+        return df
+
+
+class Engine(object):
+
+    session_class = Session
+
+    def __init__(self, store, start=None, end=None, capital=1000000, fundamentals=None, securities=None,
+                 iwencai=None, benchmark='000300.SH', minutes=None, bar_time=OPEN_TIME):
+        self.store = store
+        self.minutes = minutes
+        self.bar_time = bar_time
+        if bar_time > OPEN_TIME and minutes is None:
+            raise ValueError('bar_time %s is after the open: orders fill at that minute, which needs a minute store'
+                             % bar_time.strftime('%H:%M'))
+        self.capital = capital
+        self.fundamentals = fundamentals if fundamentals is not None else Fundamentals()
+        self.securities = securities
+        self.iwencai = dict(iwencai or {})
+        self.benchmark = benchmark
+        dates = store.dates
+        self.i_start = 0 if start is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start).date(), 'D')))
+        self.i_end = len(dates) - 1 if end is None else store.date_index(end)
+        if self.i_start > self.i_end:
+            raise ValueError('no trading days between %s and %s' % (start, end))
+        self.month_pos = calendar_positions(dates, 'M')
+        self.week_pos = calendar_positions(dates, 'W')
+
+    def session(self, path):
+        # 按脚本方言选择API：定义了initialize的为聚宽/MindGo风格
+        from .jqapi import JoinQuantSession
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+        if JoinQuantSession.detect(source):
+            return JoinQuantSession(self, path)
+        return self.session_class(self, path)
+
+    def run(self, path):
+        return self.session(path).run()
+
+    def run_many(self, paths):
+        return {path: self.run(path) for path in as_list(paths)}
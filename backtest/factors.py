@@ -0,0 +1,153 @@
+"""
+Panel factor kernels.
+
+The research scripts compute factors one stock and one rebalance date at a
+time.  The functions here take (date x stock) DataFrames and compute a
+factor for every stock and every requested date in one pass over numpy
+arrays.  Each stock's history is its own trading rows, so a stock that did
+not trade on a day (NaN in the panel) gets no row for it, the same as the
+per-stock loops in the scripts.
+
+    close = pd.DataFrame({code: df['收盘价'] for code, df in zip(cons, dfs)})
+    momentum = long_momentum(close, high, low, month_ends, window=160, keep=0.7)
+
+bucket_scores() turns factor values into layer scores (1 for the lowest
+layer up to `buckets`) from one argsort per factor, for any number of
+factors and dates at once.
+"""
+import numpy as np
+import pandas as pd
+
+
+def compact(values, valid):
+    '''
+    把每列的有效行按时间顺序移到列首
+    返回 (压缩后的数组, 各行截至当日的有效行数)
+    '''
+    order = np.argsort(~valid, axis=0, kind='stable')
+    return np.take_along_axis(values, order, axis=0), np.cumsum(valid, axis=0)
+
+
+def own_rows(panel, func):
+    '''
+    在每只股票自己的交易行上执行按列的pandas运算（如 lambda df: df.rolling(5).mean()），
+    结果放回原来的行，停牌行为NaN；等价于逐列 dropna 后计算，但只调用一次func
+    '''
+    values = panel.values.astype(float)
+    valid = ~np.isnan(values)
+    order = np.argsort(~valid, axis=0, kind='stable')
+    result = func(pd.DataFrame(np.take_along_axis(values, order, axis=0))).values
+    # 压缩后落在无效行的结果作废
+    result = np.where(np.arange(len(values))[:, None] < valid.sum(axis=0), result, np.nan)
+    out = np.empty_like(values)
+    np.put_along_axis(out, order, result, axis=0)
+    return pd.DataFrame(out, index=panel.index, columns=panel.columns)
+
+
+def row_positions(index, dates):
+    # 每个日期在行索引中的位置：不晚于该日的最后一行，早于首行为-1
+    idx = pd.DatetimeIndex(index).values
+    return np.searchsorted(idx, pd.DatetimeIndex(dates).values, side='right') - 1
+
+
+def psy(prices, timeperiod=12, axis=-1):
+    '''
+    心理线PSY：最近timeperiod个交易日中上涨天数的占比 * 100
+    prices: 任意维数组，时间在 axis 轴上（默认最后一维，即 股票 x 日期）
+    前timeperiod个位置为NaN；与NaN比较不计为上涨
+    '''
+    prices = np.moveaxis(np.asarray(prices, dtype=float), axis, -1)
+    out = np.full(prices.shape, np.nan)
+    if prices.shape[-1] > timeperiod:
+        up = prices[..., 1:] > prices[..., :-1]
+        count = np.cumsum(up, axis=-1)
+        count = np.concatenate([np.zeros(count.shape[:-1] + (1,), dtype=count.dtype), count], axis=-1)
+        out[..., timeperiod:] = (count[..., timeperiod:] - count[..., :-timeperiod]) * (100 / timeperiod)
+    return np.moveaxis(out, -1, axis)
+
+
+def bucket_scores(values, buckets=20, ascending=True, axis=0):
+    '''
+    分层打分：沿axis（股票轴）排序后分成buckets层，第一层得1分，第二层得2分，以此类推
+    每层 n // buckets 只，余数从最后一层起每层多分一只；NaN不参与排序，得分为NaN
+    values: DataFrame（股票 x 因子）或任意维数组，如 (日期 x 股票 x 因子) 取 axis=1
+    '''
+    frame = values if isinstance(values, pd.DataFrame) else None
+    values = np.moveaxis(np.asarray(values, dtype=float), axis, 0)
+    if not ascending:
+        values = -values
+    valid = ~np.isnan(values)
+    # NaN排在最后，有效值的名次为 0..n-1
+    order = np.argsort(values, axis=0, kind='stable')
+    rank = np.empty(values.shape, dtype=np.int64)
+    np.put_along_axis(rank, order, np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1)), axis=0)
+    n = valid.sum(axis=0)
+    size, extra = n // buckets, n % buckets
+    # 前 buckets-extra 层每层size只，之后每层size+1只
+    edge = (buckets - extra) * size
+    layer = np.where(rank < edge, rank // np.maximum(size, 1), buckets - extra + (rank - edge) // (size + 1))
+    scores = np.moveaxis(np.where(valid, layer + 1.0, np.nan), 0, axis)
+    if frame is not None:
+        return pd.DataFrame(scores, index=frame.index, columns=frame.columns)
+    return scores
+
+
+def true_range(high, low, close):
+    '''
+    真实波幅：max(最高-最低, |最高-前收|, |最低-前收|)，与 talib.TRANGE 一致
+    high/low/close: (date x stock) DataFrame 或数组，首行为NaN
+    '''
+    h = np.asarray(high, dtype=float)
+    l = np.asarray(low, dtype=float)
+    c = np.asarray(close, dtype=float)
+    tr = np.full(h.shape, np.nan)
+    prev = c[:-1]
+    tr[1:] = np.maximum(h[1:] - l[1:], np.maximum(np.abs(h[1:] - prev), np.abs(l[1:] - prev)))
+    if isinstance(close, pd.DataFrame):
+        return pd.DataFrame(tr, index=close.index, columns=close.columns)
+    return tr
+
+
+def long_momentum(close, high, low, dates, window=160, keep=0.7, block=16):
+    '''
+    长端动量因子：每个调仓日取最近window个交易日，按日振幅(最高/最低-1)从小到大
+    保留前 int(该股票全部K线数 * keep) 个交易日，对其日收益率求和
+    与 "Momentum Factor.py" 原来的逐只循环一致：保留天数按整段历史的行数 len(df) 计算，
+    历史不少于 window/keep 根的股票整个窗口都保留
+    close/high/low: (date x stock) DataFrame；dates: 调仓日
+    返回 (调仓日 x 股票) DataFrame，调仓日前没有K线的股票为0
+    '''
+    close = close.sort_index()
+    high = high.reindex_like(close).values.astype(float)
+    low = low.reindex_like(close).values.astype(float)
+    c = close.values.astype(float)
+    valid = ~np.isnan(c)
+
+    # 收益率与振幅都只在股票自己的交易行上计算
+    c_comp, counts = compact(c, valid)
+    ret = np.full_like(c_comp, np.nan)
+    ret[1:] = c_comp[1:] / c_comp[:-1] - 1
+    amp = compact(high / low - 1, valid)[0]
+    amp = np.where(np.isnan(amp), np.inf, amp)
+
+    rows = row_positions(close.index, dates)
+    ends = np.where(rows[:, None] >= 0, counts[np.maximum(rows, 0)], 0)
+    n_stock = c.shape[1]
+    threshold = (counts[-1] * keep).astype(int)
+    out = np.full((len(rows), n_stock), np.nan)
+    offsets = np.arange(-window, 0)
+    cols = np.arange(n_stock)
+    # 按调仓日分块，(块 x window x 股票) 的中间数组大小有界
+    for a in range(0, len(rows), block):
+        end = ends[a:a + block]
+        k = end[:, None, :] + offsets[None, :, None]
+        inside = k >= 0
+        k = np.maximum(k, 0)
+        w_amp = np.where(inside, amp[k, cols], np.inf)
+        w_ret = np.where(inside, ret[k, cols], np.nan)
+        # 按振幅排序后，前threshold个交易日的收益率之和（窗口外的位置振幅为inf、收益率为NaN，不计入）
+        order = np.argsort(w_amp, axis=1, kind='stable')
+        w_ret = np.take_along_axis(w_ret, order, axis=1)
+        chosen = np.arange(window)[None, :, None] < threshold[None, None, :]
+        out[a:a + block] = np.nansum(np.where(chosen, w_ret, np.nan), axis=1)
+    return pd.DataFrame(out, index=pd.DatetimeIndex(dates), columns=close.columns)
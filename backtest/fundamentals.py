@@ -0,0 +1,422 @@
+"""
+Local fundamentals backend with the platform's query() DSL.
+
+Tables are plain DataFrames keyed by `symbol` and `date`, where `date` is the
+day a value became public.  get_fundamentals(q, date=D) answers with the most
+recent row per symbol that was public on D; get_fundamentals(q,
+statDate='2019q3') selects rows by report period (`stat_date`).
+
+    q = query(valuation.symbol, valuation.pb).filter(valuation.pb > 0)
+    df = backend.get_fundamentals(q, date='20200102')
+
+Each table is indexed point-in-time: its rows sorted by (symbol, date) and
+by (stat_date, symbol, date), with the keys packed into sorted int64
+arrays.  An as-of lookup is then one binary search per symbol for the last
+row public on D, and a report-period lookup is a binary search for the
+period's block followed by the same as-of search inside it, so a restated
+report is only seen after its restatement was published.
+
+Snapshots are cached per (date, statDate): the first query for a date
+materialises the snapshot of each table it touches, and every later query
+for that date - the five or six screen helpers of a monthly rebalance -
+filters and sorts those snapshots instead of looking the tables up again.
+The merged snapshot behind a query is kept for the next query on the same
+tables and date, and symbol == x / symbol.in_(...) filters are answered by
+an index lookup on it, so a loop issuing one query per stock costs one
+snapshot build plus one hash lookup per stock.
+
+Screens are boolean masks over one symbol axis (every symbol in the loaded
+tables, sorted).  mask(q, date) marks the rows a query returns, including
+an order_by/limit top-k, and screen([q1, q2, ...], date) ANDs the masks of
+its criteria, so a stock pool is one array AND rather than a chain of set
+intersections over symbol lists; screen_history() stacks the masks of many
+dates into a (date x symbol) frame.
+
+    pool = backend.screen([query(valuation.symbol).filter(valuation.pe > 0).order_by(valuation.pe.asc()).limit(400),
+                           query(income.symbol).filter(income.net_profit > 0)], date='20200102')
+"""
+import operator
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DATE_COLUMNS = ('date', 'stat_date', 'pub_date')
+
+
+# 1. 查询语言 ################################################################
+class Column(object):
+
+    def __init__(self, table, name):
+        self.table = table
+        self.name = name
+
+    @property
+    def label(self):
+        return '%s_%s' % (self.table, self.name)
+
+    def _cmp(self, op, value):
+        return Predicate(self, op, value)
+
+    def __gt__(self, value):
+        return self._cmp(operator.gt, value)
+
+    def __ge__(self, value):
+        return self._cmp(operator.ge, value)
+
+    def __lt__(self, value):
+        return self._cmp(operator.lt, value)
+
+    def __le__(self, value):
+        return self._cmp(operator.le, value)
+
+    def __eq__(self, value):
+        return self._cmp(operator.eq, value)
+
+    def __ne__(self, value):
+        return self._cmp(operator.ne, value)
+
+    __hash__ = object.__hash__
+
+    def in_(self, values):
+        return Predicate(self, 'in', list(values))
+
+    def desc(self):
+        return Ordering(self, False)
+
+    def asc(self):
+        return Ordering(self, True)
+
+
+class Predicate(object):
+
+    def __init__(self, column, op, value):
+        self.column = column
+        self.op = op
+        if column.name in DATE_COLUMNS and op != 'in':
+            value = pd.Timestamp(value)
+        self.value = value
+
+    def evaluate(self, df):
+        values = df[self.column.label]
+        if self.op == 'in':
+            return values.isin(self.value)
+        return self.op(values, self.value)
+
+
+class Ordering(object):
+
+    def __init__(self, column, ascending):
+        self.column = column
+        self.ascending = ascending
+
+
+class Table(object):
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Column(self._name, name)
+
+
+class Query(object):
+
+    def __init__(self, columns, filters=(), orders=(), n=None):
+        self.columns = list(columns)
+        self.filters = list(filters)
+        self.orders = list(orders)
+        self.n = n
+
+    def filter(self, *predicates):
+        return Query(self.columns, self.filters + list(predicates), self.orders, self.n)
+
+    def order_by(self, *orders):
+        orders = [o if isinstance(o, Ordering) else o.asc() for o in orders]
+        return Query(self.columns, self.filters, self.orders + orders, self.n)
+
+    def limit(self, n):
+        return Query(self.columns, self.filters, self.orders, n)
+
+    @property
+    def tables(self):
+        names = []
+        for c in self.columns + [p.column for p in self.filters] + [o.column for o in self.orders]:
+            if c.table not in names:
+                names.append(c.table)
+        return names
+
+
+def query(*columns):
+    return Query(columns)
+
+
+TABLES = ['valuation', 'profit', 'growth', 'debtrepay', 'income', 'balance', 'cashflow', 'operating', 'factor']
+valuation, profit, growth, debtrepay, income, balance, cashflow, operating, factor = [Table(t) for t in TABLES]
+
+
+def parse_stat_date(stat_date):
+    # '2019q3' -> 2019-09-30，'2019' -> 2019-12-31
+    s = str(stat_date).lower()
+    if 'q' in s:
+        year, quarter = s.split('q')
+        month = int(quarter) * 3
+    else:
+        year, month = s[:4], 12
+    return pd.Timestamp(int(year), month, 1) + pd.offsets.MonthEnd(0)
+
+
+# 2. 时点索引 ################################################################
+# 键 = 编号 * 2^32 + (日数 + 2^31)，按 (编号, 日期) 排序后是单调的一维数组
+_SHIFT = np.int64(1) << 32
+_OFFSET = np.int64(1) << 31
+
+
+def _days(values):
+    return pd.DatetimeIndex(values).values.astype('datetime64[D]').astype(np.int64)
+
+
+class PointInTime(object):
+    '''
+    一张财务表的时点索引，date 为数据公布日，公布日缺失的行视为从未公布
+    as_of(date): 每只股票截至date最新公布的一行
+    by_period(stat_date, date): 每只股票该报告期截至date最新公布的一行（含更正）
+    返回表中的行位置，按位置排序
+    '''
+
+    def __init__(self, df):
+        known = np.flatnonzero(df['date'].notna().values)
+        codes = pd.factorize(df['symbol'].values[known], sort=True)[0].astype(np.int64)
+        days = _days(df['date'].values[known]) + _OFFSET
+
+        # (股票, 公布日)，同一天的多行保持表中顺序，取最后一行
+        order = np.lexsort((days, codes))
+        self._rows = known[order]
+        self._keys = codes[order] * _SHIFT + days[order]
+        self._codes = codes[order]
+        self._starts = _group_starts(self._codes)
+
+        # (报告期, 股票, 公布日)
+        self._period_rows = None
+        if 'stat_date' in df.columns:
+            stat = df['stat_date'].values[known]
+            has = ~pd.isna(stat)
+            stat = np.where(has, _days(stat), np.iinfo(np.int64).max)
+            order = np.lexsort((days, codes, stat))[:has.sum()]
+            self._period_rows = known[order]
+            self._period_stat = stat[order]
+            self._period_keys = codes[order] * _SHIFT + days[order]
+            self._period_starts = _group_starts(self._period_stat, codes[order])
+
+    @staticmethod
+    def _bound(date):
+        return _SHIFT - 1 if date is None else _days([pd.Timestamp(date)])[0] + _OFFSET
+
+    def as_of(self, date=None):
+        pos = _last_before(self._keys, self._codes, self._starts, self._bound(date))
+        return np.sort(self._rows[pos])
+
+    def by_period(self, stat_date, date=None):
+        if self._period_rows is None:
+            raise KeyError('table has no stat_date column')
+        stat = _days([stat_date])[0]
+        a, b = np.searchsorted(self._period_stat, [stat, stat + 1])
+        s0, s1 = np.searchsorted(self._period_starts, [a, b])
+        keys = self._period_keys[a:b]
+        starts = self._period_starts[s0:s1] - a
+        pos = _last_before(keys, keys // _SHIFT, starts, self._bound(date))
+        return np.sort(self._period_rows[a + pos])
+
+
+def _group_starts(*keys):
+    # 已排序的分组键（可多列）每组第一行的位置
+    n = len(keys[0])
+    change = np.zeros(n, dtype=bool)
+    change[:1] = True
+    for k in keys:
+        change[1:] |= k[1:] != k[:-1]
+    return np.flatnonzero(change)
+
+
+def _last_before(keys, codes, starts, bound):
+    # 每组（一只股票）中日期不晚于bound的最后一行；该股票此前无数据则不返回
+    if not len(starts):
+        return starts
+    pos = np.searchsorted(keys, codes[starts] * _SHIFT + bound, side='right') - 1
+    return pos[pos >= starts]
+
+
+# 3. 数据后端 ################################################################
+class Fundamentals(object):
+
+    # 最近使用的日期截面个数、合并快照个数
+    max_dates = 4
+    max_merged = 8
+
+    def __init__(self, tables=None):
+        self.tables = {}
+        self.symbols = pd.Index([])
+        self._index = {}
+        self._dates = OrderedDict()
+        self._merged = OrderedDict()
+        for name, df in (tables or {}).items():
+            self.add_table(name, df)
+
+    @classmethod
+    def load(cls, path):
+        # 目录下每个 <table>.csv / <table>.parquet 为一张表
+        tables = {}
+        for name in sorted(os.listdir(path)):
+            table, ext = os.path.splitext(name)
+            if ext == '.csv':
+                tables[table] = pd.read_csv(os.path.join(path, name), dtype={'symbol': str})
+            elif ext == '.parquet':
+                tables[table] = pd.read_parquet(os.path.join(path, name))
+        return cls(tables)
+
+    def add_table(self, name, df):
+        df = df.copy()
+        for col in DATE_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col].astype(str), errors='coerce')
+        self.tables[name] = df.sort_values(['date', 'symbol']).reset_index(drop=True)
+        self._index[name] = PointInTime(self.tables[name])
+        self.symbols = self.symbols.union(pd.Index(self.tables[name]['symbol'].dropna().unique())).sort_values()
+        self._dates.clear()
+        self._merged.clear()
+
+    def _table(self, name):
+        try:
+            return self.tables[name]
+        except KeyError:
+            raise KeyError('fundamentals table %r is not loaded' % name)
+
+    def snapshot(self, name, date=None, stat_date=None):
+        # 截至date已公布的最新一行（或指定报告期截至date的最新一行），每只股票一行
+        df = self._table(name)
+        index = self._index[name]
+        if stat_date is None:
+            return df.iloc[index.as_of(date)]
+        try:
+            return df.iloc[index.by_period(parse_stat_date(stat_date), date)]
+        except KeyError:
+            raise KeyError('fundamentals table %r has no stat_date column' % name)
+
+    @staticmethod
+    def _labelled(name, df):
+        # 列名加表名前缀，并加上用于合并的 __symbol 列
+        df = df.rename(columns={c: '%s_%s' % (name, c) for c in df.columns})
+        df['__symbol'] = df['%s_symbol' % name]
+        return df
+
+    def _frame(self, q, snapshots):
+        merged = None
+        for name in q.tables:
+            df = snapshots(name)
+            merged = df if merged is None else merged.merge(df, on='__symbol')
+        return merged
+
+    def _date_snapshot(self, name, date, statDate):
+        # 同一 (日期, 报告期) 的各表截面在第一次用到时生成，之后的查询共用
+        key = (None if date is None else pd.Timestamp(date), statDate)
+        if key in self._dates:
+            self._dates.move_to_end(key)
+        else:
+            self._dates[key] = {}
+            while len(self._dates) > self.max_dates:
+                self._dates.popitem(last=False)
+        tables = self._dates[key]
+        if name not in tables:
+            tables[name] = self._labelled(name, self.snapshot(name, date, statDate))
+        return tables[name]
+
+    def _merged_snapshot(self, q, date, statDate):
+        # 按 (表, 日期, 报告期) 缓存合并后的截面，索引为股票代码
+        key = (tuple(q.tables), None if date is None else pd.Timestamp(date), statDate)
+        if key in self._merged:
+            self._merged.move_to_end(key)
+            return self._merged[key]
+        merged = self._frame(q, lambda name: self._date_snapshot(name, date, statDate))
+        merged = merged.set_index('__symbol', drop=False)
+        merged['__sid'] = self.symbols.get_indexer(merged.index)
+        self._merged[key] = merged
+        while len(self._merged) > self.max_merged:
+            self._merged.popitem(last=False)
+        return merged
+
+    @staticmethod
+    def _select_symbols(merged, filters):
+        # symbol == x / symbol.in_(...) 按股票代码索引取行，保持截面原有顺序
+        rest = []
+        for p in filters:
+            if p.column.name == 'symbol' and (p.op is operator.eq or p.op == 'in'):
+                values = p.value if p.op == 'in' else [p.value]
+                pos = merged.index.get_indexer(values)
+                merged = merged.iloc[np.unique(pos[pos >= 0])]
+            else:
+                rest.append(p)
+        return merged, rest
+
+    def _select(self, q, merged, by_symbol=False):
+        # 依次执行过滤、排序、limit，返回截面中选中的行
+        filters = q.filters
+        if by_symbol:
+            merged, filters = self._select_symbols(merged, filters)
+        if filters:
+            mask = np.ones(len(merged), dtype=bool)
+            for p in filters:
+                mask &= p.evaluate(merged).values
+            merged = merged[mask]
+        if q.orders:
+            merged = merged.sort_values([o.column.label for o in q.orders],
+                                        ascending=[o.ascending for o in q.orders], kind='mergesort')
+        if q.n is not None:
+            merged = merged.head(q.n)
+        return merged
+
+    def _run(self, q, merged, by_symbol=False):
+        merged = self._select(q, merged, by_symbol)
+        return merged[[c.label for c in q.columns]].reset_index(drop=True)
+
+    def get_fundamentals(self, q, date=None, statDate=None):
+        return self._run(q, self._merged_snapshot(q, date, statDate), by_symbol=True)
+
+    # 选股掩码 ###############################################################
+    def mask(self, q, date=None, statDate=None):
+        '''
+        查询结果在股票轴 self.symbols 上的布尔掩码，order_by + limit 即前k名
+        '''
+        selected = self._select(q, self._merged_snapshot(q, date, statDate), by_symbol=True)
+        mask = np.zeros(len(self.symbols), dtype=bool)
+        mask[selected['__sid'].values] = True
+        return mask
+
+    def screen_mask(self, criteria, date=None, statDate=None):
+        '''
+        各条件掩码的与；条件为查询，或以股票代码为索引的布尔Series（不在索引中的股票视为不满足）
+        '''
+        mask = np.ones(len(self.symbols), dtype=bool)
+        for c in criteria:
+            if isinstance(c, Query):
+                mask &= self.mask(c, date, statDate)
+            else:
+                mask &= pd.Series(c, dtype=bool).reindex(self.symbols, fill_value=False).values
+        return mask
+
+    def screen(self, criteria, date=None, statDate=None):
+        # 满足全部条件的股票，按代码排序
+        return list(self.symbols[self.screen_mask(criteria, date, statDate)])
+
+    def screen_history(self, criteria, dates):
+        # 每个日期一行的 (日期 x 股票) 选股掩码，条件只能是查询
+        masks = [self.screen_mask(criteria, date) for date in dates]
+        masks = np.vstack(masks) if masks else np.zeros((0, len(self.symbols)), dtype=bool)
+        return pd.DataFrame(masks, index=pd.DatetimeIndex(dates), columns=self.symbols)
+
+    def get_factors(self, q):
+        # 因子表按日期直接过滤（factor.date == D），不做截面回溯
+        merged = self._frame(q, lambda name: self._labelled(name, self._table(name)))
+        return self._run(q, merged)
@@ -0,0 +1,169 @@
+"""
+Parallel ingestion of the per-stock GBK CSV archive into a bar store.
+
+CSV decoding is single-core bound, so members are split into batches and
+parsed in a process pool.  Each worker opens the archive itself and sends
+back compact (dates, values) arrays; the parent only merges them and writes
+the store.
+
+    python -m backtest ingest stock-trading-data-pro-2024-04-17N.zip data/bars --workers 16
+
+Merging into an existing store keeps the fields the CSV files do not carry
+(adj_factor, is_st, ...): symbols not in the archive keep all their arrays,
+and re-imported symbols keep their stored values, with the last one carried
+forward onto dates after it.  --rebuild drops those fields and their files.
+
+A newer archive only needs its new trading days appended to the store:
+
+    python -m backtest append stock-trading-data-pro-2024-04-18N.zip data/bars
+
+Members of symbols the store already holds are filtered by date before
+parsing, so only rows after the store's last trading day are decoded; new
+listings are parsed in full.
+"""
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .archive import COLUMNS, list_members, member_symbol, parse_csv
+from .store import FIELDS, BarStore, read_meta
+
+FIELD_ORDER = list(COLUMNS.values())
+
+
+def parse_batch(source, names, since=None):
+    # 子进程：解析一批成员，返回 [(symbol, dates, values)]；since 见 parse_csv
+    out = []
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as z:
+            for name in names:
+                with z.open(name) as f:
+                    df = parse_csv(f, since)
+                out.append((member_symbol(name), df.index.values, df[FIELD_ORDER].values))
+    else:
+        for name in names:
+            df = parse_csv(name, since)
+            out.append((member_symbol(name), df.index.values, df[FIELD_ORDER].values))
+    return out
+
+
+def existing_frames(path, keep):
+    # 已有行情库中本次未重新导入的股票，复制出来参与合并（随后会覆盖写同一目录）
+    store = BarStore.load(path)
+    index = pd.DatetimeIndex(store.dates)
+    frames = {}
+    for symbol in store.symbols:
+        if symbol in keep:
+            continue
+        j = store.sid[symbol]
+        i0, i1 = store.first_valid[j], store.last_valid[j] + 1
+        if i0 >= i1:
+            continue
+        frames[symbol] = pd.DataFrame({f: np.array(store.fields[f][i0:i1, j]) for f in store.fields},
+                                       index=index[i0:i1])
+    return frames
+
+
+def carry_fields(path, frames, fields):
+    '''
+    重新导入的股票：CSV中没有的字段取行情库中已有的值，之后的新日期沿用最后一个值
+    原地给 frames 中的 DataFrame 加列
+    '''
+    store = BarStore.load(path)
+    index = pd.DatetimeIndex(store.dates)
+    for symbol, df in frames.items():
+        j = store.sid.get(symbol)
+        if j is None:
+            continue
+        for f in fields:
+            if f in df.columns:
+                continue
+            old = pd.Series(np.array(store.fields[f][:, j]), index=index).dropna()
+            if len(old):
+                df[f] = old.reindex(df.index, method='ffill').values
+
+
+def parse_archive(source, members=None, workers=None, batch_size=32, since=None, known=()):
+    '''
+    进程池解析归档，返回 ({symbol: DataFrame}, 成员数, 行数)
+    since: known 中的股票只解析交易日期晚于该日的行，其余股票解析全部历史
+    '''
+    members = list(members or list_members(source))
+    known = set(known) if since is not None else set()
+    groups = [([m for m in members if member_symbol(m) not in known], None),
+              ([m for m in members if member_symbol(m) in known], since)]
+    batches = [(names[k:k + batch_size], after) for names, after in groups for k in range(0, len(names), batch_size)]
+    workers = workers or os.cpu_count()
+
+    frames = {}
+    rows = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(parse_batch, [source] * len(batches), [b[0] for b in batches], [b[1] for b in batches]):
+            for symbol, dates, values in result:
+                frames[symbol] = pd.DataFrame(values, index=pd.DatetimeIndex(dates), columns=FIELD_ORDER)
+                rows += len(values)
+    return frames, len(members), rows
+
+
+def make_stats(members, rows, parsed, seconds):
+    return {
+        'members': members,
+        'rows': rows,
+        'parse_seconds': parsed,
+        'seconds': seconds,
+        'rows_per_sec': rows / parsed if parsed else np.inf,
+    }
+
+
+def ingest(source, path, members=None, workers=None, batch_size=32, merge=True):
+    '''
+    并行导入CSV归档
+    返回 (store, stats)，stats 含 rows / seconds / rows_per_sec / dropped_fields（重建时删除的字段）
+    '''
+    t0 = time.time()
+    frames, n_members, rows = parse_archive(source, members, workers, batch_size)
+    parsed = time.time() - t0
+
+    fields, dropped = list(FIELDS), []
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        extra = [f for f in read_meta(path)['fields'] if f not in FIELDS]
+        if merge:
+            carry_fields(path, frames, extra)
+            for symbol, df in existing_frames(path, frames).items():
+                frames[symbol] = df
+            fields += extra
+        else:
+            dropped = extra
+    store = BarStore.write(path, frames, fields)
+    # 重建时不再写入的字段，删除旧文件
+    for f in dropped:
+        filename = os.path.join(path, f + '.npy')
+        if os.path.exists(filename):
+            os.remove(filename)
+    stats = make_stats(n_members, rows, parsed, time.time() - t0)
+    stats['dropped_fields'] = dropped
+    return store, stats
+
+
+def append(source, path, members=None, workers=None, batch_size=32):
+    '''
+    每日增量更新：只把晚于行情库最后交易日的行追加到已有行情库
+    已有股票解析时就按日期过滤，新上市的股票解析全部历史（需要落在已有交易日历上的部分）
+    返回 (store, stats)，stats 另含 days（追加的交易日数），rows 为实际解析的行数
+    '''
+    if not os.path.exists(os.path.join(path, 'meta.json')):
+        raise ValueError('no bar store at %s, run ingest first' % path)
+    t0 = time.time()
+    store = BarStore.load(path)
+    since, known = str(store.dates[-1]), set(store.symbols)
+    del store
+    frames, n_members, rows = parse_archive(source, members, workers, batch_size, since, known)
+    parsed = time.time() - t0
+    store, days = BarStore.append(path, frames)
+    stats = make_stats(n_members, rows, parsed, time.time() - t0)
+    stats['days'] = days
+    return store, stats
@@ -0,0 +1,117 @@
+"""
+JoinQuant and account/data (MindGo) dialects on the local engine.
+
+Two script styles in this repository are not written for SuperMind:
+
+* JoinQuant: initialize(context), run_daily(func, 'every_bar'),
+  attribute_history(security, count, unit, fields), set_order_cost(...)
+* account/data: initialize(account), handle_data(account, data),
+  account.positions / account.cash, data.attribute_history(...)
+
+Both are served by JoinQuantSession, which only swaps the callback names and
+a few API functions; data access and order matching go through the same
+DataPortal and Broker as the SuperMind runner.
+"""
+import re
+import sys
+import types
+
+from .account import OrderCost
+from .engine import Context, Session
+
+
+class Account(Context):
+    '''聚宽context与MindGo account的合体'''
+
+    @property
+    def positions(self):
+        return self.portfolio.positions
+
+    @property
+    def cash(self):
+        return self.portfolio.available_cash
+
+    @property
+    def portfolio_value(self):
+        return self.portfolio.portfolio_value
+
+    @property
+    def positions_value(self):
+        return self.portfolio.positions_value
+
+
+class Data(object):
+    '''handle_data(account, data)中的data对象'''
+
+    def __init__(self, session):
+        self._session = session
+
+    def attribute_history(self, security, *args, **kwargs):
+        return self._session.attribute_history(security, *args, **kwargs)
+
+    def __getitem__(self, symbol):
+        return self._session.bar_dict[symbol]
+
+    def __contains__(self, symbol):
+        return symbol in self._session.bar_dict
+
+
+class JoinQuantSession(Session):
+
+    init_name = 'initialize'
+    before_names = ('before_trading_start',)
+    bar_name = 'handle_data'
+    after_names = ('after_trading_end',)
+
+    def __init__(self, engine, path):
+        self.data = Data(self)
+        super(JoinQuantSession, self).__init__(engine, path)
+        self.bar_arg = self.data
+
+    @staticmethod
+    def detect(source):
+        return re.search(r'^def\s+initialize\s*\(', source, re.M) is not None
+
+    def make_context(self):
+        return Account(self.portal, self.portfolio)
+
+    def namespace(self):
+        ns = super(JoinQuantSession, self).namespace()
+        ns.update({
+            'attribute_history': self.attribute_history,
+            'history': self.history,
+            'set_order_cost': self.set_order_cost,
+            'OrderCost': OrderCost,
+            'set_option': lambda *args, **kwargs: None,
+            'set_universe': lambda *args, **kwargs: None,
+        })
+        return ns
+
+    def load(self):
+        # 脚本中的 import jqdata
+        module = types.ModuleType('jqdata')
+        module.get_trade_days = self.portal.trade_days
+        module.get_all_trade_days = lambda: self.portal.trade_days(self.engine.store.dates[0])
+        sys.modules['jqdata'] = module
+        super(JoinQuantSession, self).load()
+
+    def attribute_history(self, security, *args, **kwargs):
+        # 聚宽：(security, count, unit, fields, skip_paused, df, fq)
+        # MindGo：(security, fields, bar_count, fre_step, skip_paused, fq)
+        if 'count' in kwargs or (args and isinstance(args[0], int)):
+            return self._jq_attribute_history(security, *args, **kwargs)
+        return self._mg_attribute_history(security, *args, **kwargs)
+
+    def _jq_attribute_history(self, security, count, unit='1d', fields=('open', 'close', 'high', 'low', 'volume', 'money'),
+                              skip_paused=True, df=True, fq='pre'):
+        return self.portal.history(security, fields, count, unit, skip_paused, fq)
+
+    def _mg_attribute_history(self, security, fields, bar_count, fre_step='1d', skip_paused=False, fq=None):
+        return self.portal.history(security, fields, bar_count, fre_step, skip_paused, fq)
+
+    def history(self, count, unit='1d', field='avg', security_list=None, df=True, skip_paused=False, fq='pre'):
+        # 聚宽history：返回 date x security 的单字段表
+        return self.portal.history(list(security_list or []), [field], count, unit, skip_paused, fq, is_panel=1)[field]
+
+    def set_order_cost(self, cost, type='stock', ref=None):
+        self.broker.cost = cost
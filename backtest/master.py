@@ -0,0 +1,126 @@
+"""
+Security master held as arrays.
+
+The scripts ask for listing dates one stock at a time
+(get_security_info(stock).start_date) and call get_all_securities() for the
+same date again in every helper.  SecurityMaster keeps the start date, end
+date, type, board and exchange of every security as one numpy array each,
+in symbol order, so "listed on D for more than N days" is one comparison
+over the whole universe.  The listed universe of the last few dates asked
+about is kept, so repeated calls for a rebalance date are lookups.
+
+A date's universe is every security whose listing range covers that date,
+including ones that have been delisted since, so a backtest over past dates
+does not only see today's survivors.  Dates are compared by calendar day.
+
+    master = SecurityMaster.from_frame(portal.master())
+    master.universe('2015-06-30')                  # stocks listed that day
+    master.listed('2015-06-30', days=60)           # listed for more than 60 days
+"""
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# 板块
+MAIN, SME, CHINEXT, STAR, BSE = 'main', 'sme', 'chinext', 'star', 'bse'
+
+
+def infer_board(symbol):
+    # 根据代码规则推断板块：主板、中小板、创业板、科创板、北交所
+    code, _, exchange = symbol.partition('.')
+    if exchange == 'BJ':
+        return BSE
+    if code.startswith('688') or code.startswith('689'):
+        return STAR
+    if exchange == 'SZ' and (code.startswith('300') or code.startswith('301')):
+        return CHINEXT
+    if exchange == 'SZ' and (code.startswith('002') or code.startswith('003')):
+        return SME
+    return MAIN
+
+
+def to_day(date):
+    return np.datetime64(pd.Timestamp(date).date(), 'D')
+
+
+def _types(ty):
+    if not ty:
+        return None
+    return (ty,) if isinstance(ty, str) else tuple(ty)
+
+
+class SecurityMaster(object):
+
+    def __init__(self, symbols, start_date, end_date, type, display_name=None, board=None, exchange=None,
+                 max_dates=8):
+        self.symbols = pd.Index(symbols)
+        self.start_date = np.asarray(start_date, dtype='datetime64[D]')
+        self.end_date = np.asarray(end_date, dtype='datetime64[D]')
+        self.type = np.asarray(type, dtype=object)
+        self.display_name = np.asarray(self.symbols if display_name is None else display_name, dtype=object)
+        if board is None:
+            board = [infer_board(s) for s in self.symbols]
+        if exchange is None:
+            exchange = [s.partition('.')[2] for s in self.symbols]
+        self.board = np.asarray(board, dtype=object)
+        self.exchange = np.asarray(exchange, dtype=object)
+        self.max_dates = max_dates
+        # (日期, 类型) -> 当日在市证券的位置，最近使用的放在最后
+        self._universe = OrderedDict()
+
+    @classmethod
+    def from_frame(cls, df, max_dates=8):
+        # 由 DataPortal.master() 形式的表构建（索引为代码，含 start_date/end_date/type 列）
+        get = lambda col: df[col].values if col in df.columns else None
+        return cls(df.index, df['start_date'].values, df['end_date'].values, df['type'].values,
+                   get('display_name'), get('board'), get('exchange'), max_dates)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.symbols
+
+    def positions(self, symbols):
+        # 批量取位置，不在主表中的为-1
+        return self.symbols.get_indexer(list(symbols))
+
+    def listed_days(self, date, positions=None):
+        # 截至date已上市的自然日数，按位置取；未上市为负
+        start = self.start_date if positions is None else self.start_date[positions]
+        return (to_day(date) - start).astype(np.int64)
+
+    def listed_mask(self, date, ty='stock', days=None):
+        '''
+        date 当天在市（上市日 <= date <= 退市日）的布尔数组，按主表顺序
+        ty: 证券类型，可为列表，None 为不限；days: 只保留上市超过该天数的证券
+        '''
+        d = to_day(date)
+        mask = (self.start_date <= d) & (self.end_date >= d)
+        types = _types(ty)
+        if types is not None:
+            mask &= np.isin(self.type, types)
+        if days:
+            mask &= self.start_date < d - np.timedelta64(int(days), 'D')
+        return mask
+
+    def universe(self, date, ty='stock'):
+        # 当日在市证券在主表中的位置（升序），最近 max_dates 个日期的结果保留
+        key = (to_day(date), _types(ty))
+        pos = self._universe.get(key)
+        if pos is None:
+            pos = np.flatnonzero(self.listed_mask(date, ty))
+            self._universe[key] = pos
+            while len(self._universe) > self.max_dates:
+                self._universe.popitem(last=False)
+        else:
+            self._universe.move_to_end(key)
+        return pos
+
+    def listed(self, date, days=None, ty='stock'):
+        # 当日在市的代码列表；days 只保留上市超过该天数的
+        pos = self.universe(date, ty)
+        if days:
+            pos = pos[self.start_date[pos] < to_day(date) - np.timedelta64(int(days), 'D')]
+        return list(self.symbols[pos])
@@ -0,0 +1,219 @@
+"""
+Compressed, chunked minute-bar store.
+
+Whole-market minute bars do not fit in RAM as (minute x symbol) float64, so
+they are kept per symbol in time chunks (one calendar month by default).
+Each chunk holds the bar timestamps and the fields of that symbol for the
+month, byte-shuffled and compressed with zlib (or lz4 when installed), and
+all chunks are concatenated into one data file.  A chunk index maps
+(symbol, chunk) to its byte range, so a history()/get_price() window only
+decompresses the chunks it overlaps; recently used chunks stay decoded in a
+small LRU cache.
+
+On disk a minute store is a directory:
+
+    meta.json        fields, codec, chunk unit and format version
+    symbols.txt      one symbol per line
+    index.npz        CSR chunk index: per symbol the chunks' first/last
+                     minute, byte offset, compressed size and row count
+    chunks.bin       the compressed chunks
+
+    minutes = MinuteStore.write('data/minutes', frames)
+    df = minutes.window('600000.SH', ['close'], '2024-04-17 14:55', '2024-04-17 14:55')
+"""
+import json
+import mmap
+import os
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .store import FIELDS
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+FORMAT_VERSION = 1
+
+CODECS = {
+    'zlib': (lambda b: zlib.compress(b, 1), zlib.decompress),
+}
+if lz4 is not None:
+    CODECS['lz4'] = (lz4.frame.compress, lz4.frame.decompress)
+
+
+def minutes(values):
+    # 时间戳 -> 自1970年起的分钟数(int64)
+    return pd.DatetimeIndex(values).values.astype('datetime64[m]').astype(np.int64)
+
+
+# 1. 块编码 ##################################################################
+def encode_chunk(stamps, values, codec='zlib'):
+    '''
+    stamps: int64分钟数，values: (rows x fields) float64
+    时间戳做差分，再按字节重排（同一字节位放在一起）后压缩
+    '''
+    stamps = np.diff(stamps, prepend=0).astype(np.int64)
+    block = np.ascontiguousarray(np.vstack([stamps.view(np.float64), np.asarray(values, dtype=np.float64).T]))
+    shuffled = block.view(np.uint8).reshape(block.shape[0], -1, 8).transpose(0, 2, 1)
+    return CODECS[codec][0](np.ascontiguousarray(shuffled).tobytes())
+
+
+def decode_chunk(data, rows, n_fields, codec='zlib'):
+    raw = np.frombuffer(CODECS[codec][1](data), dtype=np.uint8).reshape(n_fields + 1, 8, rows)
+    block = np.ascontiguousarray(raw.transpose(0, 2, 1)).view(np.float64).reshape(n_fields + 1, rows)
+    stamps = np.cumsum(block[0].view(np.int64))
+    return stamps, block[1:].T
+
+
+def chunk_keys(stamps, unit):
+    # 每根K线所属的块：按月('M')或按周('W')切分
+    if unit == 'M':
+        return stamps.astype('datetime64[m]').astype('datetime64[M]').astype(np.int64)
+    days = stamps // 1440
+    return (days + 3) // 7
+
+
+# 2. 分钟行情库 ##############################################################
+class MinuteStore(object):
+
+    def __init__(self, path, max_chunks=256):
+        meta = read_meta(path)
+        self.path = path
+        self.fields = list(meta['fields'])
+        self.codec = meta['codec']
+        if self.codec not in CODECS:
+            raise ValueError('minute store %s needs the %r codec, which is not installed' % (path, self.codec))
+        with open(os.path.join(path, 'symbols.txt'), encoding='utf-8') as f:
+            self.symbols = f.read().split()
+        self.sid = {s: i for i, s in enumerate(self.symbols)}
+        with np.load(os.path.join(path, 'index.npz')) as z:
+            self._ptr, self._first, self._last = z['ptr'], z['first'], z['last']
+            self._offset, self._size, self._rows = z['offset'], z['size'], z['rows']
+        with open(os.path.join(path, 'chunks.bin'), 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(f.name) else b''
+        self.max_chunks = max_chunks
+        self._cache = OrderedDict()
+
+    def __contains__(self, symbol):
+        return symbol in self.sid
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._cache.clear()
+
+    @classmethod
+    def write(cls, path, frames, fields=None, codec='zlib', unit='M'):
+        '''
+        frames: {symbol: DataFrame indexed by minute timestamp}
+        逐只股票、逐块压缩写入，内存中只保留一只股票的数据
+        '''
+        fields = list(fields or FIELDS)
+        if codec not in CODECS:
+            raise ValueError('unknown or unavailable codec %r' % codec)
+        os.makedirs(path, exist_ok=True)
+        symbols = sorted(frames)
+        ptr, first, last, offset, size, rows = [0], [], [], [], [], []
+        pos = 0
+        with open(os.path.join(path, 'chunks.bin'), 'wb') as out:
+            for symbol in symbols:
+                df = frames[symbol].sort_index()
+                df = df[~df.index.duplicated(keep='last')]
+                stamps = minutes(df.index)
+                values = np.column_stack([df[f].values.astype(float) if f in df.columns else np.full(len(df), np.nan)
+                                          for f in fields]) if len(df) else np.empty((0, len(fields)))
+                keys = chunk_keys(stamps, unit)
+                bounds = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1], True]) if len(keys) else []
+                for a, b in zip(bounds[:-1], bounds[1:]):
+                    data = encode_chunk(stamps[a:b], values[a:b], codec)
+                    out.write(data)
+                    first.append(stamps[a])
+                    last.append(stamps[b - 1])
+                    offset.append(pos)
+                    size.append(len(data))
+                    rows.append(b - a)
+                    pos += len(data)
+                ptr.append(len(first))
+        with open(os.path.join(path, 'symbols.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(symbols) + '\n')
+        np.savez(os.path.join(path, 'index.npz'), ptr=np.array(ptr, dtype=np.int64),
+                 first=np.array(first, dtype=np.int64), last=np.array(last, dtype=np.int64),
+                 offset=np.array(offset, dtype=np.int64), size=np.array(size, dtype=np.int64),
+                 rows=np.array(rows, dtype=np.int64))
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'version': FORMAT_VERSION, 'fields': fields, 'codec': codec, 'unit': unit}, f, indent=1)
+        return cls(path)
+
+    # 块读取 #################################################################
+    def _chunk(self, k):
+        if k in self._cache:
+            self._cache.move_to_end(k)
+            return self._cache[k]
+        a = self._offset[k]
+        chunk = decode_chunk(self._data[a:a + self._size[k]], int(self._rows[k]), len(self.fields), self.codec)
+        self._cache[k] = chunk
+        while len(self._cache) > self.max_chunks:
+            self._cache.popitem(last=False)
+        return chunk
+
+    def _chunks(self, symbol, lo, hi):
+        # 与[lo, hi]分钟区间重叠的块编号
+        j = self.sid[symbol]
+        a, b = self._ptr[j], self._ptr[j + 1]
+        k0 = a + np.searchsorted(self._last[a:b], lo, side='left')
+        k1 = a + np.searchsorted(self._first[a:b], hi, side='right')
+        return range(k0, k1)
+
+    def _frame(self, stamps, values, fields):
+        index = pd.DatetimeIndex(stamps.astype('datetime64[m]').astype('datetime64[ns]'))
+        cols = [self.fields.index(f) for f in fields]
+        return pd.DataFrame(values[:, cols], index=index, columns=fields)
+
+    def window(self, symbol, fields, start, end):
+        '''start <= 时间 <= end 的分钟K线'''
+        fields = list(fields or self.fields)
+        lo, hi = minutes([pd.Timestamp(start), pd.Timestamp(end)])
+        if symbol not in self.sid or hi < lo:
+            return self._frame(np.empty(0, dtype=np.int64), np.empty((0, len(self.fields))), fields)
+        parts = []
+        for k in self._chunks(symbol, lo, hi):
+            stamps, values = self._chunk(k)
+            m = (stamps >= lo) & (stamps <= hi)
+            parts.append((stamps[m], values[m]))
+        return self._concat(parts, fields)
+
+    def bars(self, symbol, fields, end, count):
+        '''不晚于end的最后count根分钟K线'''
+        fields = list(fields or self.fields)
+        hi = minutes([pd.Timestamp(end)])[0]
+        parts, n = [], 0
+        if symbol in self.sid:
+            j = self.sid[symbol]
+            k = self._ptr[j] + np.searchsorted(self._first[self._ptr[j]:self._ptr[j + 1]], hi, side='right') - 1
+            while k >= self._ptr[j] and n < count:
+                stamps, values = self._chunk(k)
+                m = stamps <= hi
+                parts.insert(0, (stamps[m], values[m]))
+                n += m.sum()
+                k -= 1
+        df = self._concat(parts, fields)
+        return df.iloc[len(df) - count:] if len(df) > count else df
+
+    def _concat(self, parts, fields):
+        if not parts:
+            return self._frame(np.empty(0, dtype=np.int64), np.empty((0, len(self.fields))), fields)
+        return self._frame(np.concatenate([p[0] for p in parts]), np.vstack([p[1] for p in parts]), fields)
+
+    def nbytes(self):
+        # (压缩后, 原始float64) 字节数
+        return int(self._size.sum()), int(self._rows.sum()) * 8 * (len(self.fields) + 1)
+
+
+def read_meta(path):
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,346 @@
+"""
+Candlestick pattern scans over the whole universe.
+
+"Breakaway Strategy.py" fetches the last 20 bars of every tradable stock and
+calls talib.CDLBREAKAWAY on each one, inside try/except, every day.
+PatternScanner answers the same question for a list of stocks at once:
+
+* scan(..., lookup=False) builds one (stock x window x OHLC) tensor from
+  each stock's own trading rows (paused days skipped, the way
+  history(..., skip_paused=True) does) and evaluates every pattern over the
+  whole tensor in one call;
+* hit_matrix() evaluates a numpy-kernel pattern over the full history of
+  every stock and keeps the (date x symbol) result in the store's cache
+  directory, so the daily scan (lookup=True) is one row lookup per stock.
+
+Both give what talib returns for the last bar of a `window`-bar call.
+CDLBREAKAWAY has a numpy kernel that repeats TA-Lib's arithmetic, including
+the running body-length total, for every stock and bar at once.  Any other
+talib CDL* function is run per stock on its `window`-bar tensor row and needs
+talib installed; it has no hit matrix, since one full-history talib call is
+not the same as a call per window, so scan() evaluates it on the tensor even
+when lookup=True.
+
+The three-wave decline of "Three-Wave Decline Strategy.py" (five daily
+returns in a set pattern) is a close-only kernel in the same registry, so
+it is scanned and cached the same way.  events() turns a hit matrix into a
+(date, symbol, value) table for historical studies without a replay.
+
+    scanner = PatternScanner(portal, window=20)
+    scanner.scan(stocks, ['CDLBREAKAWAY', 'CDLENGULFING'])
+    # {'CDLBREAKAWAY': [...], 'CDLENGULFING': [...]}
+    scanner.events('THREE_WAVE_DECLINE', start='2015-01-01')
+"""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import talib
+except ImportError:
+    talib = None
+
+OHLC = ('open', 'high', 'low', 'close')
+
+# TA-Lib 默认K线参数：长实体取前10根实体的均值
+BODY_LONG_PERIOD = 10
+
+
+def period_total(values, period, lookback, window=None):
+    '''
+    TA-Lib 在 window 根K线的调用中输出第t根时的累计值：values[t-lookback, t-lookback+period) 之和
+    初值按顺序相加，之后每根K线加上 (新值 - 旧值)，与逐只调用talib的舍入完全一致
+    values: 任意维数组，时间在最后一维；window 为None时整段序列视为一次调用；不足lookback的位置为NaN
+    '''
+    values = np.asarray(values, dtype=float)
+    n = values.shape[-1]
+    window = n if window is None else min(window, n)
+    total = np.full(values.shape, np.nan)
+    if window <= lookback:
+        return total
+    # 不足window根时调用从第0根开始，逐根更新
+    running = values[..., 0].copy()
+    for k in range(1, period):
+        running = running + values[..., k]
+    for t in range(lookback, window - 1):
+        total[..., t] = running
+        j = t - lookback
+        running = running + (values[..., period + j] - values[..., j])
+    # 满window根后，第t根的调用从 t-window+1 开始，初值后更新 window-1-lookback 次
+    m = n - window + 1
+    running = values[..., 0:m].copy()
+    for k in range(1, period):
+        running = running + values[..., k:k + m]
+    for j in range(window - 1 - lookback):
+        running = running + (values[..., period + j:period + j + m] - values[..., j:j + m])
+    total[..., window - 1:] = running
+    return total
+
+
+def cdl_breakaway(open, high, low, close, window=None):
+    '''
+    脱离形态，与 talib.CDLBREAKAWAY 一致：看涨为100，看跌为-100，否则为0
+    时间在最后一维；window 为每次调用的K线数（None 为整段序列）
+    '''
+    o, h, l, c = (np.asarray(x, dtype=float) for x in (open, high, low, close))
+    n = c.shape[-1]
+    out = np.zeros(c.shape, dtype=np.int16)
+    lookback = BODY_LONG_PERIOD + 4
+    if n <= lookback:
+        return out
+    body = np.abs(c - o)
+    total = period_total(body, BODY_LONG_PERIOD, lookback, window)
+    color = np.where(c >= o, 1, -1)
+    top, bottom = np.maximum(o, c), np.minimum(o, c)
+
+    def at(x, k):
+        # 对每个输出位置t取第t-k根
+        return x[..., lookback - k:n - k]
+
+    with np.errstate(invalid='ignore'):
+        long_first = at(body, 4) > total[..., lookback:] / BODY_LONG_PERIOD
+        colors = ((at(color, 4) == at(color, 3)) & (at(color, 3) == at(color, 1))
+                  & (at(color, 1) == -at(color, 0)))
+        # 第一根为阴线：第二根跳空低开，第三、四根高低点依次降低，第五根收在缺口内
+        down = ((at(color, 4) == -1) & (at(top, 3) < at(bottom, 4))
+                & (at(h, 2) < at(h, 3)) & (at(l, 2) < at(l, 3))
+                & (at(h, 1) < at(h, 2)) & (at(l, 1) < at(l, 2))
+                & (at(c, 0) > at(o, 3)) & (at(c, 0) < at(c, 4)))
+        # 第一根为阳线：方向相反
+        up = ((at(color, 4) == 1) & (at(bottom, 3) > at(top, 4))
+              & (at(h, 2) > at(h, 3)) & (at(l, 2) > at(l, 3))
+              & (at(h, 1) > at(h, 2)) & (at(l, 1) > at(l, 2))
+              & (at(c, 0) < at(o, 3)) & (at(c, 0) > at(c, 4)))
+    hit = long_first & colors & (down | up)
+    out[..., lookback:] = np.where(hit, at(color, 0) * 100, 0)
+    return out
+
+
+def three_wave_decline(open, high, low, close, window=None):
+    '''
+    三浪下跌：最近6根收盘价的5个涨跌幅依次为 < -5%、0~4%、< 1%、< -2%、< -1%，出现为100，否则为0
+    时间在最后一维；只用收盘价，结果与window无关
+    '''
+    c = np.asarray(close, dtype=float)
+    n = c.shape[-1]
+    out = np.zeros(c.shape, dtype=np.int16)
+    if n < 6:
+        return out
+    roc = c[..., 1:] / c[..., :-1] - 1
+
+    def at(k):
+        # 对每个输出位置t取截至第t-k根的涨跌幅
+        return roc[..., 4 - k:n - 1 - k]
+
+    with np.errstate(invalid='ignore'):
+        hit = ((at(4) < -0.05) & (at(3) > 0) & (at(3) < 0.04) & (at(2) < 0.01)
+               & (at(1) < -0.02) & (at(0) < -0.01))
+    out[..., 5:] = np.where(hit, 100, 0)
+    return out
+
+
+# 有numpy实现的形态
+KERNELS = {
+    'CDLBREAKAWAY': cdl_breakaway,
+    'THREE_WAVE_DECLINE': three_wave_decline,
+}
+
+
+def talib_pattern(name, open, high, low, close):
+    '''
+    其他 talib CDL* 形态：对每一行（时间在最后一维）的有效K线调用一次talib
+    '''
+    if talib is None:
+        raise ImportError('pattern %s needs talib (numpy kernels: %s)' % (name, ', '.join(sorted(KERNELS))))
+    func = getattr(talib, name)
+    arrays = [np.asarray(x, dtype=float) for x in (open, high, low, close)]
+    shape = arrays[0].shape
+    o, h, l, c = (x.reshape(-1, shape[-1]) for x in arrays)
+    out = np.zeros(o.shape, dtype=np.int16)
+    for k in range(len(o)):
+        valid = ~np.isnan(c[k])
+        if valid.any():
+            out[k, valid] = func(o[k, valid], h[k, valid], l[k, valid], c[k, valid])
+    return out.reshape(shape)
+
+
+def pattern_values(name, open, high, low, close, window=None):
+    # 形态值，时间在最后一维；talib实现把每行的全部有效K线当作一次调用，只用于当日张量
+    name = name.upper()
+    if name in KERNELS:
+        return KERNELS[name](open, high, low, close, window)
+    return talib_pattern(name, open, high, low, close)
+
+
+def last_rows(close, end, cols, span=64):
+    '''
+    各列在 end 之前（不含）最后一个有效行的位置，没有为-1
+    先在最近span行内找，找不到的列（长期停牌）再单独向前找
+    '''
+    i0 = max(end - span, 0)
+    valid = ~np.isnan(close[i0:end][:, cols])
+    rows = np.full(len(cols), -1, dtype=np.int64)
+    if end > i0:
+        has = valid.any(axis=0)
+        rows[has] = end - 1 - valid[::-1].argmax(axis=0)[has]
+    for k in np.flatnonzero(rows < 0):
+        found = np.flatnonzero(~np.isnan(close[:i0, cols[k]]))
+        if len(found):
+            rows[k] = found[-1]
+    return rows
+
+
+class PatternScanner(object):
+    '''
+    全市场K线形态扫描，数据取自 DataPortal 当前时钟之前已完成的日线（不复权、跳过停牌）
+    '''
+
+    def __init__(self, portal, window=20, block=512):
+        self.portal = portal
+        self.window = window
+        self.block = block
+        self._matrices = {}
+
+    # 1. 当日张量 ###########################################################
+    def tensor(self, symbols, window=None):
+        '''
+        (股票 x window x OHLC) 张量：各股票最近window根交易K线，不足的在前面补NaN
+        返回 (张量, 各股票的有效K线数)
+        '''
+        store = self.portal.store
+        window = window or self.window
+        cols = self.portal.lookup(list(symbols))
+        known = cols >= 0
+        cols = np.maximum(cols, 0)
+        end = self.portal.i
+        if end == 0:
+            return np.full((len(cols), window, len(OHLC)), np.nan), np.zeros(len(cols), dtype=np.int64)
+        i0 = max(end - 4 * window, 0)
+        close = store.field('close')
+        valid = ~np.isnan(close[i0:end][:, cols]) & known
+        order = np.argsort(~valid, axis=0, kind='stable')
+        total = valid.sum(axis=0)
+        # 压缩后第 total-window .. total-1 行即最近window根
+        rows = total[None, :] - window + np.arange(window)[:, None]
+        inside = rows >= 0
+        rows = np.take_along_axis(order, np.maximum(rows, 0), axis=0) + i0
+        out = np.full((len(cols), window, len(OHLC)), np.nan)
+        for f, name in enumerate(OHLC):
+            out[:, :, f] = np.where(inside, store.field(name)[rows, cols], np.nan).T
+        counts = np.minimum(total, window)
+        # 近期停牌较多、区间内K线不够的股票单独向前补齐
+        short = np.flatnonzero(known & (counts < window) & (store.first_valid[cols] < i0))
+        for k in short:
+            found = np.flatnonzero(~np.isnan(close[:end, cols[k]]))[-window:]
+            out[k] = np.nan
+            for f, name in enumerate(OHLC):
+                out[k, window - len(found):, f] = store.field(name)[found, cols[k]]
+            counts[k] = len(found)
+        return out, counts
+
+    def scan_tensor(self, tensor, counts, patterns):
+        # 在张量上计算各形态最后一根K线的值，返回 {形态: 值数组}；K线数不同的股票按各自长度计算
+        window = tensor.shape[1]
+        result = {}
+        for name in patterns:
+            values = np.zeros(len(tensor), dtype=np.int16)
+            for n in np.unique(counts):
+                if n == 0:
+                    continue
+                k = np.flatnonzero(counts == n)
+                part = tensor[k, window - n:]
+                values[k] = pattern_values(name, *(part[:, :, f] for f in range(len(OHLC))), window=n)[:, -1]
+            result[name] = values
+        return result
+
+    # 2. 全历史命中矩阵 #####################################################
+    def hit_matrix(self, pattern):
+        '''
+        (日期 x 行情库股票) 的形态值：每个交易行为截至该行的最近window根交易K线上talib的结果，停牌行为0
+        结果缓存在行情库的 cache 目录；只支持有numpy实现的形态
+        '''
+        pattern = pattern.upper()
+        if pattern not in KERNELS:
+            raise ValueError('no hit matrix for %s: only numpy kernels (%s) are cached, scan other patterns per window'
+                             % (pattern, ', '.join(sorted(KERNELS))))
+        if pattern in self._matrices:
+            return self._matrices[pattern]
+        store = self.portal.store
+        name = 'pattern_%s_w%d_v%d.npy' % (pattern.lower(), self.window, store.data_version)
+        path = store.cache_path(name)
+        if path is not None and os.path.exists(path):
+            matrix = np.load(path, mmap_mode='r')
+        else:
+            matrix = self._compute(pattern)
+            if path is not None:
+                # 先写临时文件再改名，多个进程同时回测时不会读到半个文件
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, matrix)
+                os.replace(tmp, path)
+        self._matrices[pattern] = matrix
+        return matrix
+
+    def _compute(self, pattern):
+        store = self.portal.store
+        n_date, n_symbol = len(store.dates), len(store.symbols)
+        out = np.zeros((n_date, n_symbol), dtype=np.int16)
+        # 按股票分块，中间数组大小有界
+        for a in range(0, n_symbol, self.block):
+            close = np.asarray(store.field('close')[:, a:a + self.block], dtype=float)
+            valid = ~np.isnan(close)
+            order = np.argsort(~valid, axis=0, kind='stable')
+            fields = [np.take_along_axis(np.asarray(store.field(f)[:, a:a + self.block], dtype=float), order, axis=0)
+                      for f in OHLC]
+            values = pattern_values(pattern, *(x.T for x in fields), window=self.window).T
+            part = np.zeros(values.shape, dtype=np.int16)
+            np.put_along_axis(part, order, values, axis=0)
+            part[~valid] = 0
+            out[:, a:a + self.block] = part
+        return out
+
+    def events(self, pattern, start=None, end=None):
+        '''
+        形态事件表：命中矩阵中非0的 (date, symbol, value)，按日期、代码排序；start/end 为闭区间
+        '''
+        store = self.portal.store
+        i0 = 0 if start is None else int(np.searchsorted(store.dates, np.datetime64(pd.Timestamp(start).date(), 'D')))
+        i1 = len(store.dates) - 1 if end is None else store.date_index(end)
+        block = np.asarray(self.hit_matrix(pattern)[i0:i1 + 1])
+        rows, cols = np.nonzero(block)
+        return pd.DataFrame({
+            'date': pd.DatetimeIndex(store.dates[i0 + rows]),
+            'symbol': np.asarray(store.symbols, dtype=object)[cols],
+            'value': block[rows, cols],
+        })
+
+    # 3. 当日扫描 ###########################################################
+    def values(self, symbols, pattern, lookup=True):
+        # symbols 各自最近一根已完成交易K线上的形态值，不在行情库中的为0；没有numpy实现的形态不查表
+        symbols = list(symbols)
+        if not lookup or pattern.upper() not in KERNELS:
+            tensor, counts = self.tensor(symbols)
+            return self.scan_tensor(tensor, counts, [pattern])[pattern]
+        cols = self.portal.lookup(symbols)
+        known = cols >= 0
+        cols = np.maximum(cols, 0)
+        rows = last_rows(self.portal.store.field('close'), self.portal.i, cols)
+        values = np.asarray(self.hit_matrix(pattern)[np.maximum(rows, 0), cols])
+        return np.where(known & (rows >= 0), values, 0)
+
+    def scan(self, symbols, patterns=('CDLBREAKAWAY',), lookup=True):
+        '''
+        返回 {形态: 出现该形态的股票列表}，保持symbols的顺序
+        lookup=True 对有numpy实现的形态查全历史命中矩阵（首次使用时计算），其余形态和 False 时在当日张量上一次计算
+        '''
+        symbols = list(symbols)
+        patterns = [patterns] if isinstance(patterns, str) else list(patterns)
+        cached = [p for p in patterns if lookup and p.upper() in KERNELS]
+        values = {p: self.values(symbols, p) for p in cached}
+        rest = [p for p in patterns if p not in cached]
+        if rest:
+            tensor, counts = self.tensor(symbols)
+            values.update(self.scan_tensor(tensor, counts, rest))
+        return {p: [symbols[k] for k in np.flatnonzero(values[p] != 0)] for p in patterns}
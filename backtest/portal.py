@@ -0,0 +1,596 @@
+"""
+Market data access for strategies running on the local engine.
+
+DataPortal answers history()/get_price()/bar_dict lookups straight from the
+(date x symbol) arrays of a BarStore.  The portal carries the backtest clock:
+in daily mode strategies run at the open of bar `i`, so completed bars end at
+`i - 1` and anything asked about today only sees the opening price.
+Minute bars (fre_step='1m') come from an optional minute.MinuteStore and are
+cut off at the current bar time.
+
+Trading status for universe filters (paused, ST, opened at limit-up or
+limit-down) is precomputed for the whole store as one (date x symbol)
+uint8 array of bit flags, with the same rules as bar_dict, and kept in the
+store's cache directory.  filter_tradable() then answers "unpaused, not ST,
+not limit-up at the open, listed for 60 days" with a few array operations
+on one row instead of a bar_dict lookup per stock and rule.
+
+Listing dates, types, boards and exchanges live in a master.SecurityMaster
+built from the same table as get_all_securities(), so listing-age filters
+and per-date universes are array comparisons as well.
+"""
+import datetime
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from .master import SecurityMaster, infer_board
+from .rolling import beta_history
+
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+
+# 开盘时刻：bar_time 晚于开盘时，委托按当时的分钟K线收盘价成交
+OPEN_TIME = datetime.time(9, 30)
+
+# 交易状态位
+PAUSED, ST, HIGH_LIMIT, LOW_LIMIT = 1, 2, 4, 8
+
+# 聚宽交易所后缀
+EXCHANGE_ALIASES = {'XSHG': 'SH', 'XSHE': 'SZ'}
+
+
+def normalize_symbol(symbol):
+    # '000001.XSHE' -> '000001.SZ'
+    code, _, exchange = symbol.partition('.')
+    return '%s.%s' % (code, EXCHANGE_ALIASES.get(exchange, exchange))
+
+
+def infer_type(symbol):
+    # 根据代码规则推断证券类型
+    code, _, exchange = symbol.partition('.')
+    if exchange == 'OF':
+        return 'fund'
+    if (exchange == 'SH' and code.startswith('000')) or (exchange == 'SZ' and code.startswith('399')):
+        return 'index'
+    return 'stock'
+
+
+def price_limit_ratio(symbol, is_st=False):
+    # 涨跌停幅度：ST 5%，创业板/科创板 20%，其余 10%
+    if is_st:
+        return 0.05
+    if symbol.startswith('300') or symbol.startswith('688'):
+        return 0.2
+    return 0.1
+
+
+def as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+def round_price(values):
+    '''
+    向量化的 round(x, 2)：np.round 先乘100再取整，在 8.525 这类恰好半分的价格上
+    可能与 Python 的 round 不同，这些位置改用 round 计算
+    '''
+    out = np.round(values, 2)
+    with np.errstate(invalid='ignore'):
+        scaled = np.asarray(values) * 100
+        half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for k in zip(*np.nonzero(half)):
+        out[k] = round(float(values[k]), 2)
+    return out
+
+
+def status_flags(store, block=256):
+    '''
+    (日期 x 股票) 的交易状态位：停牌、ST、开盘涨停、开盘跌停，判断规则与 bar_dict 相同
+    按行分块计算，结果缓存在行情库的 cache 目录
+    '''
+    path = store.cache_path('status_v%d.npy' % store.data_version)
+    if path is not None and os.path.exists(path):
+        return np.load(path)
+    fields = store.fields
+    n = len(store.dates)
+    out = np.zeros((n, len(store.symbols)), dtype=np.uint8)
+    ratio = np.array([price_limit_ratio(s) for s in store.symbols])
+    close = store.field('close')
+    for a in range(0, n, block):
+        b = min(a + block, n)
+        open_ = store.field('open')[a:b].astype(float)
+        paused = np.isnan(open_)
+        if 'volume' in fields:
+            paused |= fields['volume'][a:b] == 0
+        st = fields['is_st'][a:b] == 1 if 'is_st' in fields else np.zeros(open_.shape, dtype=bool)
+        # 前收盘价，首个交易日为NaN
+        prev = np.full(open_.shape, np.nan)
+        if a == 0:
+            prev[1:] = close[:b - 1]
+        else:
+            prev[:] = close[a - 1:b - 1]
+        r = np.where(st, 0.05, ratio)
+        limits = []
+        for name, sign in (('high_limit', 1), ('low_limit', -1)):
+            limit = round_price(prev * (1 + sign * r))
+            if name in fields:
+                stored = fields[name][a:b]
+                limit = np.where(np.isnan(stored), limit, stored)
+            limits.append(limit)
+        with np.errstate(invalid='ignore'):
+            out[a:b] = (paused * PAUSED | st * ST | (open_ == limits[0]) * HIGH_LIMIT
+                        | (open_ == limits[1]) * LOW_LIMIT)
+    if path is not None:
+        # 先写临时文件再改名，多个进程同时回测时不会读到半个文件
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, out)
+        os.replace(tmp, path)
+    return out
+
+
+class Panel(dict):
+    '''{field: DataFrame(date x symbol)}，支持 panel.close 式的属性访问'''
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class SecurityInfo(object):
+
+    def __init__(self, symbol, display_name, start_date, end_date, type):
+        self.symbol = symbol
+        self.display_name = display_name
+        self.start_date = start_date
+        self.listed_date = start_date
+        self.end_date = end_date
+        self.type = type
+
+
+class Bar(object):
+    '''bar_dict[symbol]：当日开盘时刻可见的行情'''
+
+    def __init__(self, portal, symbol):
+        self._portal = portal
+        self.symbol = symbol
+        self._j = portal.column(symbol)
+        self._i = portal.i
+
+    def _value(self, field, i):
+        if i < 0:
+            return np.nan
+        arr = self._portal.store.fields.get(field)
+        return np.nan if arr is None else float(arr[i, self._j])
+
+    @property
+    def open(self):
+        return self._value('open', self._i)
+
+    # 开盘时刻最高、最低、最新价均等于开盘价
+    high = low = close = last = price = open
+
+    @property
+    def prev_close(self):
+        return self._value('close', self._i - 1)
+
+    pre_close = prev_close
+
+    @property
+    def volume(self):
+        return self._value('volume', self._i - 1)
+
+    @property
+    def turnover(self):
+        return self._value('turnover', self._i - 1)
+
+    @property
+    def is_st(self):
+        return int(self._value('is_st', self._i) == 1)
+
+    @property
+    def is_paused(self):
+        v = self._value('volume', self._i)
+        return int(np.isnan(self.open) or v == 0)
+
+    @property
+    def high_limit(self):
+        stored = self._value('high_limit', self._i)
+        if not np.isnan(stored):
+            return stored
+        return round(self.prev_close * (1 + price_limit_ratio(self.symbol, self.is_st)), 2)
+
+    @property
+    def low_limit(self):
+        stored = self._value('low_limit', self._i)
+        if not np.isnan(stored):
+            return stored
+        return round(self.prev_close * (1 - price_limit_ratio(self.symbol, self.is_st)), 2)
+
+
+class BarDict(object):
+
+    def __init__(self, portal):
+        self._portal = portal
+
+    def __getitem__(self, symbol):
+        if not self._portal.has(symbol):
+            raise KeyError(symbol)
+        return Bar(self._portal, symbol)
+
+    def __contains__(self, symbol):
+        return self._portal.has(symbol)
+
+
+class DataPortal(object):
+
+    def __init__(self, store, securities=None, bar_time=OPEN_TIME, minutes=None):
+        self.store = store
+        self.minutes = minutes
+        self.i = 0
+        self.bar_time = bar_time
+        self._meta = securities
+        self._master = None
+        self._securities = None
+        self._status = None
+        self._symbol_index = None
+
+    # 1. 时钟 ###############################################################
+    def set_index(self, i):
+        self.i = i
+
+    @property
+    def now(self):
+        d = pd.Timestamp(self.store.dates[self.i]).date()
+        return datetime.datetime.combine(d, self.bar_time)
+
+    @property
+    def intraday(self):
+        # 开盘后运行：脚本能看到当日已走完的分钟K线
+        return self.bar_time > OPEN_TIME
+
+    @property
+    def last_datetime(self):
+        d = pd.Timestamp(self.store.dates[max(self.i - 1, 0)]).date()
+        return datetime.datetime.combine(d, datetime.time(15, 0))
+
+    def trade_days(self, start_date=None, end_date=None, count=None):
+        dates = self.store.dates
+        end = self.store.date_index(end_date) if end_date is not None else self.i
+        end = min(end, self.i)
+        if count is not None:
+            start = max(end - count + 1, 0)
+        elif start_date is not None:
+            start = int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date).date(), 'D')))
+        else:
+            start = 0
+        return pd.DatetimeIndex(dates[start:end + 1])
+
+    # 2. 行情窗口 ###########################################################
+    def has(self, symbol):
+        return symbol in self.store.sid or normalize_symbol(symbol) in self.store.sid
+
+    def column(self, symbol):
+        sid = self.store.sid
+        if symbol in sid:
+            return sid[symbol]
+        return sid[normalize_symbol(symbol)]
+
+    def columns(self, symbols):
+        return np.array([self.column(s) for s in symbols], dtype=np.int64)
+
+    def lookup(self, symbols):
+        # 批量取列号，不在行情库中的为-1
+        if self._symbol_index is None:
+            self._symbol_index = pd.Index(self.store.symbols)
+        cols = self._symbol_index.get_indexer(symbols)
+        for k in np.flatnonzero(cols < 0):
+            cols[k] = self.store.sid.get(normalize_symbol(symbols[k]), -1)
+        return cols
+
+    def _rows(self, field, i0, i1, cols):
+        # (i1 - i0) x len(cols) 的字段窗口，i1 不含
+        store = self.store
+        n = i1 - i0
+        if n <= 0:
+            return np.empty((0, len(cols)))
+        if field in store.fields:
+            out = store.fields[field][i0:i1][:, cols].astype(float)
+        elif field == 'quote_rate':
+            out = (self._rows('close', i0, i1, cols) / self._rows('pre_close', i0, i1, cols) - 1) * 100
+        elif field in ('pre_close', 'prev_close'):
+            if i0 == 0:
+                out = np.vstack([np.full((1, len(cols)), np.nan), self._rows('close', 0, i1 - 1, cols)])
+            else:
+                out = self._rows('close', i0 - 1, i1 - 1, cols)
+        elif field == 'is_paused':
+            close = self._rows('close', i0, i1, cols)
+            volume = self._rows('volume', i0, i1, cols) if 'volume' in store.fields else np.ones_like(close)
+            out = (np.isnan(close) | (volume == 0)).astype(float)
+        elif field == 'is_st':
+            out = np.zeros((n, len(cols)))
+        elif field in ('high_limit', 'low_limit'):
+            pre = self._rows('pre_close', i0, i1, cols)
+            st = self._rows('is_st', i0, i1, cols) == 1
+            ratio = np.array([[price_limit_ratio(store.symbols[j]) for j in cols]]).repeat(n, axis=0)
+            ratio[st] = 0.05
+            sign = 1 if field == 'high_limit' else -1
+            out = round_price(pre * (1 + sign * ratio))
+        elif field in ('amount', 'money'):
+            out = self._rows('turnover', i0, i1, cols)
+        elif field == 'avg':
+            out = self._rows('turnover', i0, i1, cols) / self._rows('volume', i0, i1, cols)
+        else:
+            raise KeyError('unknown field %r' % field)
+        if i1 == self.i + 1 and n:
+            # 当日K线尚未走完，只能看到开盘价
+            out = out.copy()
+            if field in PRICE_FIELDS:
+                out[-1] = store.fields['open'][self.i, cols]
+            elif field in ('volume', 'turnover', 'amount', 'money', 'avg', 'quote_rate'):
+                out[-1] = np.nan
+        return out
+
+    def _adjust(self, data, i0, i1, cols):
+        # 前复权：以当前交易日的复权因子为基准
+        factor = self.store.fields.get('adj_factor')
+        if factor is None:
+            return data
+        scale = factor[i0:i1][:, cols] / factor[self.i, cols]
+        for f in PRICE_FIELDS + ('pre_close', 'high_limit', 'low_limit'):
+            if f in data:
+                data[f] = data[f] * scale
+        return data
+
+    def _skip_paused_start(self, j, end, count):
+        # 向前扩展窗口，直到包含count根未停牌K线
+        close = self.store.fields['close']
+        span = count
+        while True:
+            i0 = max(end - span, 0)
+            valid = np.flatnonzero(~np.isnan(close[i0:end, j]))
+            if len(valid) >= count or i0 == 0:
+                return i0 + valid[-count:] if count else valid[:0]
+            span *= 2
+
+    def window(self, symbols, fields, i0, i1, skip_paused=False, fq=None, frames=True):
+        store = self.store
+        symbols = as_list(symbols)
+        fields = as_list(fields)
+        cols = self.columns(symbols)
+        data = {f: self._rows(f, i0, i1, cols) for f in fields}
+        if fq in ('pre', 'post'):
+            data = self._adjust(data, i0, i1, cols)
+        index = pd.DatetimeIndex(store.dates[i0:i1])
+        if not frames:
+            return index, data, None
+        frames = {}
+        for k, symbol in enumerate(symbols):
+            df = pd.DataFrame({f: data[f][:, k] for f in fields}, index=index)
+            if skip_paused:
+                df = df[~np.isnan(store.fields['close'][i0:i1, cols[k]])]
+            else:
+                prices = [f for f in fields if f in PRICE_FIELDS]
+                if prices:
+                    df[prices] = df[prices].ffill()
+            frames[symbol] = df
+        return index, data, frames
+
+    def history(self, security_list, fields, bar_count, fre_step='1d', skip_paused=False, fq=None, is_panel=0):
+        if fre_step == '1m':
+            return self._minute_history(security_list, fields, bar_count, fq, is_panel)
+        if fre_step != '1d':
+            raise NotImplementedError('only daily and 1m bars are available in the local store')
+        single = isinstance(security_list, str)
+        symbols = as_list(security_list)
+        fields = as_list(fields)
+        end = self.i
+        if skip_paused:
+            frames = {}
+            for symbol in symbols:
+                rows = self._skip_paused_start(self.column(symbol), end, bar_count)
+                i0 = rows[0] if len(rows) else end
+                _, _, fr = self.window(symbol, fields, i0, end, skip_paused=True, fq=fq)
+                frames[symbol] = fr[symbol].tail(bar_count)
+            return self._shape(frames, symbols, fields, single, is_panel)
+        i0 = max(end - bar_count, 0)
+        if is_panel and not single:
+            return self._panel(*self.window(symbols, fields, i0, end, fq=fq, frames=False)[:2], symbols, fields)
+        _, _, frames = self.window(symbols, fields, i0, end, fq=fq)
+        return self._shape(frames, symbols, fields, single, is_panel)
+
+    def get_price(self, securities, start_date=None, end_date=None, fre_step='1d', fields=None,
+                  skip_paused=False, fq=None, bar_count=0, is_panel=0):
+        if fre_step == '1m':
+            return self._minute_price(securities, start_date, end_date, fields, fq, bar_count, is_panel)
+        if fre_step != '1d':
+            raise NotImplementedError('only daily and 1m bars are available in the local store')
+        single = isinstance(securities, str)
+        symbols = as_list(securities)
+        fields = as_list(fields) or ['open', 'high', 'low', 'close', 'volume', 'turnover']
+        end = self.i if end_date is None else min(self.store.date_index(end_date), self.i)
+        if start_date is not None:
+            i0 = int(np.searchsorted(self.store.dates, np.datetime64(pd.Timestamp(start_date).date(), 'D')))
+        else:
+            i0 = max(end + 1 - bar_count, 0)
+        if is_panel and not single and not skip_paused:
+            return self._panel(*self.window(symbols, fields, i0, end + 1, fq=fq, frames=False)[:2], symbols, fields)
+        _, _, frames = self.window(symbols, fields, i0, end + 1, skip_paused=skip_paused, fq=fq)
+        return self._shape(frames, symbols, fields, single, is_panel)
+
+    # 分钟K线：不超过当前时刻，复权沿用日线复权因子
+    def _minute_store(self):
+        if self.minutes is None:
+            raise NotImplementedError('no minute store is attached, 1m bars are unavailable')
+        return self.minutes
+
+    def _minute_adjust(self, df, symbol, fq):
+        factor = self.store.fields.get('adj_factor')
+        if fq not in ('pre', 'post') or factor is None or not len(df):
+            return df
+        j = self.column(symbol)
+        rows = np.searchsorted(self.store.dates, df.index.values.astype('datetime64[D]'), side='right') - 1
+        scale = factor[np.maximum(rows, 0), j] / factor[self.i, j]
+        prices = [f for f in df.columns if f in PRICE_FIELDS]
+        df[prices] = df[prices].values * scale[:, None]
+        return df
+
+    def minute_close(self, symbol):
+        '''当日不晚于当前时刻的最后一根分钟K线的收盘价（不复权），当日没有分钟K线为NaN'''
+        now = pd.Timestamp(self.now)
+        df = self._minute_store().bars(normalize_symbol(symbol), ['close'], now, 1)
+        if not len(df) or df.index[-1].date() != now.date():
+            return np.nan
+        return float(df['close'].iloc[-1])
+
+    def _minute_history(self, security_list, fields, bar_count, fq, is_panel):
+        minutes = self._minute_store()
+        single = isinstance(security_list, str)
+        symbols = as_list(security_list)
+        fields = as_list(fields)
+        # 分钟K线以结束时刻标记，不晚于当前时刻的K线均已走完
+        end = pd.Timestamp(self.now)
+        frames = {s: self._minute_adjust(minutes.bars(normalize_symbol(s), fields, end, bar_count), s, fq)
+                  for s in symbols}
+        return self._shape(frames, symbols, fields, single, is_panel)
+
+    def _minute_price(self, securities, start_date, end_date, fields, fq, bar_count, is_panel):
+        minutes = self._minute_store()
+        single = isinstance(securities, str)
+        symbols = as_list(securities)
+        fields = as_list(fields) or list(minutes.fields)
+        now = pd.Timestamp(self.now)
+        end = now if end_date is None else min(pd.Timestamp(end_date), now)
+        frames = {}
+        for s in symbols:
+            if start_date is not None:
+                df = minutes.window(normalize_symbol(s), fields, start_date, end)
+            else:
+                df = minutes.bars(normalize_symbol(s), fields, end, bar_count)
+            frames[s] = self._minute_adjust(df, s, fq)
+        return self._shape(frames, symbols, fields, single, is_panel)
+
+    def rolling_beta(self, security, window, start_date=None, end_date=None, x='low', y='high'):
+        '''
+        本地扩展：日线 y 对 x 的滚动回归（默认最高价对最低价），只含已走完的K线
+        start_date 之后第一个完整窗口开始，整段历史的结果缓存在行情库中
+        '''
+        df = beta_history(self.store, self.store.symbols[self.column(security)], window, x, y)
+        end = self.i - 1 if end_date is None else min(self.store.date_index(end_date), self.i - 1)
+        i0 = window - 1
+        if start_date is not None:
+            i0 += int(np.searchsorted(self.store.dates, np.datetime64(pd.Timestamp(start_date).date(), 'D')))
+        return df.iloc[i0:end + 1]
+
+    @staticmethod
+    def _panel(index, data, symbols, fields):
+        # 直接由 (日期 x 股票) 数组构建Panel，不经过逐只股票的DataFrame；价格字段同样前向填充
+        panel = Panel()
+        for f in fields:
+            df = pd.DataFrame(data[f], index=index, columns=symbols)
+            panel[f] = df.ffill() if f in PRICE_FIELDS else df
+        return panel
+
+    @staticmethod
+    def _shape(frames, symbols, fields, single, is_panel):
+        if single:
+            return frames[symbols[0]]
+        if is_panel:
+            return Panel((f, pd.DataFrame({s: frames[s][f] for s in symbols})) for f in fields)
+        return frames
+
+    # 3. 证券信息 ###########################################################
+    def master(self):
+        # 证券主表：symbol -> display_name/start_date/end_date/type/board/exchange
+        if self._master is None:
+            store = self.store
+            dates = pd.DatetimeIndex(store.dates)
+            first = np.minimum(store.first_valid, len(dates) - 1)
+            last = np.maximum(store.last_valid, 0)
+            df = pd.DataFrame({
+                'display_name': store.symbols,
+                'start_date': dates[first],
+                'end_date': dates[last],
+                'type': [infer_type(s) for s in store.symbols],
+                'board': [infer_board(s) for s in store.symbols],
+                'exchange': [s.partition('.')[2] for s in store.symbols],
+            }, index=pd.Index(store.symbols, name='symbol'))
+            # 数据最后一天仍有行情的视为未退市
+            df.loc[store.last_valid == len(dates) - 1, 'end_date'] = pd.Timestamp('2200-01-01')
+            if self._meta is not None:
+                meta = self._meta.reindex(df.index)
+                for col in meta.columns:
+                    df[col] = meta[col].where(meta[col].notna(), df[col]) if col in df else meta[col]
+            self._master = df
+        return self._master
+
+    def securities(self):
+        # 数组形式的证券主表，与 master() 同一顺序（即行情库的列顺序）
+        if self._securities is None:
+            self._securities = SecurityMaster.from_frame(self.master())
+        return self._securities
+
+    def all_securities(self, ty='stock', date=None):
+        df = self.master()
+        if date is not None:
+            return df.iloc[self.securities().universe(date, ty)]
+        if ty:
+            df = df[df['type'].isin(as_list(ty))]
+        return df
+
+    def filter_listed(self, symbols, days=0, date=None):
+        # 保持原有顺序，只保留截至date（默认为当前交易日）上市超过days天的证券
+        symbols = as_list(symbols)
+        cols = self.lookup(symbols)
+        age = self.securities().listed_days(self.now if date is None else date)
+        keep = (cols >= 0) & (age[np.maximum(cols, 0)] > days)
+        return [symbols[k] for k in np.flatnonzero(keep)]
+
+    def security_info(self, symbol):
+        row = self.master().loc[normalize_symbol(symbol)]
+        return SecurityInfo(symbol, row['display_name'], row['start_date'], row['end_date'], row['type'])
+
+    def status(self):
+        # 全部历史的交易状态位，第一次使用时计算
+        if self._status is None:
+            self._status = status_flags(self.store)
+        return self._status
+
+    def tradable_index(self, symbols, paused=True, st=True, high_limit=False, low_limit=False, new_days=None):
+        '''
+        symbols 中当日可交易股票的位置：按状态位排除停牌、ST、开盘涨停、开盘跌停，
+        new_days 排除上市不满该天数的新股；不在行情库中的股票一并排除
+        '''
+        symbols = as_list(symbols)
+        cols = self.lookup(symbols)
+        known = cols >= 0
+        cols = np.maximum(cols, 0)
+        exclude = PAUSED * paused | ST * st | HIGH_LIMIT * high_limit | LOW_LIMIT * low_limit
+        keep = known & ((self.status()[self.i][cols] & exclude) == 0)
+        if new_days:
+            keep &= self.securities().listed_days(self.now, cols) >= new_days
+        return np.flatnonzero(keep)
+
+    def filter_tradable(self, symbols, paused=True, st=True, high_limit=False, low_limit=False, new_days=None):
+        # 保持原有顺序
+        symbols = as_list(symbols)
+        return [symbols[k] for k in self.tradable_index(symbols, paused, st, high_limit, low_limit, new_days)]
+
+    def st_stocks(self):
+        if 'is_st' not in self.store.fields:
+            return []
+        row = self.store.fields['is_st'][self.i]
+        return [self.store.symbols[j] for j in np.flatnonzero(row == 1)]
+
+    def industry_stocks(self, industry, date=None):
+        df = self.master()
+        if 'industry' not in df.columns:
+            return []
+        return list(df.index[df['industry'] == industry])
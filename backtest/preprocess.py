@@ -0,0 +1,74 @@
+"""
+Cross-sectional factor preprocessing.
+
+The research scripts de-extreme and standardise one factor column of one
+rebalance date at a time.  The functions here do it for a whole
+(date x stock x factor) array in one call: statistics are taken along the
+stock axis, separately for every date and factor, and NaNs are left out of
+the statistics and stay NaN.  The stock axis defaults to the second-to-last
+one, so a (stock x factor) DataFrame of one date works the same way; a
+Series is one factor of one date.
+
+    x = sigma_clip(panel, n=3)                      # mean +- 3 std
+    x = mad_clip(panel, n=3, scale=1.4826)          # median +- 3 * 1.4826 * MAD
+    x = zscore(x)
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+def _prepare(values, axis):
+    x = np.asarray(values, dtype=float)
+    if axis is None:
+        axis = 0 if x.ndim < 2 else -2
+    return x, axis
+
+
+def _wrap(values, out):
+    if isinstance(values, pd.DataFrame):
+        return pd.DataFrame(out, index=values.index, columns=values.columns)
+    if isinstance(values, pd.Series):
+        return pd.Series(out, index=values.index, name=values.name)
+    return out
+
+
+def _nanstat(func, x, axis, **kwargs):
+    # 整列为NaN时结果为NaN，不报警告
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return func(x, axis=axis, keepdims=True, **kwargs)
+
+
+def mad_clip(values, n=3, scale=1.4826, drop=False, axis=None):
+    '''
+    中位数去极值：边界为 中位数 +- n * scale * MAD（MAD为与中位数之差绝对值的中位数）
+    drop=False 时边界外的值归到边界上；drop=True 时落在边界上及边界外的值置为NaN
+    '''
+    x, axis = _prepare(values, axis)
+    median = _nanstat(np.nanmedian, x, axis)
+    mad = _nanstat(np.nanmedian, np.abs(x - median), axis) * scale
+    lower, upper = median - n * mad, median + n * mad
+    if drop:
+        out = np.where((x <= lower) | (x >= upper), np.nan, x)
+    else:
+        out = np.clip(x, lower, upper)
+    return _wrap(values, out)
+
+
+def sigma_clip(values, n=3, ddof=0, axis=None):
+    # 均值 +- n 倍标准差之外的值归到边界上
+    x, axis = _prepare(values, axis)
+    mean = _nanstat(np.nanmean, x, axis)
+    std = _nanstat(np.nanstd, x, axis, ddof=ddof)
+    return _wrap(values, np.clip(x, mean - n * std, mean + n * std))
+
+
+def zscore(values, ddof=0, axis=None):
+    # 标准化：(x - 均值) / 标准差，ddof=0 与 np.std 一致，ddof=1 与 pandas 的 std() 一致
+    x, axis = _prepare(values, axis)
+    mean = _nanstat(np.nanmean, x, axis)
+    std = _nanstat(np.nanstd, x, axis, ddof=ddof)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _wrap(values, (x - mean) / std)
@@ -0,0 +1,297 @@
+"""
+Rolling regressions with constant work per bar.
+
+RSRS (resistance support relative strength) regresses the daily high on the
+daily low over the last N bars and standardises the slope against its last
+M values.  Refitting an OLS model for each of the M windows on every bar is
+O(N*M) per bar; RollingOLS instead keeps the sums of x, y, xy, x^2 and y^2
+over a ring buffer of the last N points, so slope and R^2 follow in O(1)
+when a bar enters and the oldest leaves.  RollingRSRS adds a ring buffer of
+the last M slopes with running moments for the z-score.
+
+    rsrs = RollingRSRS(n=18, m=600)
+    rsrs.feed(history(stock, ['high', 'low'], n + m - 1, '1d'))   # warm-up
+    ...
+    rsrs.feed(history(stock, ['high', 'low'], 1, '1d'))           # each bar
+    rsrs.score                                                    # z * R^2
+
+For a warm-up over the whole history, rolling_beta() computes every window's
+slope and R^2 at once from windowed moments, and beta_history() keeps the
+result for a store symbol on disk in the store's cache directory, keyed by
+symbol, fields, window and the store's data version.
+
+Both take span > N to reproduce scripts that slice span-point windows out
+of the last N + M - 1 bars: the windows are span bars long except the last
+span - N, which run into the end of the data and are cut short, down to N
+bars for the latest one.
+
+rsrs_table() scores many assets in one batched regression over an
+(M windows x N bars x asset) tensor and ranks them, for rotation across a
+whole ETF universe at about the cost of one asset.
+"""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .factors import compact
+
+
+class RollingOLS(object):
+    '''
+    y = alpha + beta * x 在最近 window 个点上的滚动最小二乘
+    累计和每 refresh 次更新后按缓冲区重算一次，避免加减误差累积
+    '''
+
+    def __init__(self, window, refresh=1000):
+        self.window = window
+        self.refresh = refresh
+        self._x = np.zeros(window)
+        self._y = np.zeros(window)
+        self._n = 0
+        self._pos = 0
+        self._updates = 0
+        self._shift = None
+        self._sums = np.zeros(5)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def ready(self):
+        return self._n == self.window
+
+    def update(self, x, y):
+        # 以第一个点为原点平移，减小 n*Sxx - Sx^2 的相消误差（斜率与R^2不变）
+        if self._shift is None:
+            self._shift = (x, y)
+        x, y = x - self._shift[0], y - self._shift[1]
+        if self._n == self.window:
+            ox, oy = self._x[self._pos], self._y[self._pos]
+            self._sums -= (ox, oy, ox * oy, ox * ox, oy * oy)
+        else:
+            self._n += 1
+        self._x[self._pos], self._y[self._pos] = x, y
+        self._sums += (x, y, x * y, x * x, y * y)
+        self._pos = (self._pos + 1) % self.window
+        self._updates += 1
+        if self._updates % self.refresh == 0:
+            self._recompute()
+
+    def _recompute(self):
+        x, y = self._x[:self._n], self._y[:self._n]
+        self._sums = np.array([x.sum(), y.sum(), (x * y).sum(), (x * x).sum(), (y * y).sum()])
+
+    def _moments(self):
+        n = self._n
+        sx, sy, sxy, sxx, syy = self._sums
+        return n * sxy - sx * sy, n * sxx - sx * sx, n * syy - sy * sy
+
+    @property
+    def slope(self):
+        if self._n < 2:
+            return np.nan
+        cov, var_x, _ = self._moments()
+        return cov / var_x if var_x > 0 else np.nan
+
+    @property
+    def intercept(self):
+        beta = self.slope
+        sx, sy = self._sums[:2]
+        return (sy - beta * sx) / self._n + self._shift[1] - beta * self._shift[0]
+
+    @property
+    def rsquared(self):
+        if self._n < 2:
+            return np.nan
+        cov, var_x, var_y = self._moments()
+        if var_x <= 0 or var_y <= 0:
+            return np.nan
+        return cov * cov / (var_x * var_y)
+
+
+class RollingRSRS(object):
+    '''
+    RSRS：最近n日最高价对最低价回归的斜率，在最近m个斜率中的标准分，乘以当期R^2
+    feed() 接收带日期索引、含 high/low 列的 DataFrame，已处理过的日期自动跳过
+    span: 原策略在最近 n+m-1 根K线上按 span 个点切窗口时的窗口长度，最后 span-n 个窗口被截断
+    '''
+
+    def __init__(self, n, m, refresh=1000, span=None):
+        self.n = n
+        self.m = m
+        self.refresh = refresh
+        self.span = span or n
+        if not n <= self.span < n + m:
+            raise ValueError('span must be between n and n + m - 1')
+        self.tail = self.span - n
+        self.ols = RollingOLS(n, refresh)
+        # 完整 span 个点的窗口滚动更新；截断的窗口都以最新一根为终点，每根K线重算
+        self.full = RollingOLS(self.span, refresh) if self.tail else None
+        self._recent = np.full((self.span - 1, 2), np.nan)
+        self._slopes = np.zeros(m - self.tail)
+        self._count = 0
+        self._pos = 0
+        self._updates = 0
+        self._sums = np.zeros(2)
+        self.last = None
+
+    @property
+    def ready(self):
+        return self._count == len(self._slopes)
+
+    def update(self, high, low):
+        self.ols.update(low, high)
+        ols = self.ols
+        if self.tail:
+            self.full.update(low, high)
+            self._recent[:-1] = self._recent[1:]
+            self._recent[-1] = low, high
+            ols = self.full
+        if not ols.ready:
+            return
+        beta = ols.slope
+        if self.ready:
+            old = self._slopes[self._pos]
+            self._sums -= (old, old * old)
+        else:
+            self._count += 1
+        self._slopes[self._pos] = beta
+        self._sums += (beta, beta * beta)
+        self._pos = (self._pos + 1) % len(self._slopes)
+        self._updates += 1
+        if self._updates % self.refresh == 0:
+            s = self._slopes[:self._count]
+            self._sums = np.array([s.sum(), (s * s).sum()])
+
+    def feed(self, values):
+        for date, high, low in zip(values.index, values['high'].values, values['low'].values):
+            if self.last is not None and date <= self.last:
+                continue
+            if not (np.isnan(high) or np.isnan(low)):
+                self.update(float(high), float(low))
+            self.last = date
+        return self
+
+    def _tail_slopes(self):
+        # 截断的窗口：以最新一根为终点、长度 span-1 .. n 的斜率
+        x, y = (self._recent[::-1] - self._recent[-1]).T
+        k = np.arange(1, len(x) + 1)
+        sx, sy = x.cumsum(), y.cumsum()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            beta = (k * (x * y).cumsum() - sx * sy) / (k * (x * x).cumsum() - sx * sx)
+        return beta[self.n - 1:]
+
+    @property
+    def slope(self):
+        return self.ols.slope
+
+    @property
+    def rsquared(self):
+        return self.ols.rsquared
+
+    @property
+    def zscore(self):
+        # 与 numpy 的 std() 一致，取总体标准差
+        if not self.ready:
+            return np.nan
+        s, s2 = self._sums
+        if self.tail:
+            t = self._tail_slopes()
+            s, s2 = s + t.sum(), s2 + (t * t).sum()
+        mean = s / self.m
+        var = s2 / self.m - mean * mean
+        if var <= 0:
+            return np.nan
+        return (self.ols.slope - mean) / np.sqrt(var)
+
+    @property
+    def score(self):
+        return self.zscore * self.rsquared
+
+
+def rolling_beta(x, y, window):
+    '''
+    整段序列上 y = alpha + beta * x 的滚动回归
+    返回 (beta, rsquared) 两个与输入等长的数组，前 window-1 个及含NaN的窗口为NaN
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    beta = np.full(len(x), np.nan)
+    rsquared = np.full(len(x), np.nan)
+    if len(x) < window:
+        return beta, rsquared
+    xw = sliding_window_view(x, window)
+    yw = sliding_window_view(y, window)
+    dx = xw - xw.mean(axis=1, keepdims=True)
+    dy = yw - yw.mean(axis=1, keepdims=True)
+    sxy = (dx * dy).sum(axis=1)
+    sxx = (dx * dx).sum(axis=1)
+    syy = (dy * dy).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta[window - 1:] = np.where(sxx > 0, sxy / sxx, np.nan)
+        rsquared[window - 1:] = np.where((sxx > 0) & (syy > 0), sxy * sxy / (sxx * syy), np.nan)
+    return beta, rsquared
+
+
+def rsrs_table(high, low, n, m, span=None):
+    '''
+    多个标的最新一期的RSRS，一次批量回归
+    high/low: (日期 x 标的) DataFrame，每个标的取自己最近 n+m-1 个有效行（NaN视为停牌跳过）
+    span: 窗口长度（默认n），大于n时最后 span-n 个窗口在数据末尾截断，同 RollingRSRS
+    返回按 score 降序排列的表：beta, rsquared, zscore, score；历史不足的标的为NaN排在最后
+    '''
+    h = high.values.astype(float)
+    l = low.reindex_like(high).values.astype(float)
+    valid = ~np.isnan(h) & ~np.isnan(l)
+    length = n + m - 1
+    h, counts = compact(h, valid)
+    l = compact(l, valid)[0]
+    counts = counts[-1] if len(counts) else np.zeros(h.shape[1], dtype=int)
+    span = span or n
+    rows = np.maximum(counts[None, :] - length + np.arange(length)[:, None], 0)
+    # 末尾补 span-n 行NaN，截断的窗口只对有效点求和
+    pad = np.full((span - n, h.shape[1]), np.nan)
+    # (m, 标的, span)：第k个窗口为最近 n+m-1 行中的第 k..k+span-1 行
+    x = sliding_window_view(np.vstack([np.take_along_axis(l, rows, axis=0), pad]), span, axis=0)
+    y = sliding_window_view(np.vstack([np.take_along_axis(h, rows, axis=0), pad]), span, axis=0)
+    k = np.minimum(span, length - np.arange(m))[:, None, None]
+    dx = x - np.nansum(x, axis=-1, keepdims=True) / k
+    dy = y - np.nansum(y, axis=-1, keepdims=True) / k
+    sxy = np.nansum(dx * dy, axis=-1)
+    sxx = np.nansum(dx * dx, axis=-1)
+    syy = np.nansum(dy * dy, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = sxy / sxx
+        rsquared = sxy[-1] ** 2 / (sxx[-1] * syy[-1])
+        zscore = (beta[-1] - beta.mean(axis=0)) / beta.std(axis=0)
+    table = pd.DataFrame({'beta': beta[-1], 'rsquared': rsquared, 'zscore': zscore, 'score': zscore * rsquared},
+                         index=high.columns)
+    table[counts < length] = np.nan
+    return table.sort_values('score', ascending=False)
+
+
+def beta_history(store, symbol, window, x='low', y='high'):
+    '''
+    行情库全部历史上的滚动回归，返回 (日期 x [beta, rsquared]) DataFrame
+    停牌日沿用上一价格（与 get_price 一致）；结果缓存在行情库的 cache 目录
+    '''
+    name = 'beta_%s_%s_%s_%d_v%d.npz' % (symbol, x, y, window, store.data_version)
+    path = store.cache_path(name)
+    if path is not None and os.path.exists(path):
+        with np.load(path) as z:
+            beta, rsquared = z['beta'], z['rsquared']
+    else:
+        j = store.sid[symbol]
+        xs = pd.Series(store.field(x)[:, j]).ffill().values
+        ys = pd.Series(store.field(y)[:, j]).ffill().values
+        beta, rsquared = rolling_beta(xs, ys, window)
+        if path is not None:
+            # 先写临时文件再改名，多个进程同时回测时不会读到半个文件
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, beta=beta, rsquared=rsquared)
+            os.replace(tmp, path)
+    return pd.DataFrame({'beta': beta, 'rsquared': rsquared}, index=pd.DatetimeIndex(store.dates))
@@ -0,0 +1,87 @@
+"""
+Array kernels for all-in / all-out rule backtests over many tickers.
+
+"Moving Average Backtest.py" walks one ticker day by day with a cash/stocks
+state machine.  all_in_out() runs the same state machine with one loop over
+dates, where each step updates every ticker at once as numpy vectors, so
+the rule can be run over the whole market in one call.  The arithmetic is
+the same sequence of float operations as the script's loop, so a single
+ticker reproduces its cash/stocks/outstanding columns exactly.
+
+    from backtest.factors import own_rows
+    close = pd.DataFrame(store.fields['close'], index=pd.DatetimeIndex(store.dates), columns=store.symbols)
+    ma5, ma10 = own_rows(close, lambda df: df.rolling(5).mean()), own_rows(close, lambda df: df.rolling(10).mean())
+    account = all_in_out(close, (ma5 >= ma10).where(ma10.notna()))
+"""
+import numpy as np
+import pandas as pd
+
+
+def all_in_out(close, signal, capital=1000000):
+    '''
+    全仓买入/全部卖出的状态机，收盘价成交
+    close: (date x ticker) DataFrame 或单只股票的 Series
+    signal: 同形状，真值为持股、假值为持币，NaN 表示该行没有信号
+    每只股票从第一个收盘价与信号都有效的行开始，以 capital 现金起步；
+    之后无效的行（停牌）沿用上一行的状态
+      (1) cash[i-1] != 0, signal, buy
+      (2) cash[i-1] == 0, signal, hold stock
+      (3) cash[i-1] != 0, no signal, hold cash
+      (4) cash[i-1] == 0, no signal, sell
+    返回 {'cash', 'stocks', 'outstanding', 'total_capital'}，与输入同类型同形状
+    '''
+    series = isinstance(close, pd.Series)
+    frame = close.to_frame() if series else close
+    px = frame.values.astype(float)
+    sig = np.asarray(signal, dtype=float).reshape(px.shape)
+    valid = ~np.isnan(px) & ~np.isnan(sig)
+    on = sig > 0
+
+    n_date, n_ticker = px.shape
+    cash = np.full((n_date, n_ticker), np.nan)
+    stocks = np.full((n_date, n_ticker), np.nan)
+    outstanding = np.full((n_date, n_ticker), np.nan)
+    c = np.zeros(n_ticker)
+    s = np.zeros(n_ticker)
+    o = np.zeros(n_ticker)
+    started = np.zeros(n_ticker, dtype=bool)
+    for i in range(n_date):
+        step = valid[i] & started
+        held = c == 0
+        buy = step & ~held & on[i]
+        stay = step & ~held & ~on[i]
+        hold = step & held & on[i]
+        sell = step & held & ~on[i]
+        p = px[i]
+        c_new, s_new, o_new = c.copy(), s.copy(), o.copy()
+        # (1) buy
+        o_new[buy] = c[buy]
+        s_new[buy] = o_new[buy] / p[buy]
+        c_new[buy] = 0
+        # (3) hold cash
+        o_new[stay] = 0
+        s_new[stay] = 0
+        # (2) hold stock
+        o_new[hold] = s[hold] * p[hold]
+        c_new[hold] = 0
+        # (4) sell
+        c_new[sell] = s[sell] * p[sell]
+        o_new[sell] = 0
+        s_new[sell] = 0
+        # 首个有效行：初始化现金
+        first = valid[i] & ~started
+        c_new[first], s_new[first], o_new[first] = capital, 0, 0
+        started |= first
+        c, s, o = c_new, s_new, o_new
+        cash[i, started], stocks[i, started], outstanding[i, started] = c[started], s[started], o[started]
+
+    def wrap(values):
+        df = pd.DataFrame(values, index=frame.index, columns=frame.columns)
+        return df.iloc[:, 0] if series else df
+
+    return {
+        'cash': wrap(cash),
+        'stocks': wrap(stocks),
+        'outstanding': wrap(outstanding),
+        'total_capital': wrap(cash + outstanding),
+    }
@@ -0,0 +1,320 @@
+"""
+Columnar bar store for the local backtest engine.
+
+Every field is one 2-D float64 array laid out (trading date x symbol).  A
+cross-section for one day is a contiguous row, and a history window for the
+whole market is a single row slice, so the engine never has to touch
+per-stock DataFrames while a backtest runs.
+
+On disk a store is a directory:
+
+    meta.json        field list, format version and data version
+    dates.npy        datetime64[D] trading calendar
+    symbols.txt      one symbol per line, column order of the field arrays
+    <field>.npy      one (date x symbol) array per field
+    index.npz        first/last valid row per symbol (listing range)
+
+BarStore.load() memory-maps the field arrays read-only, so a cold start only
+reads the calendar and symbol index, and several processes backtesting off
+the same store share one copy of the pages in the OS cache.
+
+Because the arrays are date-major, a new trading day is a new row at the end
+of every file.  append() writes only the rows after the store's last date
+and patches the .npy headers in place, so a nightly update does not rebuild
+the store.  Every write bumps meta['data_version'] and clears cache/, where
+derived data computed from the bars is kept.
+"""
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# 标准字段名
+FIELDS = ['open', 'high', 'low', 'close', 'volume', 'turnover']
+
+FORMAT_VERSION = 1
+
+
+class BarStore(object):
+
+    def __init__(self, dates, symbols, fields):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.symbols = list(symbols)
+        self.sid = {s: i for i, s in enumerate(self.symbols)}
+        self.fields = dict(fields)
+        self._first_valid = None
+        self._last_valid = None
+        self.path = None
+        self.data_version = 0
+
+    def __contains__(self, symbol):
+        return symbol in self.sid
+
+    def __len__(self):
+        return len(self.dates)
+
+    # 1. 构建与读写 ##########################################################
+    @classmethod
+    def from_frames(cls, frames, fields=None):
+        '''
+        frames: {symbol: DataFrame indexed by trading date}
+        Days on which a symbol has no row are stored as NaN.
+        '''
+        fields = list(fields or FIELDS)
+        symbols = sorted(frames)
+        dates = union_dates(frames.values())
+        arrays = {f: fill_field(dates, symbols, frames, f) for f in fields}
+        return cls(dates, symbols, arrays)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        meta = read_meta(path)
+        dates = np.load(os.path.join(path, 'dates.npy'))
+        with open(os.path.join(path, 'symbols.txt'), encoding='utf-8') as f:
+            symbols = f.read().split()
+        mode = 'r' if mmap else None
+        fields = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mode) for name in meta['fields']}
+        store = cls(dates, symbols, fields)
+        store.path = path
+        store.data_version = meta.get('data_version', 0)
+        index = os.path.join(path, 'index.npz')
+        if os.path.exists(index):
+            with np.load(index) as z:
+                store._first_valid, store._last_valid = z['first_valid'], z['last_valid']
+        return store
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name, arr in self.fields.items():
+            np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(arr, dtype=float))
+        write_index(path, self.dates, self.symbols, list(self.fields), self.first_valid, self.last_valid,
+                    next_version(path))
+
+    @classmethod
+    def write(cls, path, frames, fields=None):
+        '''
+        把 {symbol: DataFrame} 逐字段写成磁盘上的行情库，内存中同时只保留一个字段的数组
+        '''
+        fields = list(fields or FIELDS)
+        symbols = sorted(frames)
+        dates = union_dates(frames.values())
+        os.makedirs(path, exist_ok=True)
+        version = next_version(path)
+        valid = None
+        for f in fields:
+            arr = fill_field(dates, symbols, frames, f)
+            np.save(os.path.join(path, f + '.npy'), arr)
+            if f == 'close':
+                valid = valid_range(arr)
+            del arr
+        write_index(path, dates, symbols, fields, *valid, data_version=version)
+        return cls.load(path)
+
+    @classmethod
+    def append(cls, path, frames):
+        '''
+        增量追加：只取晚于行情库最后交易日的行，原地扩展各字段数组与交易日历
+        新出现的股票追加为新列（需要整体重写字段文件，只在有新股上市的日子发生）
+        新数据中没有的字段（复权因子、ST标记等）沿用该股票在行情库中的最后一个值
+        返回 (store, 追加的交易日数)
+        '''
+        store = cls.load(path)
+        last = store.dates[-1]
+        tails = {}
+        for symbol, df in frames.items():
+            keep = pd.DatetimeIndex(df.index).values.astype('datetime64[D]') > last
+            if keep.any():
+                tails[symbol] = df[keep]
+        if not tails:
+            return store, 0
+
+        dates = union_dates(tails.values())
+        added = sorted(set(tails) - set(store.sid))
+        # 新股票连同落在已有交易日历上的历史一起写入
+        heads = {}
+        for symbol in added:
+            df = frames[symbol]
+            days = pd.DatetimeIndex(df.index).values.astype('datetime64[D]')
+            heads[symbol] = df[np.isin(days, store.dates)]
+        symbols = store.symbols + added
+        fields = list(store.fields)
+        # 新数据缺少的字段：各股票在行情库中的最后一个值
+        carry = {}
+        for f in fields:
+            if any(s in store.sid and f not in df.columns for s, df in tails.items()):
+                carry[f] = last_values(store.field(f))
+        n_old, n = len(store.dates), len(store.dates) + len(dates)
+        first = np.r_[store.first_valid, np.full(len(added), n_old)]
+        last_valid = np.r_[store.last_valid, np.full(len(added), -1)]
+        old_dates = store.dates
+        del store  # 释放内存映射，之后会改写字段文件
+
+        for f in fields:
+            block = fill_field(dates, symbols, tails, f)
+            if f in carry:
+                for j, value in enumerate(carry[f]):
+                    df = tails.get(symbols[j])
+                    if df is not None and f not in df.columns:
+                        rows = np.searchsorted(dates, pd.DatetimeIndex(df.index).values.astype('datetime64[D]'))
+                        block[rows, j] = value
+            filename = os.path.join(path, f + '.npy')
+            if added or not append_rows(filename, block):
+                old = np.hstack([np.load(filename), fill_field(old_dates, added, heads, f)])
+                np.save(filename, np.vstack([old, block]))
+                del old
+            if f == 'close':
+                if added:
+                    hfirst, hlast = valid_range(fill_field(old_dates, added, heads, f))
+                    first[-len(added):], last_valid[-len(added):] = hfirst, hlast
+                bfirst, blast = valid_range(block)
+                has = blast >= 0
+                first = np.where((first >= n_old) & has, n_old + bfirst, np.where(first >= n_old, n, first))
+                last_valid = np.where(has, n_old + blast, last_valid)
+        write_index(path, np.r_[old_dates, dates], symbols, fields, first, last_valid, next_version(path))
+        return cls.load(path), len(dates)
+
+    # 2. 索引查询 ############################################################
+    def date_index(self, date):
+        # 不晚于date的最后一个交易日位置，早于首个交易日时返回-1
+        d = np.datetime64(pd.Timestamp(date).date(), 'D')
+        return int(np.searchsorted(self.dates, d, side='right')) - 1
+
+    def symbol_index(self, symbols):
+        return np.array([self.sid[s] for s in symbols], dtype=np.int64)
+
+    def field(self, name):
+        try:
+            return self.fields[name]
+        except KeyError:
+            raise KeyError('field %r is not in the bar store' % name)
+
+    def frame(self, name, symbols=None, start=None, end=None):
+        '''
+        单个字段的 (日期 x 股票) DataFrame，start/end 为闭区间
+        '''
+        symbols = list(self.symbols if symbols is None else symbols)
+        i0 = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start).date(), 'D')))
+        i1 = len(self.dates) - 1 if end is None else self.date_index(end)
+        values = self.field(name)[i0:i1 + 1][:, self.symbol_index(symbols)]
+        return pd.DataFrame(values, index=pd.DatetimeIndex(self.dates[i0:i1 + 1]), columns=symbols)
+
+    @property
+    def first_valid(self):
+        if self._first_valid is None:
+            self._compute_valid_range()
+        return self._first_valid
+
+    @property
+    def last_valid(self):
+        if self._last_valid is None:
+            self._compute_valid_range()
+        return self._last_valid
+
+    def _compute_valid_range(self):
+        self._first_valid, self._last_valid = valid_range(self.field('close'))
+
+    def cache_path(self, name):
+        '''
+        派生数据缓存文件路径 <store>/cache/<name>，行情库每次写入都会清空
+        内存构建、未落盘的行情库返回None
+        '''
+        if self.path is None:
+            return None
+        os.makedirs(os.path.join(self.path, 'cache'), exist_ok=True)
+        return os.path.join(self.path, 'cache', name)
+
+
+def union_dates(frames):
+    parts = [pd.DatetimeIndex(df.index).values.astype('datetime64[D]') for df in frames]
+    return np.unique(np.concatenate(parts)) if parts else np.array([], dtype='datetime64[D]')
+
+
+def fill_field(dates, symbols, frames, field):
+    arr = np.full((len(dates), len(symbols)), np.nan)
+    for j, symbol in enumerate(symbols):
+        df = frames.get(symbol)
+        if df is not None and field in df.columns:
+            rows = np.searchsorted(dates, pd.DatetimeIndex(df.index).values.astype('datetime64[D]'))
+            arr[rows, j] = df[field].values.astype(float)
+    return arr
+
+
+def valid_range(close):
+    # 各股票第一个/最后一个有收盘价的交易日位置（无数据为 len(dates) / -1）
+    valid = ~np.isnan(close)
+    n = len(close)
+    has = valid.any(axis=0)
+    first = np.where(has, valid.argmax(axis=0), n)
+    last = np.where(has, n - 1 - valid[::-1].argmax(axis=0), -1)
+    return first, last
+
+
+def last_values(arr, span=64):
+    # 各列最后一个非NaN值（没有为NaN）：先看最后span行，找不到的列再整列查找
+    tail = np.asarray(arr[max(len(arr) - span, 0):])
+    out = np.full(arr.shape[1], np.nan)
+    if len(tail):
+        valid = ~np.isnan(tail)
+        has = valid.any(axis=0)
+        rows = len(tail) - 1 - valid[::-1].argmax(axis=0)
+        out[has] = tail[rows, np.arange(tail.shape[1])][has]
+    for j in np.flatnonzero(np.isnan(out)):
+        col = np.asarray(arr[:, j])
+        col = col[~np.isnan(col)]
+        if len(col):
+            out[j] = col[-1]
+    return out
+
+
+def read_meta(path):
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def next_version(path):
+    # 行情库内容变化前调用：版本号+1，并清空依赖旧数据的派生缓存
+    try:
+        version = read_meta(path).get('data_version', 0) + 1
+    except (OSError, ValueError):
+        version = 1
+    shutil.rmtree(os.path.join(path, 'cache'), ignore_errors=True)
+    return version
+
+
+def append_rows(filename, rows):
+    '''
+    在.npy文件末尾追加行：改写头部的shape后直接写入数据，不读旧数据
+    头部长度变化（旧版numpy写的文件没有预留空间）时返回False，由调用方重写整个文件
+    '''
+    rows = np.ascontiguousarray(rows, dtype=float)
+    fmt = np.lib.format
+    with open(filename, 'r+b') as f:
+        version = fmt.read_magic(f)
+        read_header = fmt.read_array_header_1_0 if version == (1, 0) else fmt.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        offset = f.tell()
+        if fortran_order or dtype != rows.dtype or len(shape) != 2 or shape[1] != rows.shape[1]:
+            return False
+        header = io.BytesIO()
+        d = {'shape': (shape[0] + len(rows), shape[1]), 'fortran_order': False, 'descr': fmt.dtype_to_descr(dtype)}
+        fmt.write_array_header_2_0(header, d) if version == (2, 0) else fmt.write_array_header_1_0(header, d)
+        if header.tell() != offset:
+            return False
+        f.seek(offset + shape[0] * shape[1] * dtype.itemsize)
+        f.truncate()
+        f.write(rows.tobytes())
+        f.seek(0)
+        f.write(header.getvalue())
+    return True
+
+
+def write_index(path, dates, symbols, fields, first_valid, last_valid, data_version=1):
+    np.save(os.path.join(path, 'dates.npy'), np.asarray(dates, dtype='datetime64[D]'))
+    with open(os.path.join(path, 'symbols.txt'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(symbols) + '\n')
+    np.savez(os.path.join(path, 'index.npz'), first_valid=first_valid, last_valid=last_valid)
+    with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': FORMAT_VERSION, 'fields': list(fields), 'data_version': data_version}, f, indent=1)
@@ -0,0 +1,144 @@
+"""
+Parameter-grid sweep for the dual moving-average crossover.
+
+"Dual Moving Average Backtest.py" runs one (n1, n2) pair on one security per
+backtest.  sweep() evaluates a whole grid of (fast, slow) windows over a
+(date x security) close panel in one job: a single cumulative-sum pass over
+each security's own trading rows gives the moving average of any window as
+one subtraction, and grid cells are spread over a process pool.
+
+The rule is the script's: open on an upward cross (fast > slow after
+fast <= slow), close on a downward cross, trade at the close of the signal
+day.  The result has one row per (n1, n2, symbol) with total/annual return,
+volatility, Sharpe ratio, maximum drawdown and the number of trades.
+
+    python -m backtest sweep --store data/bars --symbols 000001.SZ 600519.SH --fast 3 5 10 --slow 20 30 60
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .factors import compact
+
+METRICS = ['total_return', 'annual_return', 'volatility', 'sharpe', 'max_drawdown', 'trades']
+
+# 子进程共享的面板数据，由 _init 设置
+_PANEL = {}
+
+
+def _init(close, csum, counts, periods, cost):
+    _PANEL.update(close=close, csum=csum, counts=counts, periods=periods, cost=cost)
+
+
+def moving_average(csum, counts, n):
+    # 由累计和得到n日均线：(csum[k] - csum[k-n]) / n，前n-1行及无效行为NaN
+    ma = np.full(csum.shape, np.nan)
+    if n > len(csum):
+        return ma
+    ma[n - 1] = csum[n - 1]
+    ma[n:] = csum[n:] - csum[:-n]
+    ma /= n
+    ma[np.arange(len(csum))[:, None] >= counts] = np.nan
+    return ma
+
+
+def positions(fast, slow):
+    # 上穿开仓、下穿平仓的持仓状态(0/1)
+    up = np.zeros(fast.shape, dtype=bool)
+    down = np.zeros(fast.shape, dtype=bool)
+    up[1:] = (fast[1:] > slow[1:]) & (fast[:-1] <= slow[:-1])
+    down[1:] = (fast[1:] < slow[1:]) & (fast[:-1] >= slow[:-1])
+    event = np.where(up, 1.0, np.where(down, 0.0, np.nan))
+    return pd.DataFrame(event).ffill().fillna(0).values
+
+
+def evaluate(returns, pos, counts, periods=252, cost=0.0):
+    '''
+    returns: 逐行收益率（压缩后的交易行），pos: 收盘时的持仓
+    返回 {指标: 各证券数组}
+    '''
+    held = np.zeros(pos.shape)
+    held[1:] = pos[:-1]
+    turn = np.abs(np.diff(pos, axis=0, prepend=0))
+    strat = np.nan_to_num(held * returns) - cost * turn
+    rows = np.arange(len(pos))[:, None]
+    strat[(rows == 0) | (rows >= counts)] = 0
+    n = np.maximum(counts - 1, 1)
+    equity = np.cumprod(1 + strat, axis=0)
+    total = equity[-1] - 1
+    mean = strat.sum(axis=0) / n
+    std = np.sqrt(np.maximum((strat ** 2).sum(axis=0) / n - mean ** 2, 0) * n / np.maximum(n - 1, 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, mean / std * np.sqrt(periods), np.nan)
+        annual = (1 + total) ** (periods / n) - 1
+    drawdown = (equity / np.maximum.accumulate(equity, axis=0) - 1).min(axis=0)
+    return {
+        'total_return': total,
+        'annual_return': annual,
+        'volatility': std * np.sqrt(periods),
+        'sharpe': sharpe,
+        'max_drawdown': drawdown,
+        'trades': turn.sum(axis=0),
+    }
+
+
+def _run_cells(cells):
+    # 子进程：计算一批(n1, n2)，各窗口均线在批内复用
+    close, csum, counts = _PANEL['close'], _PANEL['csum'], _PANEL['counts']
+    returns = np.full(close.shape, np.nan)
+    returns[1:] = close[1:] / close[:-1] - 1
+    cache = {}
+    out = []
+    for n1, n2 in cells:
+        for n in (n1, n2):
+            if n not in cache:
+                cache[n] = moving_average(csum, counts, n)
+        pos = positions(cache[n1], cache[n2])
+        out.append((n1, n2, evaluate(returns, pos, counts, _PANEL['periods'], _PANEL['cost'])))
+    return out
+
+
+def sweep(close, fast, slow, cost=0.0, periods=252, workers=None, batch_size=8):
+    '''
+    close: (date x symbol) 收盘价 DataFrame，停牌为NaN
+    fast/slow: 短、长均线窗口列表，只计算 n1 < n2 的组合，没有这样的组合时报错
+    cost: 每次开仓或平仓按成交额收取的费用比例
+    返回以 (n1, n2, symbol) 为索引的指标表
+    '''
+    cells = [(n1, n2) for n1 in sorted(set(fast)) for n2 in sorted(set(slow)) if n1 < n2]
+    if not cells:
+        raise ValueError('no (fast, slow) pair with fast < slow in fast=%s, slow=%s' % (list(fast), list(slow)))
+    values = close.sort_index().values.astype(float)
+    valid = ~np.isnan(values)
+    packed, cum = compact(values, valid)
+    counts = cum[-1]
+    csum = np.cumsum(np.nan_to_num(packed), axis=0)
+
+    batches = [cells[k:k + batch_size] for k in range(0, len(cells), batch_size)]
+    workers = workers or os.cpu_count()
+    results = []
+    if workers == 1:
+        _init(packed, csum, counts, periods, cost)
+        for batch in batches:
+            results.extend(_run_cells(batch))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init,
+                                 initargs=(packed, csum, counts, periods, cost)) as pool:
+            for result in pool.map(_run_cells, batches):
+                results.extend(result)
+
+    symbols = list(close.columns)
+    frames = []
+    for n1, n2, metrics in results:
+        df = pd.DataFrame(metrics, index=pd.Index(symbols, name='symbol'))[METRICS]
+        df.insert(0, 'n2', n2)
+        df.insert(0, 'n1', n1)
+        frames.append(df.reset_index())
+    return pd.concat(frames, ignore_index=True).set_index(['n1', 'n2', 'symbol'])
+
+
+def summary(table):
+    # 每个(n1, n2)在全部证券上的平均指标
+    return table.groupby(level=['n1', 'n2']).mean()
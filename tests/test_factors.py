@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.factors import bucket_scores, long_momentum
+
+
+def func_scores(df, ls):
+    '''
+    "Multi-Factor Alpha Strategy.py" 原来的分层打分：ls 为按因子排好序的股票代码
+    '''
+    quotient = len(ls) // 20
+    remainder = len(ls) % 20
+    layer = np.array([quotient] * 20)
+
+    for i in range(0, remainder):
+        layer[-(1 + i)] += 1
+
+    layer = np.insert(layer, 0, 0)
+    layer = layer.cumsum()
+
+    for i in range(0, 20):
+        for j in range(layer[i], layer[i + 1]):
+            df.loc[df['valuation_symbol'] == ls[j], 'scores'] += (i + 1)
+
+
+def original(values, kind='quicksort'):
+    df = pd.DataFrame({'valuation_symbol': ['%06d.SZ' % k for k in range(len(values))], 'factor': values,
+                       'scores': 0})
+    func_scores(df, list(df.sort_values(['factor'], ascending=True, kind=kind)['valuation_symbol'].values))
+    return df['scores'].values
+
+
+# n < 20 时只有最后n层有股票；余数从最后一层起每层多分一只
+@pytest.mark.parametrize('n', [1, 7, 19, 20, 21, 39, 40, 57, 333])
+def test_bucket_scores_matches_original_layers(n):
+    values = np.random.default_rng(n).permutation(n) * 0.5 - 3
+    assert list(bucket_scores(values)) == list(original(values))
+
+
+def test_bucket_scores_layer_sizes():
+    scores = bucket_scores(np.arange(47.0))
+    # 47 = 20 * 2 + 7：前13层各2只，后7层各3只
+    assert [int((scores == k).sum()) for k in range(1, 21)] == [2] * 13 + [3] * 7
+    assert list(bucket_scores(np.arange(5.0))) == [16, 17, 18, 19, 20]
+
+
+def test_bucket_scores_ties_keep_input_order():
+    # 相同因子值按输入顺序（稳定排序）分层；原脚本的 sort_values 默认 quicksort，平局的先后没有保证
+    values = np.array([2.0, 1.0, 2.0, 1.0, 2.0] * 9)
+    scores = bucket_scores(values)
+    ones, twos = scores[values == 1], scores[values == 2]
+    assert (np.diff(ones) >= 0).all() and (np.diff(twos) >= 0).all()
+    assert ones.max() <= twos.min()
+    assert list(scores) == list(original(values, kind='stable'))
+
+
+def test_bucket_scores_nan_and_panel():
+    values = np.array([[3.0, np.nan], [1.0, 2.0], [np.nan, 1.0], [2.0, 3.0]])
+    scores = bucket_scores(values, buckets=3)
+    np.testing.assert_array_equal(scores, [[3, np.nan], [1, 2], [np.nan, 1], [2, 3]])
+    # (日期 x 股票 x 因子) 沿股票轴
+    panel = np.stack([values, values[::-1]])
+    np.testing.assert_array_equal(bucket_scores(panel, buckets=3, axis=1), np.stack([scores, scores[::-1]]))
+
+
+def momentum_factor(dfs, adj_date):
+    '''
+    "Momentum Factor.py" 原来的逐只循环
+    '''
+    momentums = []
+    for df in dfs:
+        df['涨跌幅'] = df['收盘价'].pct_change()
+        df160 = df.loc[df.index <= adj_date].tail(160).copy()
+
+        df160['每日振幅'] = (df160['最高价'] / df160['最低价']) - 1
+
+        df160 = df160.sort_values(by='每日振幅')
+        threshold = int(len(df) * 0.7)
+        df160_top70 = df160.head(threshold)
+
+        momentum = df160_top70['涨跌幅'].sum()
+
+        momentums.append(momentum)
+
+    return momentums
+
+
+def test_long_momentum_matches_original_loop():
+    rng = np.random.default_rng(3)
+    days = pd.bdate_range('2019-01-01', periods=500)
+    dfs = []
+    # 历史长短不一：不足 160/0.7 根时只保留 int(len(df) * 0.7) 天，首个调仓日前还没上市的为0
+    for start, length in [(0, 500), (300, 200), (420, 80), (100, 150), (0, 230)]:
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+        amp = rng.uniform(0.005, 0.08, length)
+        dfs.append(pd.DataFrame({'收盘价': close, '最高价': close * (1 + amp), '最低价': close},
+                                index=days[start:start + length]))
+    codes = ['%06d.SZ' % k for k in range(len(dfs))]
+    dates = list(pd.date_range('2019-06-30', '2020-12-31', freq='ME'))
+    panel = long_momentum(pd.DataFrame({c: df['收盘价'] for c, df in zip(codes, dfs)}),
+                          pd.DataFrame({c: df['最高价'] for c, df in zip(codes, dfs)}),
+                          pd.DataFrame({c: df['最低价'] for c, df in zip(codes, dfs)}), dates)
+    for date in dates:
+        np.testing.assert_array_equal(panel.loc[date].values, momentum_factor(dfs, date))
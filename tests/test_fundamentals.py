@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from backtest import BarStore, Engine, Fundamentals
+
+SCRIPT = '''
+def init(context):
+    pass
+
+
+def net_profit(**kwargs):
+    df = get_fundamentals(query(income.symbol, income.net_profit), **kwargs)
+    return df['income_net_profit'].iloc[0] if len(df) else None
+
+
+def handle_bar(context, bar_dict):
+    record(by_date=net_profit(), future_date=net_profit(date='20240329'), by_period=net_profit(statDate='2023q4'),
+           future_period=net_profit(date='20240329', statDate='2023q4'))
+'''
+
+
+def test_rows_published_after_session_date_are_invisible(tmp_path):
+    days = pd.bdate_range('2024-03-04', periods=5)
+    close = np.linspace(10, 11, len(days))
+    frame = pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close, 'volume': 1e6,
+                          'turnover': 1e7}, index=days)
+    store = BarStore.write(str(tmp_path / 'bars'), {'000001.SZ': frame})
+    # 2023年报 3月5日公布，3月7日更正
+    income = pd.DataFrame({'symbol': ['000001.SZ', '000001.SZ'], 'date': ['2024-03-05', '2024-03-07'],
+                           'stat_date': ['2023-12-31', '2023-12-31'], 'net_profit': [1.0, 2.0]})
+    path = tmp_path / 'pit.py'
+    path.write_text(SCRIPT, encoding='utf-8')
+    engine = Engine(store, fundamentals=Fundamentals({'income': income}))
+    result = engine.run(str(path))
+    # 默认与按报告期查询截至上一交易日，指定日期不晚于当日
+    assert list(result['by_date'].fillna(0)) == [0, 0, 1, 1, 2]
+    assert list(result['by_period'].fillna(0)) == [0, 0, 1, 1, 2]
+    assert list(result['future_date'].fillna(0)) == [0, 1, 1, 2, 2]
+    assert list(result['future_period'].fillna(0)) == [0, 1, 1, 2, 2]
@@ -0,0 +1,57 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import BarStore, Engine, MinuteStore
+
+# ROE-Driven Momentum Strategy.py 的买卖点取价方式
+SCRIPT = '''
+def init(context):
+    pass
+
+
+def handle_bar(context, bar_dict):
+    price = get_price('000001.SZ', start_date=get_datetime().strftime('%Y%m%d') + ' 14:55',
+                      end_date=get_datetime().strftime('%Y%m%d') + ' 14:55', fre_step='1m',
+                      fields=['close'], fq='pre', is_panel=1).close.item()
+    record(price=price)
+    order('000001.SZ', 100)
+
+
+def on_order(context, odr):
+    record(fill=odr.price)
+'''
+
+
+def make_stores(tmp_path):
+    days = pd.bdate_range('2024-03-04', periods=5)
+    times = pd.date_range('13:01', '15:00', freq='1min').time
+    index = pd.DatetimeIndex([pd.Timestamp.combine(d, t) for d in days for t in times])
+    close = np.round(10 + np.arange(len(index)) * 0.01, 2)
+    frame = pd.DataFrame({'open': close, 'high': close + 0.01, 'low': close - 0.01, 'close': close,
+                          'volume': 100.0, 'turnover': close * 100}, index=index)
+    minutes = MinuteStore.write(str(tmp_path / 'minutes'), {'000001.SZ': frame})
+    daily = frame.resample('D').agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
+                                     'volume': 'sum', 'turnover': 'sum'}).dropna()
+    store = BarStore.write(str(tmp_path / 'bars'), {'000001.SZ': daily})
+    return store, minutes, frame
+
+
+def test_intraday_minute_price_at_bar_time(tmp_path):
+    store, minutes, frame = make_stores(tmp_path)
+    path = tmp_path / 'roe.py'
+    path.write_text(SCRIPT, encoding='utf-8')
+    engine = Engine(store, minutes=minutes, bar_time=datetime.time(14, 55))
+    result = engine.run(str(path))
+    expected = frame.at_time('14:55')['close']
+    assert list(result['price']) == list(expected)
+    # 14:55 决策的委托按14:55的分钟收盘价成交，而不是当日开盘价
+    assert list(result['fill']) == list(expected)
+
+
+def test_bar_time_after_open_needs_minutes(tmp_path):
+    store, _, _ = make_stores(tmp_path)
+    with pytest.raises(ValueError):
+        Engine(store, bar_time=datetime.time(14, 55))
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.patterns import OHLC, PatternScanner, cdl_breakaway
+from backtest.portal import DataPortal
+from backtest.store import BarStore
+
+# 10根小实体K线，作为第一根长实体的参照：(open, high, low, close)
+CONTEXT = [(11.0, 11.15, 10.95, 11.1), (11.1, 11.15, 10.95, 11.0)] * 5
+BULLISH = [
+    (11.0, 11.05, 9.95, 10.0),  # 长阴线
+    (9.8, 9.85, 9.55, 9.6),  # 跳空低开的阴线
+    (9.5, 9.55, 9.35, 9.4),  # 高低点更低
+    (9.3, 9.35, 9.15, 9.2),  # 阴线，高低点更低
+    (9.2, 9.95, 9.15, 9.9),  # 阳线，收在第一、二根之间的缺口内
+]
+
+
+def mirror(bars, axis=21.0):
+    return [(axis - o, axis - l, axis - h, axis - c) for o, h, l, c in bars]
+
+
+def replace(bars, k, bar):
+    bars = list(bars)
+    bars[k] = bar
+    return bars
+
+
+# 最后一根K线上 talib.CDLBREAKAWAY 的输出（TA-Lib 0.8.1 记录），之前各根均为0
+CASES = {
+    'bullish': (CONTEXT + BULLISH, 100),
+    'bearish': (mirror(CONTEXT + BULLISH), -100),
+    'third_white': (CONTEXT + replace(BULLISH, 2, (9.4, 9.55, 9.35, 9.5)), 100),
+    'close_above_gap': (CONTEXT + replace(BULLISH, 4, (9.2, 10.1, 9.15, 10.05)), 0),
+    'close_below_gap': (CONTEXT + replace(BULLISH, 4, (9.2, 9.8, 9.15, 9.75)), 0),
+    'no_gap': (CONTEXT + replace(BULLISH, 1, (10.0, 10.05, 9.55, 9.6)), 0),
+    'short_first': (CONTEXT + replace(BULLISH, 0, (10.05, 10.1, 9.95, 10.0)), 0),
+    'fourth_white': (CONTEXT + replace(BULLISH, 3, (9.2, 9.35, 9.15, 9.3)), 0),
+    'fifth_black': (CONTEXT + replace(BULLISH, 4, (9.95, 9.95, 9.15, 9.9)), 0),
+    'third_high_not_lower': (CONTEXT + replace(BULLISH, 2, (9.5, 9.9, 9.35, 9.4)), 0),
+    'too_short': ((CONTEXT + BULLISH)[1:], 0),
+}
+
+
+def ohlc(bars):
+    return [np.array(x) for x in zip(*bars)]
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_breakaway_recorded(name):
+    bars, expected = CASES[name]
+    out = cdl_breakaway(*ohlc(bars))
+    assert list(out) == [0] * (len(bars) - 1) + [expected]
+
+
+def planted(rng, n):
+    # 随机K线中植入大量脱离形态，价格取到分，实体多有相同值以覆盖长实体比较的平局
+    o, h, l, c = (np.zeros(n) for _ in range(4))
+    p, k = 10.0, 0
+    while k < n:
+        if rng.random() < 0.15 and k + 5 <= n:
+            s = 1 if rng.random() < 0.5 else -1
+            c1 = p - s * rng.choice([0.1, 0.2, 0.3])
+            o2 = c1 - s * 0.05
+            c2 = o2 - s * 0.03
+            c3 = c2 - s * 0.04
+            c4 = c3 - s * 0.04
+            c5 = (o2 + c1) / 2 if rng.random() < 0.7 else c1
+            seq = [(p, c1), (o2, c2), (c2 - s * 0.02, c3), (c3 - s * 0.02, c4), (c4, c5)]
+        else:
+            seq = [(p, p + rng.choice([0.0, 0.1, 0.2, 0.1, 0.3, 0.01, 0.02]) * rng.choice([-1, 1]))]
+        for oo, cc in seq:
+            o[k], c[k] = round(oo, 2), round(cc, 2)
+            h[k] = max(o[k], c[k]) + rng.choice([0, 0.01])
+            l[k] = min(o[k], c[k]) - rng.choice([0, 0.01])
+            k += 1
+        p = c[k - 1]
+    return o, h, l, c
+
+
+def test_breakaway_matches_talib():
+    talib = pytest.importorskip('talib')
+    rng = np.random.default_rng(1)
+    window = 20
+    for _ in range(100):
+        o, h, l, c = planted(rng, int(rng.integers(5, 60)))
+        assert (cdl_breakaway(o, h, l, c) == talib.CDLBREAKAWAY(o, h, l, c)).all()
+        # window根的调用：每根K线上对最近window根调用talib取最后一个值
+        expected = [talib.CDLBREAKAWAY(*(x[max(0, t - window + 1):t + 1] for x in (o, h, l, c)))[-1]
+                    for t in range(len(c))]
+        assert list(cdl_breakaway(o, h, l, c, window=window)) == expected
+
+
+def test_talib_pattern_scanned_per_window(tmp_path):
+    talib = pytest.importorskip('talib')
+    rng = np.random.default_rng(2)
+    days = pd.bdate_range('2024-01-01', periods=80)
+    frames = {}
+    for symbol in ['000001.SZ', '000002.SZ', '600000.SH']:
+        o, h, l, c = planted(rng, len(days))
+        frame = pd.DataFrame({'open': o, 'high': h, 'low': l, 'close': c, 'volume': 100.0}, index=days)
+        frames[symbol] = frame.drop(days[rng.choice(len(days), 8, replace=False)])
+    store = BarStore.write(str(tmp_path / 'bars'), frames)
+    portal = DataPortal(store)
+    scanner = PatternScanner(portal, window=20)
+    symbols = sorted(frames)
+    for i in range(1, len(store.dates)):
+        portal.set_index(i)
+        # 每只股票当日之前最近20根交易K线调用一次talib
+        bars = {s: frames[s][frames[s].index < store.dates[i]].tail(20) for s in symbols}
+        expected = [s for s in symbols
+                    if len(bars[s]) and talib.CDLDOJI(*(bars[s][f].values for f in OHLC))[-1] != 0]
+        assert scanner.scan(symbols, ['CDLDOJI'], lookup=True) == {'CDLDOJI': expected}
+        assert scanner.scan(symbols, ['CDLDOJI'], lookup=False) == {'CDLDOJI': expected}
+    with pytest.raises(ValueError):
+        scanner.hit_matrix('CDLDOJI')
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from backtest.rolling import RollingRSRS, rsrs_table
+
+
+def ols(x, y):
+    X = np.column_stack([np.ones(len(x)), x])
+    params = np.linalg.lstsq(X, y, rcond=None)[0]
+    resid = y - X.dot(params)
+    return params[1], 1 - resid.dot(resid) / ((y - y.mean()) ** 2).sum()
+
+
+def loop_rsrs(high, low, n, m, span):
+    # 原 get_RSRS：在最近 n+m-1 根K线上按 span 个点切片，末尾的切片较短
+    high, low = high[-(n + m - 1):], low[-(n + m - 1):]
+    scores = np.zeros(m)
+    for i in range(m):
+        scores[i], rsquared = ols(low[i:i + span], high[i:i + span])
+    return (scores[-1] - scores.mean()) / scores.std() * rsquared
+
+
+def make_bars(seed, length=300):
+    rng = np.random.default_rng(seed)
+    close = 4000 * np.exp(np.cumsum(rng.normal(0, 0.015, length)))
+    return pd.DataFrame({'high': close * (1 + rng.uniform(0, 0.02, length)),
+                         'low': close * (1 - rng.uniform(0, 0.02, length))},
+                        index=pd.bdate_range('2020-01-01', periods=length))
+
+
+def test_rsrs_matches_regression_loop():
+    n, m = 20, 60
+    bars = {k: make_bars(k) for k in range(3)}
+    high = pd.DataFrame({k: df['high'] for k, df in bars.items()})
+    low = pd.DataFrame({k: df['low'] for k, df in bars.items()})
+    for span in (20, 30):
+        rsrs = RollingRSRS(n, m, refresh=50, span=span).feed(bars[0].iloc[:n + m - 1])
+        for t in range(n + m - 1, 300):
+            rsrs.feed(bars[0].iloc[t:t + 1])
+            if t % 23 == 0:
+                expected = loop_rsrs(bars[0]['high'].values[:t + 1], bars[0]['low'].values[:t + 1], n, m, span)
+                assert abs(rsrs.score - expected) < 1e-9
+        table = rsrs_table(high, low, n, m, span=span)
+        for k, df in bars.items():
+            expected = loop_rsrs(df['high'].values, df['low'].values, n, m, span)
+            assert abs(table.loc[k, 'score'] - expected) < 1e-9
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from backtest.rules import all_in_out
+
+
+def replay(close, signal, capital=1000000):
+    '''
+    "Moving Average Backtest.py" 原来的逐日循环（ma5>=ma10 换成 signal），只在收盘价与信号都有效的行上运行
+    '''
+    df = pd.DataFrame({'close': close, 'signal': signal}).dropna()
+    cash, outstanding, stocks = np.zeros(len(df)), np.zeros(len(df)), np.zeros(len(df))
+    cash[0] = capital
+    px, on = df['close'].values, df['signal'].values > 0
+    for i in range(1, len(df)):
+        if cash[i - 1] != 0:
+            if on[i]:
+                # buy
+                outstanding[i] = cash[i - 1]
+                stocks[i] = outstanding[i] / px[i]
+                cash[i] = 0
+            if not on[i]:
+                # hold cash
+                cash[i] = cash[i - 1]
+                outstanding[i] = 0
+                stocks[i] = 0
+        if cash[i - 1] == 0:
+            if on[i]:
+                # hold stocks
+                stocks[i] = stocks[i - 1]
+                outstanding[i] = stocks[i] * px[i]
+                cash[i] = 0
+            if not on[i]:
+                # sell
+                cash[i] = stocks[i - 1] * px[i]
+                outstanding[i] = 0
+                stocks[i] = 0
+    return pd.DataFrame({'cash': cash, 'stocks': stocks, 'outstanding': outstanding,
+                         'total_capital': cash + outstanding}, index=df.index)
+
+
+def test_all_in_out_matches_per_ticker_loop():
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range('2021-01-04', periods=120)
+    close = pd.DataFrame(np.round(20 * np.exp(np.cumsum(rng.normal(0, 0.02, (120, 3)), axis=0)), 2),
+                         index=dates, columns=['600519.SH', '000001.SZ', '000002.SZ'])
+    # 晚上市、中途停牌
+    close.iloc[:15, 1] = np.nan
+    close.iloc[50:55, 2] = np.nan
+    ma5, ma10 = close.rolling(5).mean(), close.rolling(10).mean()
+    signal = (ma5 >= ma10).where(ma10.notna())
+    account = all_in_out(close, signal)
+    for ticker in close:
+        expected = replay(close[ticker], signal[ticker])
+        for name in expected:
+            got = account[name][ticker]
+            assert (got[expected.index].values == expected[name].values).all()
+            # 停牌行沿用上一有效行的状态，开始之前为NaN
+            after = got[expected.index[0]:]
+            assert (after.values == expected[name].reindex(after.index).ffill().values).all()
+            assert got[:expected.index[0]].iloc[:-1].isna().all()
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from backtest import BarStore, DataPortal
+from backtest.ingest import append, ingest
+from backtest.store import FIELDS
+
+
+def make_frame(dates, base):
+    close = np.linspace(base, base + 1, len(dates))
+    return pd.DataFrame({'open': close, 'high': close + 0.1, 'low': close - 0.1, 'close': close,
+                         'volume': 1e6, 'turnover': 1e7}, index=dates)
+
+
+def test_append_carries_fields_missing_from_new_frames(tmp_path):
+    dates = pd.bdate_range('2020-01-01', periods=12)
+    frames = {}
+    for k, symbol in enumerate(['000001.SZ', '600000.SH']):
+        df = make_frame(dates[:10], 10 + k)
+        df['adj_factor'] = np.r_[np.ones(5), np.full(5, 2.0)] * (k + 1)
+        df['is_st'] = float(k == 1)
+        frames[symbol] = df
+    path = str(tmp_path / 'bars')
+    BarStore.write(path, frames, FIELDS + ['adj_factor', 'is_st'])
+
+    # 每日CSV只有行情字段
+    new = {symbol: make_frame(dates, 10 + k) for k, symbol in enumerate(frames)}
+    store, days = BarStore.append(path, new)
+    assert days == 2
+    adj, st = store.field('adj_factor'), store.field('is_st')
+    assert list(adj[10:, store.sid['000001.SZ']]) == [2.0, 2.0]
+    assert list(adj[10:, store.sid['600000.SH']]) == [4.0, 4.0]
+    assert list(st[10:, store.sid['600000.SH']]) == [1.0, 1.0]
+
+    # 以新交易日为基准的前复权价格仍然有效
+    portal = DataPortal(store)
+    portal.set_index(11)
+    close = portal.history('000001.SZ', ['close'], 3, '1d', fq='pre')['close']
+    assert np.isfinite(close.values).all()
+
+
+def write_csv(path, symbol, df):
+    # 与CSV归档相同的格式：免责声明一行、GBK编码
+    lines = ['数据仅供参考', '股票代码,股票名称,交易日期,开盘价,最高价,最低价,收盘价,前收盘价,成交量,成交额']
+    for t, r in df.iterrows():
+        values = [r.open, r.high, r.low, r.close, r.close, r.volume, r.turnover]
+        lines.append(','.join([symbol, '测试', t.strftime('%Y-%m-%d')] + [repr(float(v)) for v in values]))
+    path.write_bytes(('\n'.join(lines) + '\n').encode('gbk'))
+
+
+def test_append_parses_only_new_rows(tmp_path):
+    dates = pd.bdate_range('2020-01-01', periods=12)
+    old, new = tmp_path / 'old', tmp_path / 'new'
+    old.mkdir()
+    new.mkdir()
+    for k, symbol in enumerate(['sz000001', 'sh600000']):
+        write_csv(old / (symbol + '.csv'), symbol, make_frame(dates, 10 + k)[:10])
+        write_csv(new / (symbol + '.csv'), symbol, make_frame(dates, 10 + k))
+    # 新上市的股票需要全部历史
+    write_csv(new / 'sz000002.csv', 'sz000002', make_frame(dates[3:], 20))
+    path = str(tmp_path / 'bars')
+    ingest(str(old), path, workers=1)
+
+    store, stats = append(str(new), path, workers=1)
+    assert stats['days'] == 2
+    assert stats['rows'] == 2 * 2 + 9
+    full, _ = ingest(str(new), str(tmp_path / 'full'), workers=1)
+    assert list(store.dates) == list(full.dates)
+    for symbol in ['000001.SZ', '600000.SH', '000002.SZ']:
+        for f in FIELDS:
+            np.testing.assert_array_equal(store.field(f)[:, store.sid[symbol]], full.field(f)[:, full.sid[symbol]])
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.__main__ import main
+from backtest.sweep import sweep
+
+
+def make_close():
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range('2021-01-04', periods=80)
+    return pd.DataFrame(10 * np.exp(np.cumsum(rng.normal(0, 0.02, (80, 2)), axis=0)), index=dates,
+                        columns=['000001.SZ', '600519.SH'])
+
+
+def test_sweep_grid():
+    table = sweep(make_close(), [3, 5, 30], [10, 20], workers=1)
+    assert sorted(set(zip(table.index.get_level_values('n1'), table.index.get_level_values('n2')))) == \
+        [(3, 10), (3, 20), (5, 10), (5, 20)]
+    assert len(table) == 4 * 2
+
+
+def test_sweep_without_fast_below_slow():
+    with pytest.raises(ValueError, match='fast < slow'):
+        sweep(make_close(), [20, 30], [10, 20], workers=1)
+    with pytest.raises(SystemExit):
+        main(['sweep', '--store', 'unused', '--fast', '20', '--slow', '10'])